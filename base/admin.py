@@ -2,12 +2,17 @@ from django.contrib import admin
 
 # Register your models here.
 
-from .models import UserProfile, Subject, Project, File, FileImport
+from .models import UserProfile, Subject, Project, File, FileImport, WaveformIndex, HeartRateSeries, ChannelStatistics, Event, TrendAggregate, ExportJob, AnalysisStage
 
 admin.site.register(UserProfile)
 admin.site.register(Subject)
 admin.site.register(Project)
 admin.site.register(File)
 admin.site.register(FileImport)
-
-
+admin.site.register(WaveformIndex)
+admin.site.register(HeartRateSeries)
+admin.site.register(ChannelStatistics)
+admin.site.register(Event)
+admin.site.register(TrendAggregate)
+admin.site.register(ExportJob)
+admin.site.register(AnalysisStage)
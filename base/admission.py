@@ -0,0 +1,106 @@
+import time
+import fcntl
+from functools import wraps
+from contextlib import contextmanager, ExitStack
+from pathlib import Path
+from django.conf import settings
+from django.http import HttpResponse
+
+# Admission control for CPU and memory heavy endpoints.
+#
+# Every limited endpoint has a fixed number of slot files per kind of slot: "run" slots for requests
+# doing work, "wait" slots for the bounded queue and "user" slots for the per-user cap. Holding a
+# slot means holding an exclusive flock on its file, so the limits are shared by all worker processes,
+# and slots are released by the operating system if a worker dies. The limits are configured per
+# endpoint in MONK_ADMISSION_LIMITS in settings.py; endpoints without an entry are not limited.
+# A queued request holds its web worker thread while it polls for a run slot, which is why the queues
+# are short and the timeouts a few seconds by default.
+
+
+# Exception raised when an endpoint is saturated and the request can not be queued.
+class ServerBusy(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"The server is busy with other '{name}' requests. Please try again shortly.")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def _slot_dir(name):
+    path = Path(getattr(settings, "MONK_ADMISSION_DIR")) / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+# Function trying to take one of the given number of slots without blocking.
+# Returns the open lock file, which holds the slot until it is closed, or None if all slots are taken.
+def _try_acquire(directory, prefix, count):
+    for index in range(count):
+        lock_file = open(directory / f"{prefix}-{index}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except BlockingIOError:
+            lock_file.close()
+    return None
+
+
+# Context manager holding a run slot of the named endpoint while the block executes.
+# Waits in the queue if all run slots are taken, and raises ServerBusy if the queue is full,
+# the user has reached their cap or no slot became free within the configured timeout.
+@contextmanager
+def admission_slot(name, user_id=None):
+    limits = getattr(settings, "MONK_ADMISSION_LIMITS", {}).get(name)
+    if not limits:
+        yield
+        return
+
+    retry_after = limits.get("retry_after", 10)
+    directory = _slot_dir(name)
+    with ExitStack() as stack:
+        # The per-user cap counts both running and queued requests of the user.
+        per_user = limits.get("per_user")
+        if per_user:
+            user_slot = _try_acquire(directory, f"user-{user_id or 'anonymous'}", per_user)
+            if user_slot is None:
+                raise ServerBusy(name, retry_after)
+            stack.callback(user_slot.close)
+
+        run_slot = _try_acquire(directory, "run", limits["concurrency"])
+        if run_slot is None:
+            wait_slot = _try_acquire(directory, "wait", limits.get("queue", 0))
+            if wait_slot is None:
+                raise ServerBusy(name, retry_after)
+            try:
+                deadline = time.monotonic() + limits.get("timeout", 5)
+                while run_slot is None:
+                    if time.monotonic() >= deadline:
+                        raise ServerBusy(name, retry_after)
+                    time.sleep(getattr(settings, "MONK_ADMISSION_POLL_INTERVAL", 0.05))
+                    run_slot = _try_acquire(directory, "run", limits["concurrency"])
+            finally:
+                wait_slot.close()
+        stack.callback(run_slot.close)
+        yield
+
+
+# Function building the response returned when an endpoint is saturated.
+def busy_response(busy):
+    response = HttpResponse(str(busy), status=503, content_type="text/plain")
+    response["Retry-After"] = str(busy.retry_after)
+    return response
+
+
+# Decorator limiting the concurrency of a view with admission_slot, answering 503 when saturated.
+def limit_concurrency(name):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                with admission_slot(name, request.user.id):
+                    return view(request, *args, **kwargs)
+            except ServerBusy as busy:
+                return busy_response(busy)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,240 @@
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from .models import File, HeartRateSeries, ChannelStatistics, Event, TrendAggregate, AnalysisStage
+from .mfer import MferReader, recordable_range
+from .heartrate import detect_beats, beat_rates, heart_rate_trend
+from .channel_stats import channel_statistics
+from .quality import scan_quality
+from .events import find_events
+from .trends import aggregate
+from .timebase import recording_start, absolute_times
+from .datapool import get_cached_header
+from .utils import get_waveform_index, channel_names
+
+# Background analysis of imported recordings.
+#
+# Once the import of a recording is committed, its analysis stages run in a pool of MONK_ANALYSIS_WORKERS
+# background threads, so the import request does not wait for them. The stages read the channels through
+# the block index of the recording, and store their results in the database. A stage that fails is logged
+# and does not keep the other stages from running. Recordings that can not be indexed are not analysed.
+# The outcome of every stage is stored as an AnalysisStage, and the analyze_files command analyses the
+# recordings that were imported before, and runs the stages again that failed or were interrupted.
+
+logger = logging.getLogger(__name__)
+
+# Analysis stages, called in order with the file, its block index and a reader for its channels.
+STAGES = []
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Decorator adding a function to the analysis stages.
+def stage(function):
+    STAGES.append(function)
+    return function
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "MONK_ANALYSIS_WORKERS", 1),
+                thread_name_prefix="analysis",
+            )
+        return _executor
+
+
+# Function running the analysis stages on a file, all of them or the ones named in stages, recording the
+# outcome of every stage. Returns False if the file can not be analysed.
+def analyze(file_id, stages=None):
+    close_old_connections()
+    try:
+        file = File.objects.filter(id=file_id).first()
+        if file is None:
+            return False
+        layout = get_waveform_index(file)
+        if layout is None:
+            return False
+        reader = MferReader(file.file.path, layout)
+        for function in STAGES:
+            if stages is not None and function.__name__ not in stages:
+                continue
+            AnalysisStage.objects.update_or_create(
+                file=file,
+                stage=function.__name__,
+                defaults={
+                    "status": AnalysisStage.RUNNING,
+                    "error": "",
+                    "started_at": timezone.now(),
+                    "finished_at": None,
+                },
+            )
+            try:
+                function(file, layout, reader)
+                status, error = AnalysisStage.DONE, ""
+            except Exception as e:
+                logger.exception("Analysis stage %s failed for file %s", function.__name__, file_id)
+                status, error = AnalysisStage.FAILED, str(e)
+            AnalysisStage.objects.filter(file=file, stage=function.__name__).update(
+                status=status, error=error, finished_at=timezone.now()
+            )
+        return True
+    finally:
+        close_old_connections()
+
+
+# Function returning the names of the stages of a file that are not done: never run, failed, or interrupted.
+def missing_stages(file):
+    done = set(file.analysis_stages.filter(status=AnalysisStage.DONE).values_list("stage", flat=True))
+    return [function.__name__ for function in STAGES if function.__name__ not in done]
+
+
+# Function returning the wall clock time of a time in seconds from the start of the recording, or None if
+# the start of the recording is unknown.
+def _wall_clock(started, seconds):
+    if started is None:
+        return None
+    return timezone.make_aware(absolute_times(started, seconds).astype("datetime64[us]").item())
+
+
+# Function scheduling the analysis of an imported file, once the transaction importing it is committed.
+def schedule(file):
+    if not getattr(settings, "MONK_ANALYSIS_ENABLED", True):
+        return
+    file_id = file.id
+    transaction.on_commit(lambda: _get_executor().submit(analyze, file_id))
+
+
+# Stage computing the summary statistics of every channel.
+@stage
+def statistics(file, layout, reader):
+    for number, name in enumerate(channel_names(file.file.path, layout)):
+        view = reader.channel(number)
+        ChannelStatistics.objects.update_or_create(
+            file=file,
+            number=number,
+            defaults={"channel": name, **channel_statistics(view, view.interval)},
+        )
+
+
+# Stage scanning every channel for flatlines, dropouts, clipping and implausible values.
+# Clipping is recognised at the limits in MONK_QUALITY_CLIPPING_LIMITS, or else at the range of the data type.
+@stage
+def quality(file, layout, reader):
+    plausible_ranges = _patterns("MONK_QUALITY_PLAUSIBLE_RANGES")
+    clipping_limits = _patterns("MONK_QUALITY_CLIPPING_LIMITS")
+    channels = {}
+    for number, name in enumerate(channel_names(file.file.path, layout)):
+        view = reader.channel(number)
+        plausible = next((plausible for pattern, plausible in plausible_ranges if pattern.search(name)), None)
+        limits = next((limits for pattern, limits in clipping_limits if pattern.search(name)), None)
+        if limits is None:
+            limits = recordable_range(layout["segments"][0]["channels"][number])
+        channels[name] = scan_quality(
+            view,
+            view.interval,
+            limits[0] if limits else None,
+            limits[1] if limits else None,
+            plausible,
+            lambda sample: view.times(slice(sample, sample + 1))[0],
+        )
+    file.quality = {"channels": channels}
+    File.objects.filter(id=file.id).update(quality=file.quality)
+
+
+# Function returning the (compiled pattern, value) pairs of a setting mapping channel name patterns to values.
+def _patterns(name):
+    return [(re.compile(pattern, re.IGNORECASE), value) for pattern, value in getattr(settings, name, {}).items()]
+
+
+# Stage deriving the heart rate from the ECG channels, recognised by their names.
+@stage
+def heart_rate(file, layout, reader):
+    pattern = re.compile(getattr(settings, "MONK_ECG_CHANNEL_PATTERN", r"ECG"), re.IGNORECASE)
+    interval = getattr(settings, "MONK_HEART_RATE_TREND_INTERVAL", 10)
+    for number, name in enumerate(channel_names(file.file.path, layout)):
+        if not pattern.search(name):
+            continue
+        beat_times = detect_beats(reader.channel(number))
+        _, rates = beat_rates(beat_times)
+        HeartRateSeries.objects.update_or_create(
+            file=file,
+            channel=name,
+            defaults={
+                "beat_times": beat_times.astype("<f8").tobytes(),
+                "trend_interval": interval,
+                "trend": heart_rate_trend(beat_times, interval, layout.get("duration")),
+                "mean_rate": float(np.mean(rates)) if rates.size else None,
+            },
+        )
+
+
+# Stage finding the events of the rules in MONK_EVENT_RULES, and the dropouts found by the quality scan.
+# The events of a file are replaced as a whole, so analysing a file again does not duplicate them.
+@stage
+def events(file, layout, reader):
+    rules = getattr(settings, "MONK_EVENT_RULES", [])
+    dropouts = (file.quality or {}).get("channels", {})
+    found = []
+    for number, name in enumerate(channel_names(file.file.path, layout)):
+        view = reader.channel(number)
+        for rule in rules:
+            if not re.search(rule["channel"], name, re.IGNORECASE):
+                continue
+            for start, end, value in find_events(
+                view,
+                view.interval,
+                rule.get("below"),
+                rule.get("above"),
+                rule.get("min_seconds", 0),
+                lambda sample: view.times(slice(sample, sample + 1))[0],
+            ):
+                found.append(Event(file=file, channel=name, kind=rule["kind"], start=start, end=end, value=value))
+        for start, end in dropouts.get(name, {}).get("dropout", []):
+            found.append(Event(file=file, channel=name, kind="dropout", start=start, end=end))
+
+    started = recording_start(layout, get_cached_header(file.file.path))
+    for event in found:
+        event.start_time = _wall_clock(started, event.start)
+    with transaction.atomic():
+        Event.objects.filter(file=file).delete()
+        Event.objects.bulk_create(found, batch_size=1000)
+
+
+# Stage storing the aggregates of every channel per MONK_TREND_INTERVAL seconds, linked to the subject of the file.
+@stage
+def trends(file, layout, reader):
+    interval = getattr(settings, "MONK_TREND_INTERVAL", 60)
+    subject = file.subjects.first()
+    started = recording_start(layout, get_cached_header(file.file.path))
+    aggregates = []
+    for number, name in enumerate(channel_names(file.file.path, layout)):
+        view = reader.channel(number)
+        for start, mean, minimum, maximum, count in aggregate(
+            view, view.interval, interval, lambda first, last: view.times(slice(first, last))
+        ):
+            aggregates.append(
+                TrendAggregate(
+                    file=file,
+                    subject=subject,
+                    channel=name,
+                    start=start,
+                    start_time=_wall_clock(started, start),
+                    interval=interval,
+                    mean=mean,
+                    minimum=minimum,
+                    maximum=maximum,
+                    count=count,
+                )
+            )
+    with transaction.atomic():
+        TrendAggregate.objects.filter(file=file).delete()
+        TrendAggregate.objects.bulk_create(aggregates, batch_size=1000)
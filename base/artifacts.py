@@ -0,0 +1,242 @@
+import io
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from django.conf import settings
+from . import metrics
+from .storage import content_digest
+
+# Derived artifacts, such as CSV conversions and anonymized copies of the imported recordings.
+#
+# Every artifact has its own path, derived from the source file, the kind of artifact and the
+# parameters used to produce it, so different requests never write to the same file. The artifacts are
+# kept in MONK_ARTIFACT_DIR, apart from the recordings, in one directory per source file named after the
+# SHA-256 of the source (or of its path, for files stored before content addressed storage was used),
+# sharded like the recordings so no directory grows large. Artifacts are
+# produced through single_flight, which makes sure only one worker computes a given artifact at a time
+# while concurrent requests for the same artifact wait for it and share the result.
+#
+# Every use of an artifact is recorded as its access time, and artifacts are read through open_artifact (or
+# open_fresh), which holds a shared lock on the lock file of the artifact while it is served. collect_garbage removes
+# the artifacts of recordings that no longer exist, and then the least recently used artifacts until the
+# artifacts fit in a disk budget, leaving out artifacts that are being computed or served.
+
+
+# Function returning the key of the directory of the artifacts of a source file.
+def source_key(source_path):
+    return content_digest(source_path) or hashlib.sha256(os.path.abspath(source_path).encode()).hexdigest()
+
+
+# Function returning the directory of the artifacts of a source file.
+def artifact_dir(source_path):
+    key = source_key(source_path)
+    return os.path.join(str(settings.MONK_ARTIFACT_DIR), key[:2], key[2:4], key)
+
+
+# Function returning the path of the artifact derived from source_path with the given suffix.
+# Artifacts produced with parameters (such as a channel selection) get a digest of the parameters in their name.
+def derived_path(source_path, suffix, params=None):
+    base = os.path.splitext(os.path.basename(str(source_path)))[0]
+    if params is not None:
+        digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+        base = f"{base}_{digest}"
+    return os.path.join(artifact_dir(source_path), base + suffix)
+
+
+# Function returning True if the artifact exists and is newer than its source file.
+def is_fresh(output_path, source_path):
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+    except OSError:
+        return False
+
+
+# Function returning the path of an up-to-date artifact, computing it if needed.
+# compute is called with a temporary path to write the artifact to, which is moved into place when done,
+# so readers never see a half written artifact. Concurrent callers for the same artifact, in this or in
+# other worker processes, wait on the lock file of the artifact instead of computing it again.
+def single_flight(output_path, source_path, compute, cache_name="artifacts"):
+    if is_fresh(output_path, source_path):
+        metrics.record_cache(cache_name, True)
+        touch(output_path)
+        return output_path
+
+    with _lock(output_path, fcntl.LOCK_EX, create=True):
+        # The artifact may have been computed while this request was waiting for the lock.
+        if is_fresh(output_path, source_path):
+            metrics.record_cache(cache_name, True)
+            touch(output_path)
+            return output_path
+
+        metrics.record_cache(cache_name, False)
+        base, extension = os.path.splitext(output_path)
+        temporary_path = f"{base}.{os.getpid()}-{threading.get_ident()}.tmp{extension}"
+        try:
+            compute(temporary_path)
+            os.replace(temporary_path, output_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+    return output_path
+
+
+# Function locking the lock file of an artifact, returning the open lock file. The garbage collector removes
+# the lock file of an artifact it removes, while holding the exclusive lock; a process that opened that file
+# before and gets its lock afterwards would not exclude the users of the new lock file, so it locks again.
+# With create, the directory of the artifact is created if needed.
+def _lock(path, operation, create=False):
+    lock_path = f"{path}.lock"
+    while True:
+        try:
+            lock_file = open(lock_path, "a")
+        except FileNotFoundError:
+            if not create:
+                raise
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            continue
+        try:
+            fcntl.flock(lock_file, operation)
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                return lock_file
+        except FileNotFoundError:
+            pass
+        except BaseException:
+            lock_file.close()
+            raise
+        lock_file.close()
+
+
+# Function recording that an artifact is used now, as its access time. The modification time is kept, as it
+# tells whether the artifact is fresh.
+def touch(path):
+    try:
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+    except OSError:
+        pass
+
+
+# File of an artifact opened for reading, releasing the shared lock on the artifact when it is closed.
+class _ServedFile(io.FileIO):
+    def __init__(self, path, lock_file):
+        self._lock_file = lock_file
+        super().__init__(path, "rb")
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._lock_file.close()
+
+
+# Function opening an artifact for reading, such as to send it in a response. The garbage collector does
+# not remove the artifact until the returned file is closed.
+def open_artifact(path):
+    lock_file = _lock(path, fcntl.LOCK_SH)
+    try:
+        served = _ServedFile(path, lock_file)
+    except BaseException:
+        lock_file.close()
+        raise
+    touch(path)
+    return io.BufferedReader(served)
+
+
+# Function returning an up-to-date artifact opened with open_artifact, computing it like single_flight if needed.
+# single_flight returns the path of the artifact without holding a lock on it, so the garbage collector may remove
+# the artifact before it is opened; it is then computed again. Artifacts that are read by path, such as memory
+# mapped arrays, are read while the returned file is open.
+def open_fresh(output_path, source_path, compute, cache_name="artifacts"):
+    while True:
+        single_flight(output_path, source_path, compute, cache_name)
+        try:
+            return open_artifact(output_path)
+        except FileNotFoundError:
+            pass
+
+
+# Function listing the artifacts in MONK_ARTIFACT_DIR, as (path, key of the source, size, access time) tuples.
+# Temporary files of artifacts being computed and lock files are left out.
+def list_artifacts():
+    root = str(settings.MONK_ARTIFACT_DIR)
+    artifacts = []
+    for directory, _, names in os.walk(root):
+        key = os.path.basename(directory)
+        for name in names:
+            if name.endswith(".lock") or ".tmp" in name:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            artifacts.append((path, key, stat.st_size, stat.st_atime))
+    return artifacts
+
+
+# Function removing an artifact unless it is being computed or served, returning True if it was removed.
+def remove_unused(path):
+    try:
+        lock_file = _lock(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    except FileNotFoundError:
+        # The directory of the artifact was removed with it.
+        return True
+    with lock_file:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        os.remove(f"{path}.lock")
+    return True
+
+
+# Function removing the artifacts of sources that no longer exist, and then the least recently used artifacts
+# until all artifacts take at most max_bytes (no limit if None). sources are the paths of the existing source
+# files, and keep the paths of artifacts that must not be removed. Artifacts that are being computed or served
+# are never removed. With dry_run, nothing is removed. Returns a dictionary with the number of orphaned and
+# evicted artifacts, the number of bytes freed and the number of bytes left.
+def collect_garbage(sources, max_bytes=None, keep=(), dry_run=False):
+    keys = {source_key(path) for path in sources}
+    keep = {os.path.abspath(path) for path in keep}
+    result = {"orphaned": 0, "evicted": 0, "freed": 0, "remaining": 0}
+
+    def remove(path, size, reason):
+        if os.path.abspath(path) in keep or not (dry_run or remove_unused(path)):
+            return False
+        result[reason] += 1
+        result["freed"] += size
+        return True
+
+    remaining = []
+    for path, key, size, accessed in list_artifacts():
+        if key not in keys and remove(path, size, "orphaned"):
+            continue
+        remaining.append((accessed, path, size))
+
+    total = sum(size for _, _, size in remaining)
+    if max_bytes is not None:
+        for accessed, path, size in sorted(remaining):
+            if total <= max_bytes:
+                break
+            if remove(path, size, "evicted"):
+                total -= size
+    result["remaining"] = total
+
+    if not dry_run:
+        # Remove the lock files left without artifact, such as by failed computations, and then the directories
+        # that are left empty, deepest first.
+        for directory, _, names in sorted(os.walk(str(settings.MONK_ARTIFACT_DIR)), reverse=True):
+            for name in names:
+                path = os.path.join(directory, name[: -len(".lock")])
+                if name.endswith(".lock") and not os.path.exists(path):
+                    remove_unused(path)
+            if directory != str(settings.MONK_ARTIFACT_DIR):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+    return result
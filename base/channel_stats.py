@@ -0,0 +1,62 @@
+import numpy as np
+
+# Summary statistics of the channels of a recording, computed in one pass over the samples.
+#
+# The channel is read in chunks from the memory mapped recording. Count, minimum, maximum, mean and
+# standard deviation are combined from the chunks exactly (with Chan's formula for the variance), and the
+# percentiles are computed from an evenly spaced subsample of at most PERCENTILE_SAMPLES values that is
+# collected during the same pass. Missing samples are counted, and left out of all other statistics.
+
+# Number of samples read at a time.
+CHUNK_SIZE = 1 << 20
+# Largest number of samples the percentiles are computed from.
+PERCENTILE_SAMPLES = 1 << 20
+# Percentiles that are computed, and the names they are stored under.
+PERCENTILES = {"p5": 5, "p25": 25, "median": 50, "p75": 75, "p95": 95}
+
+
+# Function returning the statistics of an array of samples, or of a ChannelView of an MFER file.
+# interval is the sampling interval in seconds, used for the duration.
+def channel_statistics(values, interval):
+    total = len(values)
+    stride = max(-(-total // PERCENTILE_SAMPLES), 1)
+    count = 0
+    mean = 0.0
+    squares = 0.0
+    minimum = np.inf
+    maximum = -np.inf
+    missing = 0
+    subsample = []
+
+    for first in range(0, total, CHUNK_SIZE):
+        chunk = np.asarray(values[first : first + CHUNK_SIZE], dtype=np.float64)
+        # Take every stride-th sample of the whole channel, whatever the chunk boundaries are.
+        sampled = chunk[(-first) % stride :: stride]
+        subsample.append(sampled[~np.isnan(sampled)])
+        valid = chunk[~np.isnan(chunk)]
+        missing += chunk.size - valid.size
+        if valid.size == 0:
+            continue
+        chunk_mean = valid.mean()
+        chunk_squares = ((valid - chunk_mean) ** 2).sum()
+        combined = count + valid.size
+        delta = chunk_mean - mean
+        mean += delta * valid.size / combined
+        squares += chunk_squares + delta * delta * count * valid.size / combined
+        count = combined
+        minimum = min(minimum, valid.min())
+        maximum = max(maximum, valid.max())
+
+    statistics = {
+        "samples": total,
+        "missing_fraction": missing / total if total else 0.0,
+        "duration": total * interval,
+        "minimum": float(minimum) if count else None,
+        "maximum": float(maximum) if count else None,
+        "mean": float(mean) if count else None,
+        "std": float(np.sqrt(squares / count)) if count else None,
+    }
+    subsample = np.concatenate(subsample) if subsample else np.empty(0)
+    for name, percentile in PERCENTILES.items():
+        statistics[name] = float(np.percentile(subsample, percentile)) if subsample.size else None
+    return statistics
@@ -0,0 +1,109 @@
+import re
+import zlib
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from .artifacts import open_artifact
+
+# Compression of downloads.
+#
+# Text downloads such as CSV exports compress very well, so they are compressed while they are sent,
+# a chunk at a time, with the best encoding the client accepts (zstd when the zstandard package is
+# installed, otherwise gzip), and sent with a Content-Encoding header so browsers decompress them on the
+# fly. A download can also be requested as a compressed file, such as "export.csv.zst", which is kept
+# compressed on the client.
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Suffix and content type of the compressed files, in order of preference for content negotiation.
+ENCODINGS = {
+    "zstd": (".zst", "application/zstd"),
+    "gzip": (".gz", "application/gzip"),
+}
+# Compression levels. Level 3 of zstd and level 6 of gzip are their defaults, and fast enough for streaming.
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+# Number of bytes read from a file at a time.
+CHUNK_SIZE = 1 << 20
+
+
+# Exception raised for compressions that are unknown, or whose package is not installed.
+class CompressionError(ValueError):
+    pass
+
+
+# Function checking a requested compression, returning its name, or None for no compression.
+def check_compression(name):
+    if not name or name == "none":
+        return None
+    name = name.lower()
+    if name not in ENCODINGS:
+        raise CompressionError(f"Unknown compression '{name}'. Use one of {', '.join(ENCODINGS)}.")
+    if name == "zstd" and not HAS_ZSTD:
+        raise CompressionError("The zstd compression needs zstandard, which is not installed.")
+    return name
+
+
+# Function returning the best encoding accepted by the client in its Accept-Encoding header, or None.
+def negotiate(accept_encoding):
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, parameters = item.strip().partition(";")
+        match = re.search(r"q=([0-9.]+)", parameters)
+        try:
+            quality = float(match.group(1)) if match else 1.0
+        except ValueError:
+            continue
+        accepted[name.strip().lower()] = quality
+    for name in ENCODINGS:
+        if name == "zstd" and not HAS_ZSTD:
+            continue
+        if accepted.get(name, accepted.get("*", 0)) > 0:
+            return name
+    return None
+
+
+# Function compressing chunks of bytes with the given encoding, yielding the compressed chunks.
+def compress_chunks(chunks, encoding):
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _read_chunks(path):
+    with open_artifact(path) as f:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+
+# Function returning a response sending an artifact (given by its path), or bytes, as a download named filename.
+# With compress, the download is a file compressed with that encoding, with its suffix added to the name.
+# Otherwise, text downloads are compressed while sent with the best encoding accepted by the client.
+def download_response(request, source, filename, content_type, compress=None, text=True):
+    encoding = compress or (negotiate(request.headers.get("Accept-Encoding")) if text else None)
+    if encoding is None:
+        if isinstance(source, str):
+            response = FileResponse(open_artifact(source), content_type=content_type)
+        else:
+            response = HttpResponse(source, content_type=content_type)
+    else:
+        chunks = _read_chunks(source) if isinstance(source, str) else iter([source])
+        if compress:
+            suffix, content_type = ENCODINGS[compress]
+            filename += suffix
+        response = StreamingHttpResponse(compress_chunks(chunks, encoding), content_type=content_type)
+        if not compress:
+            response["Content-Encoding"] = encoding
+    if text and not compress:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from monklib import get_header, Data
+from . import metrics
+
+# In-process pool of parsed monklib objects.
+#
+# Parsing a recording with monklib reads and decodes the whole file, so the parsed headers are kept in a
+# bounded LRU pool and reused by later requests for the same recording. Data objects are mutated by
+# setChannelSelection, setIntervalSelection and anonymize, and being native objects they can not be copied,
+# so the raw bytes of recordings are pooled instead and every request parses its own Data object from memory.
+# Entries are keyed by path, modification time and size, so a changed file is read again. The limits of the
+# pools are read from the settings whenever an entry is added.
+
+
+# Bounded least recently used pool, limited both by number of entries and by their approximate size in bytes.
+class LRUPool:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def limits(self):
+        return self.max_entries, self.max_bytes
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value, size):
+        max_entries, max_bytes = self.limits()
+        # Objects larger than the whole pool are not kept.
+        if size > max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > max_entries or self.total_bytes > max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+# LRU pool with its limits in the named settings.
+class SettingsPool(LRUPool):
+    def __init__(self, entries_setting, bytes_setting, default_entries, default_bytes):
+        super().__init__(default_entries, default_bytes)
+        self.entries_setting = entries_setting
+        self.bytes_setting = bytes_setting
+
+    def limits(self):
+        return (
+            getattr(settings, self.entries_setting, self.max_entries),
+            getattr(settings, self.bytes_setting, self.max_bytes),
+        )
+
+
+# The size of a pooled header is estimated as the length of its text.
+_headers = SettingsPool("MONK_HEADER_POOL_MAX_ENTRIES", "MONK_HEADER_POOL_MAX_BYTES", 64, 16 * 1024 * 1024)
+_data = SettingsPool("MONK_DATA_POOL_MAX_ENTRIES", "MONK_DATA_POOL_MAX_BYTES", 8, 512 * 1024 * 1024)
+
+
+def _key(path):
+    stat = os.stat(path)
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+# Function returning the parsed header of a recording, parsing it only if it is not pooled yet.
+# The header is shared between requests and must not be modified.
+def get_cached_header(path):
+    key = _key(path)
+    header = _headers.get(key)
+    metrics.record_cache("monklib_headers", header is not None)
+    if header is None:
+        header = get_header(str(path))
+        _headers.put(key, header, len(str(header)))
+    return header
+
+
+# Function parsing a Data object from the content of a recording.
+# monklib only opens paths, so the content is handed over through an anonymous file in memory.
+def _parse(content):
+    fd = os.memfd_create("monk-recording", os.MFD_CLOEXEC)
+    try:
+        with os.fdopen(os.dup(fd), "wb") as memory_file:
+            memory_file.write(content)
+        return Data(f"/proc/self/fd/{fd}")
+    finally:
+        os.close(fd)
+
+
+# Function returning a Data object of a recording that the caller is free to modify.
+def get_data(path):
+    key = _key(path)
+    content = _data.get(key)
+    metrics.record_cache("monklib_data", content is not None)
+    if content is None:
+        if not hasattr(os, "memfd_create"):
+            return Data(str(path))
+        with open(path, "rb") as recording:
+            content = recording.read()
+        _data.put(key, content, len(content))
+    return _parse(content)
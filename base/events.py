@@ -0,0 +1,38 @@
+import numpy as np
+from .quality import Runs
+
+# Threshold events in the channels of a recording.
+#
+# An event rule gives a channel name pattern, a threshold ("below" or "above") and the shortest duration
+# of an event, for example every desaturation where SpO2 stays below 90 % for at least 10 seconds. The
+# channels are scanned in chunks, with the runs of samples beyond the threshold followed across chunk
+# boundaries, and every run that lasts long enough becomes an event with its lowest or highest value.
+
+# Number of samples read at a time.
+CHUNK_SIZE = 1 << 20
+# Largest number of events of one rule in one channel.
+MAX_EVENTS = 10000
+
+
+# Function returning the events in a channel, given as an array or as a ChannelView of an MFER file, as a list
+# of (start, end, value) tuples with times in seconds and the most extreme value of the event.
+# times is an optional function returning the time of a sample number; by default sample n is at n * interval.
+def find_events(values, interval, below=None, above=None, min_seconds=0, times=None):
+    if times is None:
+        times = lambda number: number * interval
+    runs = Runs(max(int(round(min_seconds / interval)), 1))
+    for first in range(0, len(values), CHUNK_SIZE):
+        chunk = np.asarray(values[first : first + CHUNK_SIZE], dtype=np.float64)
+        beyond = np.zeros(chunk.size, dtype=bool)
+        if below is not None:
+            beyond |= chunk < below
+        if above is not None:
+            beyond |= chunk > above
+        runs.add(beyond, first)
+
+    events = []
+    for start, end in runs.finish()[:MAX_EVENTS]:
+        samples = np.asarray(values[start:end], dtype=np.float64)
+        value = samples.min() if below is not None else samples.max()
+        events.append((float(times(start)), float(times(end - 1) + interval), float(value)))
+    return events
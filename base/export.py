@@ -0,0 +1,140 @@
+import os
+import logging
+import zipfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from .artifacts import open_artifact
+
+# Export of many recordings at once as one ZIP archive, such as all recordings of a project.
+#
+# The archive is streamed to the client while it is written: the ZIP writer writes to a buffer that is
+# emptied after every chunk of a member, so neither the archive nor a member is ever held in memory or
+# written to disk as a whole. The conversions of the recordings (to CSV, or to anonymized MWF) run in a
+# pool of MONK_EXPORT_WORKERS processes, up to two per worker ahead of the ZIP writer, and produce the
+# same artifacts as the downloads of single files, so a conversion is shared with earlier downloads.
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes of a member read and compressed at a time.
+CHUNK_SIZE = 1 << 20
+# Number of export processes when MONK_EXPORT_WORKERS is None. Every web worker process has its own pool of
+# export processes, each a full Django process, so the pool is kept small.
+DEFAULT_WORKERS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Write only target of the ZIP writer, keeping what was written until it is taken.
+# It can not seek, so the ZIP writer puts the sizes of the members after their data.
+class _Buffer:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# Function yielding the bytes of a ZIP archive of the given members, a chunk at a time.
+# members is an iterable of (name, path, error) tuples: the file at path is stored under name, and a
+# member that could not be produced is replaced by a text file with the error, named name + ".error.txt".
+def stream_zip(members):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, path, error in members:
+            if path is None:
+                archive.writestr(f"{name}.error.txt", error)
+            else:
+                # The size is known up front, so the writer knows whether the member needs ZIP64.
+                # The artifact is opened first, so it is not removed before its size is read.
+                with open_artifact(path) as source:
+                    info = zipfile.ZipInfo.from_file(path, name)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with archive.open(info, "w") as target:
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                            target.write(chunk)
+                            data = buffer.take()
+                            if data:
+                                yield data
+            data = buffer.take()
+            if data:
+                yield data
+    yield buffer.take()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # New processes are started rather than forked, as forking a threaded server is not safe.
+            _pool = ProcessPoolExecutor(
+                max_workers=_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return _pool
+
+
+def _workers():
+    workers = getattr(settings, "MONK_EXPORT_WORKERS", DEFAULT_WORKERS)
+    if workers is None:
+        return min(DEFAULT_WORKERS, os.cpu_count() or 1)
+    return workers
+
+
+# Function running conversions in the pool of export processes, yielding (name, path, error) tuples in
+# the order of the tasks, for stream_zip. tasks is an iterable of (name, function, arguments) tuples,
+# where function is a module level function returning the path of the converted file. At most two
+# conversions per worker are started ahead of the one that is waited for. With MONK_EXPORT_WORKERS set
+# to 0 the conversions run one by one in the calling thread.
+def convert_ahead(tasks):
+    workers = _workers()
+    if workers == 0:
+        for name, function, arguments in tasks:
+            yield _convert(name, function, arguments)
+        return
+
+    pool = _get_pool()
+    pending = deque()
+    tasks = iter(tasks)
+    try:
+        while True:
+            while len(pending) < 2 * workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                name, function, arguments = task
+                pending.append((name, pool.submit(function, *arguments)))
+            if not pending:
+                return
+            name, future = pending.popleft()
+            try:
+                yield name, future.result(), None
+            except Exception as e:
+                logger.exception("Export of %s failed", name)
+                yield name, None, str(e)
+    finally:
+        # Conversions that have not started are not needed when the client goes away.
+        for _, future in pending:
+            future.cancel()
+
+
+def _convert(name, function, arguments):
+    try:
+        return name, function(*arguments), None
+    except Exception as e:
+        logger.exception("Export of %s failed", name)
+        return name, None, str(e)
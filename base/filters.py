@@ -0,0 +1,242 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .artifacts import derived_path, open_fresh
+
+# Signal processing filters applied to the waveforms before they are plotted or exported.
+#
+# Filters are given as a comma separated list of "kind:parameter", applied in order, for example
+# "highpass:0.5,notch:50" to remove baseline wander and mains interference from an ECG:
+#   highpass:<Hz>, lowpass:<Hz>, bandpass:<Hz>-<Hz>, notch:<Hz>, median:<seconds>
+# The frequency filters are linear phase FIR filters (windowed sinc), applied with FFT convolution, and
+# the median filter is a moving median. Samples are processed in chunks, and every filter keeps the last
+# samples of the previous chunk as its state, so a channel of any length is filtered in bounded memory.
+# The delay of the filters is removed, so filtered samples line up with the original ones.
+
+KINDS = ("highpass", "lowpass", "bandpass", "notch", "median")
+
+# Width in Hz of the transition between pass band and stop band. Narrower transitions need longer kernels.
+TRANSITION_WIDTH = 1.0
+# Width in Hz of the band removed by a notch filter.
+NOTCH_WIDTH = 2.0
+# Longest kernel that is designed, to keep filters with very narrow transitions from using too much memory.
+MAX_TAPS = 1 << 17
+# Number of samples filtered at a time.
+CHUNK_SIZE = 1 << 16
+# Number of values the moving median looks at in one step, limiting the size of its temporary arrays.
+MEDIAN_STEP_VALUES = 1 << 22
+
+
+# Exception raised for filter lists that can not be parsed or applied.
+class FilterError(ValueError):
+    pass
+
+
+# Function parsing a filter list such as "highpass:0.5,notch:50" into a list of (kind, parameters) tuples.
+def parse_filters(text):
+    filters = []
+    for item in (text or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, argument = item.partition(":")
+        kind = kind.strip().lower()
+        if kind not in KINDS:
+            raise FilterError(f"Unknown filter '{kind}'.")
+        try:
+            parameters = tuple(float(value) for value in argument.split("-"))
+        except ValueError:
+            raise FilterError(f"Invalid parameters for filter '{kind}'.")
+        if len(parameters) != (2 if kind == "bandpass" else 1):
+            raise FilterError(f"Invalid parameters for filter '{kind}'.")
+        if not all(math.isfinite(value) and value > 0 for value in parameters):
+            raise FilterError(f"The parameters of filter '{kind}' must be positive.")
+        filters.append((kind, parameters))
+    return filters
+
+
+# Function returning the canonical text of a filter list, used in cache keys.
+def format_filters(filters):
+    return ",".join(
+        f"{kind}:{'-'.join(format(value, 'g') for value in parameters)}" for kind, parameters in filters
+    )
+
+
+def _taps(sampling_rate, transition):
+    # Length of a Hamming windowed kernel with the given transition width, always odd so the delay is whole.
+    taps = int(math.ceil(3.3 * sampling_rate / transition)) | 1
+    if taps > MAX_TAPS:
+        raise FilterError("The filter is too narrow for the sampling rate of the channel.")
+    return taps
+
+
+def _lowpass(cutoff, sampling_rate, taps):
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = np.sinc(2 * cutoff / sampling_rate * n) * np.hamming(taps)
+    return kernel / kernel.sum()
+
+
+def _invert(kernel):
+    # Turn a kernel passing a band into one removing it.
+    kernel = -kernel
+    kernel[(kernel.size - 1) // 2] += 1
+    return kernel
+
+
+# Function designing one filter for the given sampling rate.
+# Returns the FIR kernel for frequency filters, and the window length in samples for the median filter.
+def design(kind, parameters, sampling_rate):
+    nyquist = sampling_rate / 2
+    if kind == "median":
+        return max(int(round(parameters[0] * sampling_rate)) | 1, 1)
+
+    if kind == "notch":
+        low, high = parameters[0] - NOTCH_WIDTH / 2, parameters[0] + NOTCH_WIDTH / 2
+    elif kind == "bandpass":
+        low, high = parameters
+    elif kind == "highpass":
+        low, high = parameters[0], None
+    else:
+        low, high = None, parameters[0]
+    edges = [edge for edge in (low, high) if edge is not None]
+    if min(edges) <= 0 or max(edges) >= nyquist or (len(edges) == 2 and low >= high):
+        raise FilterError(f"The frequencies of filter '{kind}' must be between 0 and {nyquist:g} Hz.")
+
+    # The transition must fit below, between and above the edges of the band.
+    transition = min(TRANSITION_WIDTH, min(edges), nyquist - max(edges))
+    if len(edges) == 2:
+        transition = min(transition, high - low)
+    taps = _taps(sampling_rate, transition)
+    if kind == "lowpass":
+        return _lowpass(high, sampling_rate, taps)
+    if kind == "highpass":
+        return _invert(_lowpass(low, sampling_rate, taps))
+    band = _lowpass(high, sampling_rate, taps) - _lowpass(low, sampling_rate, taps)
+    return band if kind == "bandpass" else _invert(band)
+
+
+# One filter of a chain, keeping the samples of the previous chunk it still needs.
+class _Stage:
+    def __init__(self, designed):
+        self.median = isinstance(designed, int)
+        self.kernel = None if self.median else designed
+        self.length = designed if self.median else designed.size
+        self.delay = (self.length - 1) // 2
+        self.history = None
+        self.spectra = {}
+
+    def _convolve(self, samples):
+        # FFT convolution, keeping only the outputs for which the whole kernel overlaps the samples.
+        size = 1 << (samples.size - 1).bit_length()
+        if size not in self.spectra:
+            self.spectra = {size: np.fft.rfft(self.kernel, size)}
+        result = np.fft.irfft(np.fft.rfft(samples, size) * self.spectra[size], size)
+        return result[self.length - 1 : samples.size]
+
+    def _median(self, samples):
+        windows = sliding_window_view(samples, self.length)
+        step = max(MEDIAN_STEP_VALUES // self.length, 1)
+        return np.concatenate(
+            [np.median(windows[first : first + step], axis=1) for first in range(0, len(windows), step)]
+        )
+
+    # Function filtering a chunk, returning one output per input sample, delayed by self.delay samples.
+    def process(self, chunk):
+        if self.history is None:
+            # Before the first sample, the signal is taken to be constant.
+            self.history = np.full(self.length - 1, chunk[0])
+        samples = np.concatenate([self.history, chunk])
+        self.history = samples[samples.size - (self.length - 1) :]
+        return self._median(samples) if self.median else self._convolve(samples)
+
+
+# Chain of filters applied one after the other to the chunks of one channel.
+class FilterChain:
+    def __init__(self, filters, sampling_rate):
+        self.stages = [_Stage(design(kind, parameters, sampling_rate)) for kind, parameters in filters]
+        self.delay = sum(stage.delay for stage in self.stages)
+
+    def process(self, chunk):
+        for stage in self.stages:
+            chunk = stage.process(chunk)
+        return chunk
+
+
+# Function filtering a channel given as an iterable of chunks, yielding the filtered chunks.
+# The output is not delayed: in total, as many samples are yielded as were given, and every output sample
+# lines up with its input sample. Missing samples (NaN) are held at the last value while filtering, and
+# are missing in the output as well.
+def filter_chunks(chunks, filters, sampling_rate):
+    chain = FilterChain(filters, sampling_rate)
+    skip = chain.delay
+    last = None
+    pending = np.empty(0, dtype=bool)
+
+    def emit(output):
+        nonlocal skip, pending
+        dropped = min(skip, output.size)
+        skip -= dropped
+        output = output[dropped:].astype(np.float32)
+        output[pending[: output.size]] = np.nan
+        pending = pending[output.size :]
+        return output
+
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.size == 0:
+            continue
+        missing = np.isnan(chunk)
+        if missing.any():
+            positions = np.maximum.accumulate(np.where(missing, 0, np.arange(chunk.size)))
+            filled = chunk[positions]
+            leading = np.isnan(filled)
+            if leading.any():
+                valid = chunk[~missing]
+                filled[leading] = last if last is not None else (valid[0] if valid.size else 0.0)
+            chunk = filled
+        last = chunk[-1]
+        pending = np.concatenate([pending, missing])
+        yield emit(chain.process(chunk))
+
+    # Push the last value through the filters to get the outputs for the last samples.
+    if last is not None and chain.delay:
+        yield emit(chain.process(np.full(chain.delay, last)))
+
+
+# Function filtering a whole channel, returning a float32 array of the same length.
+def apply_filters(values, filters, sampling_rate):
+    values = np.asarray(values)
+    pieces = list(
+        filter_chunks(
+            (values[first : first + CHUNK_SIZE] for first in range(0, values.size, CHUNK_SIZE)),
+            filters,
+            sampling_rate,
+        )
+    )
+    return np.concatenate(pieces) if pieces else np.empty(0, dtype=np.float32)
+
+
+# Function returning the filtered samples of a channel of an MFER file, given as a ChannelView.
+# The whole channel is filtered once per filter list and stored next to the file as a ".npy" artifact,
+# which is opened as a memory mapped array, so time windows of the filtered channel are read without
+# filtering again.
+def filtered_channel(file_path, view, filters):
+    output_path = derived_path(
+        file_path, ".npy", {"channel": view.number, "filters": format_filters(filters)}
+    )
+
+    def compute(temporary_path):
+        output = np.lib.format.open_memmap(
+            temporary_path, mode="w+", dtype=np.float32, shape=(len(view),)
+        )
+        chunks = (view[first : first + CHUNK_SIZE] for first in range(0, len(view), CHUNK_SIZE))
+        position = 0
+        for piece in filter_chunks(chunks, filters, 1 / view.interval):
+            output[position : position + piece.size] = piece
+            position += piece.size
+        output.flush()
+        del output
+
+    # The mapping stays valid when the artifact is removed later, so it is only locked while it is mapped.
+    with open_fresh(output_path, file_path, compute, "filtered_channels"):
+        return np.load(output_path, mmap_mode="r")
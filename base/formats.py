@@ -0,0 +1,167 @@
+import zipfile
+import numpy as np
+import pandas as pd
+from .timebase import absolute_times
+
+# File formats of the waveform exports.
+#
+# Besides CSV, the aligned channels of an export can be written in binary formats that are smaller and much
+# faster to load: Parquet and Arrow IPC (Feather) files with float32 columns and zstd compression, NumPy
+# ".npz" archives and HDF5 files. Every format holds a "time" column or array, with wall clock times when
+# the start of the recording is known and seconds from the start otherwise, and one float32 column per
+# channel. In ".npz" and HDF5 files the channels are stored as one array "values" of shape (channels,
+# samples), with the channel names in "channels", as channel names are not always valid array names.
+# Parquet and Arrow need pyarrow, and HDF5 needs h5py; formats whose package is not installed are refused.
+# Exports are written a slice of the time grid at a time, appended to the file, so long exports are never held
+# in memory as a whole. The ".npz" values are written one channel after the other, as they are stored by channel.
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    import h5py
+
+    HAS_H5PY = True
+except ImportError:
+    HAS_H5PY = False
+
+# Suffix and content type of every format.
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "npz": (".npz", "application/octet-stream"),
+    "hdf5": (".h5", "application/x-hdf5"),
+}
+# Compression of the Parquet and Arrow files.
+COMPRESSION = "zstd"
+
+
+# Exception raised for formats that are unknown, or whose package is not installed.
+class FormatError(ValueError):
+    pass
+
+
+# Function checking that a format can be written, returning its name in lower case.
+def check_format(name):
+    name = (name or "csv").lower()
+    if name not in FORMATS:
+        raise FormatError(f"Unknown format '{name}'. Use one of {', '.join(FORMATS)}.")
+    if name in ("parquet", "arrow") and not HAS_PYARROW:
+        raise FormatError(f"The {name} format needs pyarrow, which is not installed.")
+    if name == "hdf5" and not HAS_H5PY:
+        raise FormatError("The hdf5 format needs h5py, which is not installed.")
+    return name
+
+
+# Function writing channels aligned on a common time grid to path in the given format. columns are the channel
+# names, count the number of grid points, and slices a function returning, for a list of channel positions, the
+# (grid, aligned) slices of those channels as timebase.aligned_slices. The grid is in seconds, written as wall clock
+# times when start, the start of the recording, is given. progress is called with the fraction that is written.
+def write_aligned(path, name, columns, count, slices, start=None, progress=None):
+    if name not in FORMATS:
+        raise FormatError(f"Unknown format '{name}'.")
+    if name == "npz":
+        _write_npz(path, columns, count, slices, start, progress)
+        return
+    rows = list(range(len(columns)))
+    written = 0
+    writer = None
+    try:
+        # An export without samples is written from one empty slice, so it still has its columns.
+        empty = [(np.empty(0), np.empty((len(columns), 0), dtype=np.float32))]
+        for grid, aligned in slices(rows) if count else empty:
+            writer = _append(writer, path, name, columns, count, grid, aligned, start, written)
+            written += grid.size
+            if progress is not None and count:
+                progress(written / count)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# Function appending a slice to the export, opening the writer of the format with the first slice.
+def _append(writer, path, name, columns, count, grid, aligned, start, offset):
+    times = _times(grid, start)
+    if name == "csv":
+        if writer is None:
+            writer = open(path, "w", newline="")
+        _frame(times, aligned, columns).to_csv(writer, header=offset == 0, date_format="%Y-%m-%dT%H:%M:%S.%f")
+    elif name in ("parquet", "arrow"):
+        table = pyarrow.Table.from_pandas(_frame(times, aligned, columns).reset_index(names="time"), preserve_index=False)
+        if writer is None:
+            if name == "parquet":
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema, compression=COMPRESSION)
+            else:
+                options = pyarrow.ipc.IpcWriteOptions(compression=COMPRESSION)
+                writer = pyarrow.ipc.new_file(path, table.schema, options=options)
+        writer.write_table(table)
+    elif name == "hdf5":
+        if writer is None:
+            writer = h5py.File(path, "w")
+            if start is not None:
+                # HDF5 has no date type, so wall clock times are stored as nanoseconds since the epoch.
+                writer.create_dataset("time", shape=(count,), dtype=np.int64)
+                writer["time"].attrs["units"] = "nanoseconds since 1970-01-01T00:00:00"
+            else:
+                writer.create_dataset("time", shape=(count,), dtype=np.float64)
+                writer["time"].attrs["units"] = "seconds"
+            shape = (len(columns), count)
+            writer.create_dataset(
+                "values", shape=shape, dtype=np.float32, compression="gzip", chunks=_chunks(shape)
+            )
+            writer.create_dataset("channels", data=np.array(columns, dtype=object), dtype=h5py.string_dtype())
+        if grid.size:
+            writer["time"][offset : offset + grid.size] = times.astype(np.int64) if start is not None else times
+            writer["values"][:, offset : offset + grid.size] = aligned
+    return writer
+
+
+# Function writing a ".npz" archive, streaming the arrays into the members of the archive.
+def _write_npz(path, columns, count, slices, start, progress):
+    time_dtype = np.dtype("datetime64[ns]") if start is not None else np.dtype(np.float64)
+    total = count * (len(columns) + 1)
+    written = 0
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        with archive.open("time.npy", "w", force_zip64=True) as f:
+            _write_header(f, time_dtype, (count,))
+            for grid, _ in slices([]) if count else []:
+                f.write(_times(grid, start).astype(time_dtype).tobytes())
+                written += grid.size
+                if progress is not None:
+                    progress(written / total)
+        with archive.open("values.npy", "w", force_zip64=True) as f:
+            _write_header(f, np.dtype(np.float32), (len(columns), count))
+            for row in range(len(columns)):
+                for grid, aligned in slices([row]) if count else []:
+                    f.write(aligned[0].tobytes())
+                    written += grid.size
+                    if progress is not None:
+                        progress(written / total)
+        with archive.open("channels.npy", "w") as f:
+            np.lib.format.write_array(f, np.array([str(column) for column in columns]))
+
+
+def _write_header(f, dtype, shape):
+    np.lib.format.write_array_header_2_0(
+        f, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape}
+    )
+
+
+def _times(grid, start):
+    return absolute_times(start, grid) if start is not None else grid
+
+
+def _frame(times, aligned, columns):
+    return pd.DataFrame(aligned.T, index=pd.Index(times, name="Time"), columns=list(columns))
+
+
+def _chunks(shape):
+    # Chunks of one channel and up to a million samples, so reading a time window of a channel reads little else.
+    return (1, max(min(shape[1], 1 << 20), 1)) if shape[0] and shape[1] else None
@@ -0,0 +1,117 @@
+import numpy as np
+
+# R peak detection on ECG channels, and the heart rate derived from the beat times.
+#
+# The detector follows the energy based approach of Pan and Tompkins: the slope of the signal is squared
+# and averaged over a short window, so every QRS complex becomes one pulse of energy. Pulses above a
+# threshold relative to the strongest pulses are taken as beats, and the R peak of a beat is the sample
+# with the largest deviation from the baseline within its pulse. Long channels are processed in blocks
+# read from the memory mapped recording, with a margin around every block so beats at the edges of a
+# block are not missed.
+
+# Length in seconds of the blocks a channel is processed in, and of the margin read around each block.
+BLOCK_SECONDS = 60
+MARGIN_SECONDS = 1
+# Length in seconds of the window the energy of the slope is averaged over, about the width of a QRS complex.
+INTEGRATION_SECONDS = 0.15
+# Shortest time in seconds between two beats.
+REFRACTORY_SECONDS = 0.25
+# Fraction of the level of the strongest pulses a pulse must reach to be taken as a beat.
+THRESHOLD = 0.3
+# Heart rates in beats per minute outside this range are not physiological, and are left out of the trend.
+MIN_RATE = 20
+MAX_RATE = 300
+
+
+# Function removing peaks closer than distance samples to a neighbouring peak, keeping the stronger one.
+def _apply_refractory(peaks, strength, distance):
+    while peaks.size > 1:
+        close = np.flatnonzero(np.diff(peaks) < distance)
+        if close.size == 0:
+            break
+        weaker = np.where(strength[close] < strength[close + 1], close, close + 1)
+        keep = np.ones(peaks.size, dtype=bool)
+        keep[weaker] = False
+        peaks = peaks[keep]
+        strength = strength[keep]
+    return peaks, strength
+
+
+# Function returning the sample numbers of the R peaks in an ECG signal, and the strength of every peak.
+def detect_r_peaks(values, sampling_rate):
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if valid.sum() < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    deviation = np.abs(np.where(valid, values - np.median(values[valid]), 0.0))
+    slope = np.diff(np.where(valid, values, np.median(values[valid])), prepend=values[valid][0])
+    width = max(int(INTEGRATION_SECONDS * sampling_rate), 1)
+    energy = np.convolve(slope * slope, np.ones(width) / width, mode="same")
+
+    level = np.percentile(energy, 99)
+    if level <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    above = energy > THRESHOLD * level
+    edges = np.diff(above.astype(np.int8), prepend=0)
+    starts = np.flatnonzero(edges == 1)
+    samples = np.flatnonzero(above)
+    if samples.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    # The R peak of a pulse is its sample with the largest deviation from the baseline.
+    pulse = np.searchsorted(starts, samples, side="right") - 1
+    order = np.lexsort((-deviation[samples], pulse))
+    first = np.concatenate([[True], np.diff(pulse[order]) != 0])
+    peaks = samples[order][first]
+    return _apply_refractory(peaks, deviation[peaks], REFRACTORY_SECONDS * sampling_rate)
+
+
+# Function returning the times of the R peaks of an ECG channel, given as a ChannelView of an MFER file,
+# in seconds from the start of the recording.
+def detect_beats(view):
+    sampling_rate = 1 / view.interval
+    block = int(BLOCK_SECONDS * sampling_rate)
+    margin = int(MARGIN_SECONDS * sampling_rate)
+    peaks = []
+    strengths = []
+    times = []
+    for first in range(0, len(view), block):
+        low = max(first - margin, 0)
+        high = min(first + block + margin, len(view))
+        found, strength = detect_r_peaks(view[low:high], sampling_rate)
+        found += low
+        inside = (found >= first) & (found < first + block)
+        peaks.append(found[inside])
+        strengths.append(strength[inside])
+        times.append(view.times(slice(low, high))[found[inside] - low])
+    if not peaks:
+        return np.empty(0)
+    peaks, strength = np.concatenate(peaks), np.concatenate(strengths)
+    times = np.concatenate(times)
+    # Beats found on both sides of a block boundary are only counted once.
+    kept, _ = _apply_refractory(peaks, strength, REFRACTORY_SECONDS * sampling_rate)
+    return times[np.isin(peaks, kept)]
+
+
+# Function returning the heart rate in beats per minute at every beat after the first, and the times of those beats.
+# Intervals giving rates outside [MIN_RATE, MAX_RATE] are left out.
+def beat_rates(beat_times):
+    beat_times = np.asarray(beat_times, dtype=np.float64)
+    if beat_times.size < 2:
+        return np.empty(0), np.empty(0)
+    rates = 60 / np.diff(beat_times)
+    plausible = (rates >= MIN_RATE) & (rates <= MAX_RATE)
+    return beat_times[1:][plausible], rates[plausible]
+
+
+# Function returning the mean heart rate in every interval of the given length, from 0 up to duration seconds.
+# Intervals without beats are None.
+def heart_rate_trend(beat_times, interval, duration=None):
+    times, rates = beat_rates(beat_times)
+    if duration is None:
+        duration = times[-1] if times.size else 0
+    count = max(int(np.ceil(duration / interval)), 1)
+    bins = np.clip((times // interval).astype(np.int64), 0, count - 1)
+    beats = np.bincount(bins, minlength=count)
+    sums = np.bincount(bins, weights=rates, minlength=count)
+    return [round(float(total / number), 1) if number else None for total, number in zip(sums, beats)]
@@ -0,0 +1,179 @@
+import os
+import re
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from .models import ExportJob
+from .filters import parse_filters
+from .artifacts import open_artifact, remove_unused
+from .utils import export_waveforms, get_waveform_index
+
+# Background export jobs.
+#
+# An export that is submitted as a job is produced by a pool of MONK_EXPORT_JOB_WORKERS background threads
+# once the job is saved, so the request returns at once and the user follows the progress of the job on
+# its page. The exported file is the same artifact as for a direct download of the same selection. It can
+# be downloaded with HTTP Range requests, so an interrupted download is resumed instead of started again,
+# until the job expires MONK_EXPORT_JOB_TTL seconds after it finished. Expired jobs are removed with their
+# exported files when new jobs are submitted and by the gc_artifacts command. Jobs are lost when their
+# process stops, so jobs that have not finished MONK_EXPORT_JOB_TIMEOUT seconds after they were submitted
+# are marked as failed then.
+
+logger = logging.getLogger(__name__)
+
+# Number of bytes of an exported file sent at a time.
+CHUNK_SIZE = 1 << 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "MONK_EXPORT_JOB_WORKERS", 1),
+                thread_name_prefix="export",
+            )
+        return _executor
+
+
+# Function queueing a job to be run once it is committed, removing expired jobs first.
+def submit(job):
+    expire()
+    job.expires_at = timezone.now() + _timeout()
+    job.save(update_fields=["expires_at"])
+    job_id = job.id
+    transaction.on_commit(lambda: _get_executor().submit(run, job_id))
+
+
+# Function running an export job, storing its progress and result.
+def run(job_id):
+    close_old_connections()
+    try:
+        job = ExportJob.objects.select_related("file").filter(id=job_id, status=ExportJob.QUEUED).first()
+        if job is None:
+            # The job was removed, or failed because it did not start in time.
+            return
+        jobs = ExportJob.objects.filter(id=job_id)
+        jobs.update(status=ExportJob.RUNNING)
+        parameters = job.parameters
+        try:
+            layout = get_waveform_index(job.file)
+            if parameters["timestamps"] and layout is None:
+                raise ValueError("Timestamps, filters and binary formats are not supported for this file.")
+            result = export_waveforms(
+                job.file.file.path,
+                layout,
+                parameters["channels"],
+                parameters["start_time"],
+                parameters["end_time"],
+                parameters["timestamps"],
+                parameters["sampling_rate"],
+                parse_filters(parameters["filters"]),
+                parameters["format"],
+                progress=lambda fraction: jobs.update(progress=fraction),
+            )
+            _finish(jobs, status=ExportJob.DONE, progress=1, result=result)
+        except Exception as e:
+            logger.exception("Export job %s failed", job_id)
+            _finish(jobs, status=ExportJob.FAILED, error=str(e))
+    finally:
+        close_old_connections()
+
+
+def _timeout():
+    return timedelta(seconds=getattr(settings, "MONK_EXPORT_JOB_TIMEOUT", 6 * 3600))
+
+
+def _finish(jobs, **fields):
+    finished_at = timezone.now()
+    ttl = timedelta(seconds=getattr(settings, "MONK_EXPORT_JOB_TTL", 24 * 3600))
+    jobs.update(finished_at=finished_at, expires_at=finished_at + ttl, **fields)
+
+
+# Function failing the jobs that did not finish in time, and removing the jobs that have expired with their
+# exported files, unless a job that has not expired shares them or they are being served. Returns the number of
+# jobs removed.
+def expire():
+    now = timezone.now()
+    # Jobs submitted before they were given a deadline have none, so their age is used instead.
+    overdue = ExportJob.objects.filter(status__in=[ExportJob.QUEUED, ExportJob.RUNNING]).filter(
+        Q(expires_at__lte=now) | Q(expires_at__isnull=True, created_at__lte=now - _timeout())
+    )
+    _finish(overdue, status=ExportJob.FAILED, error="The export was interrupted or did not finish in time.")
+
+    expired = list(ExportJob.objects.filter(expires_at__lte=now))
+    if not expired:
+        return 0
+    kept = set(
+        ExportJob.objects.exclude(id__in=[job.id for job in expired])
+        .exclude(result="")
+        .values_list("result", flat=True)
+    )
+    for path in {job.result for job in expired if job.result} - kept:
+        # An exported file that is being downloaded is left to the gc_artifacts command.
+        remove_unused(path)
+    ExportJob.objects.filter(id__in=[job.id for job in expired]).delete()
+    return len(expired)
+
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _read_range(f, length):
+    with f:
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+# Function returning a response sending a file as a download named filename, or the part of it asked for
+# in the Range header of the request. Only single byte ranges are supported; other Range headers get the
+# whole file. If-Range is compared with the ETag of the file, so a resumed download of a file that changed
+# gets the whole new file.
+def ranged_response(request, path, filename, content_type):
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{size:x}-{int(stat.st_mtime_ns):x}"'
+    first, last = 0, size - 1
+    partial = False
+
+    match = RANGE_PATTERN.match(request.headers.get("Range", "").strip())
+    if match and any(match.groups()) and request.headers.get("If-Range", etag) == etag:
+        if match.group(1):
+            first = int(match.group(1))
+            if match.group(2):
+                last = min(int(match.group(2)), size - 1)
+        else:
+            # A suffix range, the last bytes of the file.
+            first = max(size - int(match.group(2)), 0) if int(match.group(2)) else size
+        if first >= size or first > last:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        partial = True
+
+    length = last - first + 1
+    f = open_artifact(path)
+    f.seek(first)
+    response = StreamingHttpResponse(
+        _read_range(f, length), status=206 if partial else 200, content_type=content_type
+    )
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if partial:
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Loading of the CSV files written by monklib.
+#
+# The waveform columns are read directly as float32, using pyarrow's multithreaded CSV parser when it is
+# installed, instead of letting pandas infer object columns that have to be converted afterwards. Missing
+# samples are kept as NaN and filled by fill_missing, which is shared by plotting and exports.
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+# Function reading waveform columns from a CSV file.
+# channels is the channel list from the header of the recording; only those columns are read, unless
+# none of them are found in the file. usecols further limits the columns, and nrows the number of rows.
+# Returns the column names and a float32 array of shape (channels, samples), with NaN for missing samples.
+def read_waveform_csv(csv_path, channels=None, usecols=None, nrows=None):
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    if channels is not None and any(column in channels for column in columns):
+        columns = [column for column in columns if column in channels]
+    if usecols is not None:
+        columns = [column for column in columns if column in usecols]
+
+    # The pyarrow engine is much faster, but it can not stop after a number of rows.
+    engine = "pyarrow" if HAS_PYARROW and nrows is None else "c"
+    try:
+        df = pd.read_csv(
+            csv_path,
+            usecols=columns,
+            nrows=nrows,
+            dtype={column: np.float32 for column in columns},
+            engine=engine,
+        )
+    except ValueError:
+        # Some values are not numbers. Read the columns as text and turn those values into missing samples.
+        df = pd.read_csv(csv_path, usecols=columns, nrows=nrows, dtype=str)
+        df = df.apply(pd.to_numeric, errors="coerce")
+    return columns, df[columns].to_numpy(dtype=np.float32).T
+
+
+# Function filling missing samples by linear interpolation, in one pass per channel that has missing samples.
+# Samples before the first valid sample of a channel stay missing, as with pandas' interpolate.
+# Returns the filled array and a mask of the samples where every channel has a value.
+def fill_missing(array):
+    filled = np.array(array, dtype=np.float32)
+    missing = np.isnan(filled)
+    positions = np.arange(filled.shape[1])
+    for row in np.flatnonzero(missing.any(axis=1)):
+        valid = ~missing[row]
+        if not valid.any():
+            continue
+        first = np.argmax(valid)
+        filled[row, first:] = np.interp(positions[first:], positions[valid], filled[row, valid])
+    complete = ~np.isnan(filled).any(axis=0)
+    return filled, complete
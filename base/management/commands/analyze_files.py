@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from base import analysis
+from base.models import File, AnalysisStage
+
+
+# Command running the analysis stages of recordings, such as recordings imported before the analysis existed.
+# Without file ids, every recording is analysed. With --missing, only the stages of a recording that are not
+# done are run: stages never run, that failed, or whose worker stopped while running them. --stage limits the
+# analysis to the named stages.
+class Command(BaseCommand):
+    help = "Run the analysis stages of imported recordings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file_ids", nargs="*", type=int, help="Ids of the files to analyse (default: all files).")
+        parser.add_argument("--missing", action="store_true", help="Only run the stages that are not done.")
+        parser.add_argument(
+            "--stage",
+            action="append",
+            dest="stages",
+            choices=[function.__name__ for function in analysis.STAGES],
+            help="Only run this stage; can be given more than once.",
+        )
+
+    def handle(self, *args, **options):
+        files = File.objects.order_by("id")
+        if options["file_ids"]:
+            files = files.filter(id__in=options["file_ids"])
+            missing_ids = set(options["file_ids"]) - set(files.values_list("id", flat=True))
+            if missing_ids:
+                raise CommandError(f"No files with ids {', '.join(map(str, sorted(missing_ids)))}.")
+
+        analysed = skipped = 0
+        for file in files.iterator():
+            stages = options["stages"]
+            if options["missing"]:
+                stages = [stage for stage in analysis.missing_stages(file) if stages is None or stage in stages]
+                if not stages:
+                    continue
+            if analysis.analyze(file.id, stages):
+                analysed += 1
+                failed = file.analysis_stages.filter(status=AnalysisStage.FAILED).values_list("stage", flat=True)
+                if failed:
+                    self.stderr.write(f"{file.title} (id {file.id}): {', '.join(failed)} failed.")
+            else:
+                skipped += 1
+        self.stdout.write(f"Analysed {analysed} files; {skipped} files can not be analysed.")
@@ -0,0 +1,54 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from base import jobs
+from base.artifacts import collect_garbage
+from base.models import File, ExportJob
+
+
+# Command removing derived artifacts: those of recordings that were deleted, and then the least recently used
+# ones until the artifacts fit in MONK_ARTIFACT_MAX_BYTES. Expired export jobs are removed first, and the
+# results of the other export jobs are kept. With --interval, the command keeps running and collects
+# garbage every interval seconds.
+class Command(BaseCommand):
+    help = "Remove orphaned and least recently used derived artifacts to stay within the disk budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-bytes",
+            type=int,
+            default=None,
+            help="Disk budget of the artifacts in bytes (default: MONK_ARTIFACT_MAX_BYTES).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument(
+            "--interval", type=float, default=None, help="Keep running, collecting garbage every INTERVAL seconds."
+        )
+
+    def handle(self, *args, **options):
+        max_bytes = options["max_bytes"]
+        if max_bytes is None:
+            max_bytes = getattr(settings, "MONK_ARTIFACT_MAX_BYTES", None)
+        while True:
+            self.collect(max_bytes, options["dry_run"])
+            if options["interval"] is None:
+                break
+            time.sleep(options["interval"])
+
+    def collect(self, max_bytes, dry_run):
+        close_old_connections()
+        if not dry_run:
+            jobs.expire()
+        sources = [file.file.path for file in File.objects.only("file") if file.file]
+        keep = ExportJob.objects.exclude(result="").filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+        ).values_list("result", flat=True)
+        result = collect_garbage(sources, max_bytes, keep, dry_run)
+        self.stdout.write(
+            f"{'Would remove' if dry_run else 'Removed'} {result['orphaned']} orphaned and "
+            f"{result['evicted']} least recently used artifacts, freeing {result['freed']} bytes; "
+            f"{result['remaining']} bytes of artifacts remain."
+        )
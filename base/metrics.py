@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+import threading
+from pathlib import Path
+from django.conf import settings
+
+# Request metrics for the /metrics endpoint.
+#
+# Every worker process keeps its counters in memory and regularly writes a snapshot to its own
+# "<pid>.json" file in MONK_METRICS_DIR. The endpoint merges all snapshots, so the numbers cover
+# every worker without an external service. Writes are throttled, and a write that is skipped is made
+# once the interval has passed, so the snapshot always ends up with the last counters. Snapshots of processes that have exited are folded
+# into "archive.json" so their counters are kept while their in-flight gauges are dropped.
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+# Held while the snapshot file is written, as the threads of a process share its temporary file.
+_write_lock = threading.Lock()
+_state = None
+_state_pid = None
+_last_flush = 0.0
+_pending_flush = None
+
+
+# Function returning True if metrics collection is switched on in settings.py.
+def enabled():
+    return getattr(settings, "MONK_METRICS_ENABLED", False)
+
+
+# Function returning the directory shared by all worker processes for their metric snapshots.
+def metrics_dir():
+    path = Path(getattr(settings, "MONK_METRICS_DIR"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _empty_state():
+    return {"requests": {}, "latency": {}, "bytes": {}, "cache": {}, "in_flight": {}}
+
+
+# Function returning the counters of the current process. A forked worker starts from a clean
+# state instead of inheriting (and double counting) the counters of its parent.
+def _current_state():
+    global _state, _state_pid
+    if _state is None or _state_pid != os.getpid():
+        _state = _empty_state()
+        _state_pid = os.getpid()
+    return _state
+
+
+# Function for marking the start of a request to a view, used for the in-flight gauge.
+def request_started(view):
+    with _lock:
+        state = _current_state()
+        state["in_flight"][view] = state["in_flight"].get(view, 0) + 1
+    flush()
+
+
+# Function for recording a finished request: status code, latency and response size.
+def request_finished(view, method, status, duration, response_bytes=0):
+    with _lock:
+        state = _current_state()
+        state["in_flight"][view] = max(state["in_flight"].get(view, 0) - 1, 0)
+
+        key = f"{method} {status}"
+        per_view = state["requests"].setdefault(view, {})
+        per_view[key] = per_view.get(key, 0) + 1
+
+        histogram = state["latency"].setdefault(
+            view, {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        )
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                index = i
+                break
+        histogram["buckets"][index] += 1
+        histogram["sum"] += duration
+        histogram["count"] += 1
+
+        state["bytes"][view] = state["bytes"].get(view, 0) + response_bytes
+    flush()
+
+
+# Function for adding bytes that were streamed after the response left the view.
+def add_bytes(view, response_bytes):
+    with _lock:
+        state = _current_state()
+        state["bytes"][view] = state["bytes"].get(view, 0) + response_bytes
+    flush()
+
+
+# Function for recording a cache lookup, used for the cache hit ratio of the given cache.
+def record_cache(cache_name, hit):
+    if not enabled():
+        return
+    with _lock:
+        counts = _current_state()["cache"].setdefault(cache_name, {"hit": 0, "miss": 0})
+        counts["hit" if hit else "miss"] += 1
+    flush()
+
+
+# Function writing the counters of this process to its snapshot file. Writes are throttled by
+# MONK_METRICS_FLUSH_INTERVAL unless force is set; a throttled write is made by a timer at the end of the interval.
+def flush(force=False):
+    global _last_flush, _pending_flush
+    now = time.monotonic()
+    interval = getattr(settings, "MONK_METRICS_FLUSH_INTERVAL", 1.0)
+    if not force and now - _last_flush < interval:
+        with _lock:
+            # Timers of the parent process do not run in a forked worker, which schedules its own.
+            if _pending_flush is None or not _pending_flush.is_alive():
+                _pending_flush = threading.Timer(interval - (now - _last_flush), _trailing_flush)
+                _pending_flush.daemon = True
+                _pending_flush.start()
+        return
+    with _write_lock:
+        # The counters are taken under the write lock, so a newer snapshot is never replaced by an older one.
+        with _lock:
+            _last_flush = now
+            payload = json.dumps({"pid": os.getpid(), "state": _current_state()})
+        target = metrics_dir() / f"{os.getpid()}.json"
+        temporary = target.with_suffix(".tmp")
+        with open(temporary, "w") as f:
+            f.write(payload)
+        # Atomic replace, so readers never see a half written snapshot.
+        os.replace(temporary, target)
+
+
+def _trailing_flush():
+    global _pending_flush
+    with _lock:
+        if _pending_flush is threading.current_thread():
+            _pending_flush = None
+    try:
+        flush(force=True)
+    except OSError:
+        pass
+
+
+# Write the last counters of a worker that exits, so they are archived with its snapshot.
+@atexit.register
+def _flush_at_exit():
+    if _state is not None and _state_pid == os.getpid():
+        _trailing_flush()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Function adding the counters of one snapshot into the merged totals.
+def _merge(total, state, include_gauges=True):
+    for view, statuses in state.get("requests", {}).items():
+        merged = total["requests"].setdefault(view, {})
+        for key, count in statuses.items():
+            merged[key] = merged.get(key, 0) + count
+    for view, histogram in state.get("latency", {}).items():
+        merged = total["latency"].setdefault(
+            view, {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        )
+        merged["buckets"] = [a + b for a, b in zip(merged["buckets"], histogram["buckets"])]
+        merged["sum"] += histogram["sum"]
+        merged["count"] += histogram["count"]
+    for view, count in state.get("bytes", {}).items():
+        total["bytes"][view] = total["bytes"].get(view, 0) + count
+    for cache_name, counts in state.get("cache", {}).items():
+        merged = total["cache"].setdefault(cache_name, {"hit": 0, "miss": 0})
+        merged["hit"] += counts["hit"]
+        merged["miss"] += counts["miss"]
+    if include_gauges:
+        for view, count in state.get("in_flight", {}).items():
+            total["in_flight"][view] = total["in_flight"].get(view, 0) + count
+    return total
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Function merging the snapshots of all worker processes. Snapshots of exited processes are moved
+# into the archive under a lock, so that concurrent scrapes never count them twice.
+def collect():
+    flush(force=True)
+    directory = metrics_dir()
+    total = _empty_state()
+
+    with open(directory / "metrics.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        archive_path = directory / "archive.json"
+        archive = _read_json(archive_path) or _empty_state()
+        archive_changed = False
+
+        for path in directory.glob("*.json"):
+            if path.name == "archive.json":
+                continue
+            snapshot = _read_json(path)
+            if snapshot is None:
+                continue
+            if _process_alive(snapshot["pid"]):
+                _merge(total, snapshot["state"])
+            else:
+                _merge(archive, snapshot["state"], include_gauges=False)
+                archive_changed = True
+                path.unlink(missing_ok=True)
+
+        if archive_changed:
+            temporary = archive_path.with_suffix(".tmp")
+            with open(temporary, "w") as f:
+                json.dump(archive, f)
+            os.replace(temporary, archive_path)
+
+    return _merge(total, archive, include_gauges=False)
+
+
+def _labels(**labels):
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+# Function rendering the merged metrics in the Prometheus text exposition format.
+def render(state):
+    lines = [
+        "# HELP monk_http_requests_total Total number of HTTP requests by view, method and status.",
+        "# TYPE monk_http_requests_total counter",
+    ]
+    for view, statuses in sorted(state["requests"].items()):
+        for key, count in sorted(statuses.items()):
+            method, status = key.split(" ", 1)
+            lines.append(f"monk_http_requests_total{_labels(view=view, method=method, status=status)} {count}")
+
+    lines += [
+        "# HELP monk_http_request_duration_seconds Time spent in the view until the response was returned.",
+        "# TYPE monk_http_request_duration_seconds histogram",
+    ]
+    for view, histogram in sorted(state["latency"].items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+            cumulative += count
+            lines.append(f"monk_http_request_duration_seconds_bucket{_labels(view=view, le=bound)} {cumulative}")
+        lines.append(f"monk_http_request_duration_seconds_sum{_labels(view=view)} {histogram['sum']}")
+        lines.append(f"monk_http_request_duration_seconds_count{_labels(view=view)} {histogram['count']}")
+
+    lines += [
+        "# HELP monk_http_response_bytes_total Total number of response body bytes served by view.",
+        "# TYPE monk_http_response_bytes_total counter",
+    ]
+    for view, count in sorted(state["bytes"].items()):
+        lines.append(f"monk_http_response_bytes_total{_labels(view=view)} {count}")
+
+    lines += [
+        "# HELP monk_http_requests_in_flight Number of requests currently being handled by view.",
+        "# TYPE monk_http_requests_in_flight gauge",
+    ]
+    for view, count in sorted(state["in_flight"].items()):
+        lines.append(f"monk_http_requests_in_flight{_labels(view=view)} {count}")
+
+    lines += [
+        "# HELP monk_cache_requests_total Cache lookups by cache and result.",
+        "# TYPE monk_cache_requests_total counter",
+    ]
+    for cache_name, counts in sorted(state["cache"].items()):
+        lines.append(f"monk_cache_requests_total{_labels(cache=cache_name, result='hit')} {counts['hit']}")
+        lines.append(f"monk_cache_requests_total{_labels(cache=cache_name, result='miss')} {counts['miss']}")
+    lines += [
+        "# HELP monk_cache_hit_ratio Share of cache lookups that were hits.",
+        "# TYPE monk_cache_hit_ratio gauge",
+    ]
+    for cache_name, counts in sorted(state["cache"].items()):
+        lookups = counts["hit"] + counts["miss"]
+        ratio = counts["hit"] / lookups if lookups else 0.0
+        lines.append(f"monk_cache_hit_ratio{_labels(cache=cache_name)} {ratio}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,367 @@
+import os
+import math
+import numpy as np
+
+# Block index and reader for the waveform data of MFER (.mwf) files.
+#
+# An MFER file is a sequence of tag-length-value fields. The waveform data (tag 0x1E) is stored as a number
+# of sequences, and every sequence holds one data block per channel: "block length" samples of the channel's
+# data type. The sampling interval is the same within a channel, so the byte offset of any sample can be
+# computed from the layout of the blocks. build_index parses the definitions in front of each waveform data
+# field without reading the samples themselves. MferReader uses the resulting index to expose every channel
+# as an array-like view on a memory mapping of the file, so only the sequences holding the requested samples
+# are read from disk.
+
+TAG_BYTE_ORDER = 0x01
+TAG_BLOCK_LENGTH = 0x04
+TAG_CHANNELS = 0x05
+TAG_SEQUENCES = 0x06
+TAG_DATA_TYPE = 0x0A
+TAG_SAMPLING = 0x0B
+TAG_RESOLUTION = 0x0C
+TAG_OFFSET = 0x0D
+TAG_NULL = 0x0E
+TAG_WAVEFORM = 0x1E
+TAG_ATTRIBUTE = 0x3F
+TAG_END = 0x80
+TAG_TIME = 0x85
+
+# MFER data type codes that can be read directly, and their numpy type codes.
+DATA_TYPES = {0: "i2", 1: "u2", 2: "i4", 3: "u1", 5: "i1", 7: "f4", 8: "f8"}
+
+# Sampling unit codes of the sampling tag.
+UNIT_HERTZ = 0
+UNIT_SECONDS = 1
+
+INDEX_VERSION = 1
+
+
+# Exception raised when a file can not be indexed, for example because it uses a compressed data type.
+class MferError(Exception):
+    pass
+
+
+def _read_length(f):
+    first = f.read(1)
+    if not first:
+        raise MferError("Unexpected end of file.")
+    if first[0] < 0x80:
+        return first[0]
+    return int.from_bytes(f.read(first[0] & 0x7F), "big")
+
+
+def _decimal(body, byte_order):
+    # Sampling and resolution values are stored as unit, signed exponent and mantissa.
+    exponent = int.from_bytes(body[1:2], "big", signed=True)
+    mantissa = int.from_bytes(body[2:], byte_order, signed=True)
+    return body[0], mantissa * 10.0**exponent
+
+
+# Function applying the value of a definition tag to the current definitions.
+def _apply(tag, body, definitions):
+    byte_order = definitions["byte_order"]
+    if tag == TAG_BYTE_ORDER:
+        definitions["byte_order"] = "little" if body[0] == 1 else "big"
+    elif tag == TAG_BLOCK_LENGTH:
+        definitions["block_length"] = int.from_bytes(body, byte_order)
+    elif tag == TAG_CHANNELS:
+        definitions["channels"] = int.from_bytes(body, byte_order)
+    elif tag == TAG_SEQUENCES:
+        definitions["sequences"] = int.from_bytes(body, byte_order)
+    elif tag == TAG_DATA_TYPE:
+        definitions["data_type"] = int.from_bytes(body, byte_order)
+    elif tag == TAG_SAMPLING:
+        unit, value = _decimal(body, byte_order)
+        if unit == UNIT_HERTZ and value > 0:
+            definitions["interval"] = 1.0 / value
+        elif unit == UNIT_SECONDS and value > 0:
+            definitions["interval"] = value
+    elif tag == TAG_RESOLUTION:
+        definitions["resolution"] = _decimal(body, byte_order)[1]
+    elif tag == TAG_OFFSET:
+        definitions["offset"] = int.from_bytes(body, byte_order, signed=True)
+    elif tag == TAG_NULL:
+        # Kept as bytes, as its value depends on the data type of the channel.
+        definitions["null"] = (bytes(body).hex(), byte_order)
+    elif tag == TAG_TIME and len(body) >= 7:
+        year = int.from_bytes(body[0:2], byte_order)
+        definitions["start_time"] = "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(
+            year, body[2], body[3], body[4], body[5], body[6]
+        )
+
+
+# Function parsing the definition tags nested in a channel attribute.
+def _parse_attributes(body, definitions):
+    position = 0
+    while position < len(body):
+        tag = body[position]
+        length = body[position + 1]
+        position += 2
+        if length >= 0x80:
+            count = length & 0x7F
+            length = int.from_bytes(body[position : position + count], "big")
+            position += count
+        _apply(tag, body[position : position + length], definitions)
+        position += length
+
+
+# Function describing the block layout of one waveform data field with the definitions in effect.
+def _segment(definitions, channel_definitions, data_offset, data_length, start):
+    channels = []
+    block_bytes = 0
+    block_duration = None
+    for number in range(definitions["channels"]):
+        channel = dict(definitions, **channel_definitions.get(number, {}))
+        if channel["data_type"] not in DATA_TYPES:
+            raise MferError(f"Data type {channel['data_type']} can not be read directly.")
+        if channel["interval"] is None:
+            raise MferError(f"Channel {number} has no sampling interval.")
+        dtype = np.dtype(DATA_TYPES[channel["data_type"]]).newbyteorder(
+            "<" if channel["byte_order"] == "little" else ">"
+        )
+        null = None
+        if channel["null"] is not None:
+            null_bytes = bytes.fromhex(channel["null"][0])
+            null_order = "<" if channel["null"][1] == "little" else ">"
+            if len(null_bytes) == dtype.itemsize:
+                null = np.frombuffer(null_bytes, dtype=dtype.newbyteorder(null_order))[0].item()
+        duration = channel["block_length"] * channel["interval"]
+        if block_duration is None:
+            block_duration = duration
+        elif not math.isclose(duration, block_duration, rel_tol=1e-6):
+            raise MferError("Channels have data blocks of different durations.")
+        channels.append(
+            {
+                "offset": block_bytes,
+                "block_length": channel["block_length"],
+                "interval": channel["interval"],
+                "dtype": dtype.str,
+                "resolution": channel["resolution"],
+                "value_offset": channel["offset"],
+                "null": null,
+            }
+        )
+        block_bytes += channel["block_length"] * dtype.itemsize
+
+    if block_bytes == 0:
+        raise MferError("Waveform data without channels.")
+    sequences = definitions["sequences"] or data_length // block_bytes
+    if sequences * block_bytes != data_length:
+        raise MferError("Waveform data length does not match the block layout.")
+    return {
+        "offset": data_offset,
+        "start": start,
+        "sequences": sequences,
+        "block_bytes": block_bytes,
+        "block_duration": block_duration,
+        "channels": channels,
+    }
+
+
+# Function building the block index of an MFER file.
+# Returns a JSON serializable dict with one entry per waveform data field ("segment"), holding its byte offset,
+# start time in seconds, number of sequences and the position of every channel within a sequence.
+def build_index(path):
+    definitions = {
+        "byte_order": "big",
+        "block_length": 1,
+        "channels": 1,
+        "sequences": None,
+        "data_type": 0,
+        "interval": None,
+        "resolution": 1.0,
+        "offset": 0,
+        "null": None,
+        "start_time": None,
+    }
+    channel_definitions = {}
+    segments = []
+    start = 0.0
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        while f.tell() < size:
+            tag = f.read(1)[0]
+            if tag == TAG_END:
+                break
+            if tag == TAG_ATTRIBUTE:
+                # Channel attributes carry the channel number in front of their length.
+                number = _read_length(f)
+                length = _read_length(f)
+                if f.tell() + length > size:
+                    raise MferError("Field extends past the end of the file.")
+                body = f.read(length)
+                attributes = {"byte_order": definitions["byte_order"]}
+                _parse_attributes(body, attributes)
+                del attributes["byte_order"]
+                channel_definitions.setdefault(number, {}).update(attributes)
+                continue
+            length = _read_length(f)
+            if f.tell() + length > size:
+                raise MferError("Field extends past the end of the file.")
+            if tag == TAG_WAVEFORM:
+                segment = _segment(definitions, channel_definitions, f.tell(), length, start)
+                segments.append(segment)
+                start += segment["sequences"] * segment["block_duration"]
+                f.seek(length, os.SEEK_CUR)
+                continue
+            _apply(tag, f.read(length), definitions)
+
+    if not segments:
+        raise MferError("The file holds no waveform data.")
+    return {
+        "version": INDEX_VERSION,
+        "start_time": definitions["start_time"],
+        "duration": start,
+        "channels": len(segments[0]["channels"]),
+        "segments": segments,
+    }
+
+
+# Function converting the raw samples of a channel to physical values, with null values as NaN.
+def _to_physical(raw, channel):
+    values = raw.astype(np.float32)
+    if channel["null"] is not None:
+        values[raw == channel["null"]] = np.nan
+    if channel["resolution"] != 1.0 or channel["value_offset"]:
+        values = values * np.float32(channel["resolution"]) + np.float32(channel["value_offset"])
+    return values
+
+
+# Function returning the lowest and highest physical values a channel can record, from the range of its integer
+# data type leaving out the null value, or None for floating point channels, which have no fixed range.
+def recordable_range(channel):
+    dtype = np.dtype(channel["dtype"])
+    if dtype.kind not in "iu":
+        return None
+    low, high = np.iinfo(dtype).min, np.iinfo(dtype).max
+    if channel["null"] == low:
+        low += 1
+    elif channel["null"] == high:
+        high -= 1
+    low, high = (value * channel["resolution"] + channel["value_offset"] for value in (low, high))
+    return min(low, high), max(low, high)
+
+
+# Read-only view of one channel of an MFER file, backed by a memory mapping of the file.
+# Indexing and slicing with sample numbers returns the physical values of only the requested samples,
+# so windows of long recordings can be read without decoding the rest of the recording.
+class ChannelView:
+    def __init__(self, mapping, index, number):
+        self.number = number
+        self.segments = []
+        self.first_samples = []
+        total = 0
+        for segment in index["segments"]:
+            channel = segment["channels"][number]
+            dtype = np.dtype(channel["dtype"])
+            width = channel["block_length"] * dtype.itemsize
+            blocks = mapping[segment["offset"] : segment["offset"] + segment["sequences"] * segment["block_bytes"]]
+            # Zero-copy view of shape (sequences, block length) on the samples of this channel.
+            samples = blocks.reshape(segment["sequences"], segment["block_bytes"])[
+                :, channel["offset"] : channel["offset"] + width
+            ].view(dtype)
+            self.segments.append((segment, channel, samples))
+            self.first_samples.append(total)
+            total += samples.size
+        self.size = total
+        self.interval = index["segments"][0]["channels"][number]["interval"]
+
+    def __len__(self):
+        return self.size
+
+    # Function returning the physical values of the samples from first up to last, within one segment.
+    def _segment_values(self, position, first, last):
+        segment, channel, samples = self.segments[position]
+        block_length = channel["block_length"]
+        # Only the sequences holding the requested samples are copied out of the mapping.
+        rows = samples[first // block_length : (last - 1) // block_length + 1].reshape(-1)
+        skip = first - (first // block_length) * block_length
+        return _to_physical(rows[skip : skip + last - first], channel)
+
+    def _segment_times(self, position, first, last):
+        segment, channel, _ = self.segments[position]
+        return segment["start"] + np.arange(first, last) * channel["interval"]
+
+    # Function collecting values or times of the samples in [first, last) from all overlapping segments.
+    def _collect(self, first, last, read):
+        pieces = []
+        for position, offset in enumerate(self.first_samples):
+            size = self.segments[position][2].size
+            segment_first = max(first - offset, 0)
+            segment_last = min(last - offset, size)
+            if segment_last > segment_first:
+                pieces.append(read(position, segment_first, segment_last))
+        if not pieces:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            first, last, step = key.indices(self.size)
+            return self._collect(first, max(last, first), self._segment_values)[::step]
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("Sample number out of range.")
+        return self._collect(key, key + 1, self._segment_values)[0]
+
+    # Function returning the times in seconds of the samples selected by a slice.
+    def times(self, key=slice(None)):
+        first, last, step = key.indices(self.size)
+        return self._collect(first, max(last, first), self._segment_times)[::step]
+
+    # Function returning the first and last samples of every segment within [start, end) seconds.
+    def _segment_ranges(self, start, end):
+        for position, (segment, channel, samples) in enumerate(self.segments):
+            first = 0
+            last = samples.size
+            if start is not None:
+                first = max(math.ceil((start - segment["start"]) / channel["interval"] - 1e-9), 0)
+            if end is not None:
+                last = min(math.ceil((end - segment["start"]) / channel["interval"] - 1e-9), last)
+            if last > first:
+                yield position, first, last
+
+    # Function returning the sample numbers [first, last) of the samples within [start, end) seconds.
+    def sample_range(self, start=None, end=None):
+        ranges = [
+            (self.first_samples[position] + first, self.first_samples[position] + last)
+            for position, first, last in self._segment_ranges(start, end)
+        ]
+        if not ranges:
+            return 0, 0
+        return ranges[0][0], ranges[-1][1]
+
+    # Function returning the times and values of the samples within [start, end) seconds.
+    def window(self, start=None, end=None):
+        times = []
+        values = []
+        for position, first, last in self._segment_ranges(start, end):
+            times.append(self._segment_times(position, first, last))
+            values.append(self._segment_values(position, first, last))
+        if not values:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        return np.concatenate(times), np.concatenate(values)
+
+
+# Reader exposing the channels of an MFER file as ChannelView objects, using the block index of the file.
+class MferReader:
+    def __init__(self, path, index):
+        self.index = index
+        self.mapping = np.memmap(path, dtype=np.uint8, mode="r")
+        self.channels = [ChannelView(self.mapping, index, number) for number in range(index["channels"])]
+
+    def __len__(self):
+        return len(self.channels)
+
+    def channel(self, number):
+        return self.channels[number]
+
+
+# Function reading the samples of the given channels within [start, end) seconds.
+# Only the sequences overlapping the window are read from disk. Returns one (times, values) pair of
+# numpy arrays per channel, with times in seconds from the start of the recording.
+def read_window(path, index, channels, start=None, end=None):
+    reader = MferReader(path, index)
+    return [reader.channel(number).window(start, end) for number in channels]
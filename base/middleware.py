@@ -0,0 +1,136 @@
+import time
+import cProfile
+import threading
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import resolve, Resolver404
+from . import metrics, profiling
+
+
+# Function returning the URL name of the request path, which is the label used for the metrics.
+def view_name(request):
+    try:
+        return resolve(request.path_info).url_name or "unnamed"
+    except Resolver404:
+        return "not_found"
+
+
+# Middleware recording request counts, latency, in-flight requests and bytes served per URL name.
+# Only installed when MONK_METRICS_ENABLED is set in settings.py.
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not metrics.enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view = view_name(request)
+        metrics.request_started(view)
+        started = time.perf_counter()
+        status = 500
+        response_bytes = 0
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            if response.streaming:
+                # Streamed bodies are counted while they are sent to the client.
+                response.streaming_content = self._count_streamed(view, response.streaming_content)
+            else:
+                response_bytes = len(response.content)
+            return response
+        finally:
+            metrics.request_finished(
+                view, request.method, status, time.perf_counter() - started, response_bytes
+            )
+
+    def _count_streamed(self, view, content):
+        sent = 0
+        try:
+            for chunk in content:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            metrics.add_bytes(view, sent)
+
+
+# Only one profiler can be active in a process at a time (Python 3.12 raises an error when a second one is
+# enabled), so a request is only profiled while it holds this lock, and runs unprofiled when it is taken.
+_profiler_lock = threading.Lock()
+
+
+# Function enabling the profiler if no other profiler is active in the process.
+# Returns True if the profiler was enabled, and must be disabled with _disable.
+def _enable(profiler):
+    if not _profiler_lock.acquire(blocking=False):
+        return False
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool, such as a debugger or coverage, is active.
+        _profiler_lock.release()
+        return False
+    return True
+
+
+def _disable(profiler):
+    profiler.disable()
+    _profiler_lock.release()
+
+
+# Middleware running requests under cProfile and saving the profiles of slow or sampled requests.
+# Only installed when MONK_PROFILING_ENABLED is set in settings.py.
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not profiling.enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view = view_name(request)
+        if not profiling.should_profile(view):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        if not _enable(profiler):
+            # The profiler is busy with another request.
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _disable(profiler)
+            self._save(profiler, view, started)
+            raise
+        _disable(profiler)
+        if response.streaming:
+            # The body of a streamed response is produced while it is sent, so it is profiled then, and
+            # the profile is saved once the stream has been sent.
+            response.streaming_content = self._profile_streamed(
+                profiler, view, started, response.streaming_content
+            )
+        else:
+            self._save(profiler, view, started)
+        return response
+
+    def _profile_streamed(self, profiler, view, started, content):
+        iterator = iter(content)
+        try:
+            while True:
+                # Only the production of the chunks is profiled, not the time spent sending them. The
+                # profiler is released between chunks, and chunks produced while it is busy are not profiled.
+                enabled = _enable(profiler)
+                try:
+                    chunk = next(iterator, None)
+                finally:
+                    if enabled:
+                        _disable(profiler)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self._save(profiler, view, started)
+
+    def _save(self, profiler, view, started):
+        duration = time.perf_counter() - started
+        reason = profiling.keep_reason(view, duration)
+        if reason:
+            profiling.save_profile(profiler, view, duration, reason)
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_rename_uploaded_at_file_imported_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaveformIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layout', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='waveform_index', to='base.file')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0023_file_checksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeartRateSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=255)),
+                ('beat_times', models.BinaryField()),
+                ('trend_interval', models.FloatField()),
+                ('trend', models.JSONField()),
+                ('mean_rate', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='heart_rates', to='base.file')),
+            ],
+            options={
+                'unique_together': {('file', 'channel')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0024_heartrateseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('channel', models.CharField(max_length=255)),
+                ('samples', models.BigIntegerField()),
+                ('duration', models.FloatField()),
+                ('missing_fraction', models.FloatField()),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+                ('mean', models.FloatField(blank=True, null=True)),
+                ('std', models.FloatField(blank=True, null=True)),
+                ('p5', models.FloatField(blank=True, null=True)),
+                ('p25', models.FloatField(blank=True, null=True)),
+                ('median', models.FloatField(blank=True, null=True)),
+                ('p75', models.FloatField(blank=True, null=True)),
+                ('p95', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='channel_statistics', to='base.file')),
+            ],
+            options={
+                'ordering': ['file', 'number'],
+                'unique_together': {('file', 'number')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0025_channelstatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='quality',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0026_file_quality'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=255)),
+                ('kind', models.CharField(max_length=50)),
+                ('start', models.FloatField()),
+                ('end', models.FloatField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='base.file')),
+            ],
+            options={
+                'ordering': ['file', 'start'],
+                'indexes': [models.Index(fields=['file', 'channel', 'start'], name='base_event_file_id_61bac7_idx'), models.Index(fields=['kind', 'start_time'], name='base_event_kind_870e84_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0027_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=255)),
+                ('start', models.FloatField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('interval', models.FloatField()),
+                ('mean', models.FloatField()),
+                ('minimum', models.FloatField()),
+                ('maximum', models.FloatField()),
+                ('count', models.IntegerField()),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trend_aggregates', to='base.file')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trend_aggregates', to='base.subject')),
+            ],
+            options={
+                'ordering': ['file', 'channel', 'start'],
+                'indexes': [models.Index(fields=['file', 'channel', 'start'], name='base_trenda_file_id_1c29fd_idx'), models.Index(fields=['subject', 'channel', 'start'], name='base_trenda_subject_3192a3_idx'), models.Index(fields=['channel', 'start_time'], name='base_trenda_channel_ce04a9_idx')],
+            },
+        ),
+    ]
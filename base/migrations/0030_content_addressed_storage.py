@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:29
+
+import base.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0029_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(storage=base.storage.originals_storage, upload_to='originals/'),
+        ),
+    ]
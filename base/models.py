@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 import uuid
 import os
 from django.utils.timezone import now
+from .storage import originals_storage
 
 
 # Create your models here.
@@ -20,9 +21,11 @@ class UserProfile(models.Model):
 # Model for the files
 class File(models.Model):
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='nihon_kohden_files/')
+    file = models.FileField(upload_to='originals/', storage=originals_storage) # Stored under the SHA-256 of the content, see storage.py.
     anonymize = models.BooleanField(default=False)
     imported_at = models.DateTimeField(auto_now_add=True)
+    checksum = models.CharField(max_length=64, blank=True, default='') # SHA-256 of the file content, computed when first needed.
+    quality = models.JSONField(null=True, blank=True) # Intervals with signal quality problems per channel and kind of problem, None until the file is analysed.
 
     
     def save(self, *args, **kwargs):
@@ -68,4 +71,159 @@ class FileImport(models.Model):
     imported_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.file.title} imported by {self.user.name}"
\ No newline at end of file
+        return f"{self.file.title} imported by {self.user.name}"
+
+
+# Model for the block index of an MWF file, which locates the waveform data blocks so time windows can be read without decoding the whole file.
+class WaveformIndex(models.Model):
+    file = models.OneToOneField(File, on_delete=models.CASCADE, related_name='waveform_index')
+    layout = models.JSONField(null=True, blank=True) # None if the file can not be indexed, for example because its data is compressed.
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Waveform index of {self.file.title}"
+
+
+# Model for the heart rate derived from an ECG channel of an MWF file, computed in the background after import.
+class HeartRateSeries(models.Model):
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='heart_rates')
+    channel = models.CharField(max_length=255)
+    beat_times = models.BinaryField() # Times of the R peaks in seconds from the start of the recording, as little endian float64 values.
+    trend_interval = models.FloatField() # Length in seconds of the intervals of the trend.
+    trend = models.JSONField() # Mean heart rate in beats per minute of every interval, None for intervals without beats.
+    mean_rate = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('file', 'channel')
+
+    def __str__(self):
+        return f"Heart rate of {self.file.title} ({self.channel})"
+
+
+# Model for the summary statistics of one channel of an MWF file, computed in the background after import.
+class ChannelStatistics(models.Model):
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='channel_statistics')
+    number = models.IntegerField() # Position of the channel in the file, starting at 0.
+    channel = models.CharField(max_length=255)
+    samples = models.BigIntegerField()
+    duration = models.FloatField() # In seconds.
+    missing_fraction = models.FloatField() # Fraction of the samples that are missing, from 0 to 1.
+    # The remaining statistics leave out missing samples, and are None if all samples are missing.
+    minimum = models.FloatField(null=True, blank=True)
+    maximum = models.FloatField(null=True, blank=True)
+    mean = models.FloatField(null=True, blank=True)
+    std = models.FloatField(null=True, blank=True)
+    p5 = models.FloatField(null=True, blank=True)
+    p25 = models.FloatField(null=True, blank=True)
+    median = models.FloatField(null=True, blank=True)
+    p75 = models.FloatField(null=True, blank=True)
+    p95 = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('file', 'number')
+        ordering = ['file', 'number']
+
+    def __str__(self):
+        return f"Statistics of {self.file.title} ({self.channel})"
+
+
+# Model for an event in a channel of an MWF file, such as a desaturation or a dropout, found in the background after import.
+class Event(models.Model):
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='events')
+    channel = models.CharField(max_length=255)
+    kind = models.CharField(max_length=50) # Name of the event rule, or "dropout" for gaps found by the quality scan.
+    start = models.FloatField() # In seconds from the start of the recording.
+    end = models.FloatField()
+    start_time = models.DateTimeField(null=True, blank=True) # Wall clock time of the start, if the start of the recording is known.
+    value = models.FloatField(null=True, blank=True) # Lowest or highest value during the event.
+
+    class Meta:
+        ordering = ['file', 'start']
+        indexes = [
+            models.Index(fields=['file', 'channel', 'start']),
+            models.Index(fields=['kind', 'start_time']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} in {self.file.title} ({self.channel}) at {self.start:.1f} s"
+
+
+# Model for the aggregates of one channel of an MWF file over one interval (one minute by default), computed in
+# the background after import, so trends of a cohort can be queried without reading the recordings.
+class TrendAggregate(models.Model):
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='trend_aggregates')
+    subject = models.ForeignKey(Subject, null=True, blank=True, on_delete=models.CASCADE, related_name='trend_aggregates')
+    channel = models.CharField(max_length=255)
+    start = models.FloatField() # Start of the interval in seconds from the start of the recording.
+    start_time = models.DateTimeField(null=True, blank=True) # Wall clock time of the start, if the start of the recording is known.
+    interval = models.FloatField() # Length of the interval in seconds.
+    mean = models.FloatField()
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    count = models.IntegerField() # Number of samples in the interval, leaving out missing samples.
+
+    class Meta:
+        ordering = ['file', 'channel', 'start']
+        indexes = [
+            models.Index(fields=['file', 'channel', 'start']),
+            models.Index(fields=['subject', 'channel', 'start']),
+            models.Index(fields=['channel', 'start_time']),
+        ]
+
+    def __str__(self):
+        return f"Trend of {self.file.title} ({self.channel}) at {self.start:.0f} s"
+
+
+# Model for an export of a file that is produced in the background, for exports too large to wait for in a request.
+class ExportJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='export_jobs')
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='export_jobs')
+    parameters = models.JSONField() # Selection and format of the export, as given to utils.export_waveforms.
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    progress = models.FloatField(default=0) # Fraction of the export that is done, from 0 to 1.
+    error = models.TextField(blank=True, default='')
+    result = models.CharField(max_length=1024, blank=True, default='') # Path of the exported file once it is done.
+    filename = models.CharField(max_length=255) # Name of the file when downloaded.
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True) # Deadline of a pending job, then removal time of the job and its exported file.
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['expires_at'])]
+
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= now()
+
+    def __str__(self):
+        return f"Export of {self.file.title} ({self.status})"
+
+
+# Model for the outcome of one analysis stage of a file, so stages that failed or were interrupted can be run again.
+class AnalysisStage(models.Model):
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='analysis_stages')
+    stage = models.CharField(max_length=50) # Name of the stage function in analysis.py.
+    status = models.CharField(max_length=10, choices=STATUSES, default=RUNNING) # Stays running if the worker stopped during the stage.
+    error = models.TextField(blank=True, default='')
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('file', 'stage')
+
+    def __str__(self):
+        return f"Analysis stage {self.stage} of {self.file.title} ({self.status})"
+
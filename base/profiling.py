@@ -0,0 +1,98 @@
+import io
+import os
+import random
+import pstats
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+
+# Request profiling.
+#
+# Requests to the views in MONK_PROFILING_VIEWS are run under cProfile. The profile is saved when
+# the request took longer than MONK_PROFILING_THRESHOLD seconds, or when the request was picked by
+# the 1-in-N sampling configured in MONK_PROFILING_SAMPLE_RATES. Saved profiles are rotated so the
+# directory never holds more than MONK_PROFILING_MAX_FILES files.
+
+
+# Function returning True if request profiling is switched on in settings.py.
+def enabled():
+    return getattr(settings, "MONK_PROFILING_ENABLED", False)
+
+
+# Function returning the directory holding the saved profiles.
+def profiles_dir():
+    path = Path(getattr(settings, "MONK_PROFILING_DIR"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+# Function deciding if a request to the given view should run under the profiler.
+def should_profile(view):
+    views = getattr(settings, "MONK_PROFILING_VIEWS", None)
+    return views is None or view in views or view in sampling_rates()
+
+
+def sampling_rates():
+    return getattr(settings, "MONK_PROFILING_SAMPLE_RATES", {})
+
+
+# Function deciding if a profile should be kept, either because the request was slow or sampled.
+# Returns the reason, or None if the profile can be discarded.
+def keep_reason(view, duration):
+    threshold = getattr(settings, "MONK_PROFILING_THRESHOLD", None)
+    views = getattr(settings, "MONK_PROFILING_VIEWS", None)
+    if threshold is not None and duration >= threshold and (views is None or view in views):
+        return "slow"
+    rate = sampling_rates().get(view)
+    if rate and random.randrange(rate) == 0:
+        return "sampled"
+    return None
+
+
+# Function writing a profile to the profile directory, and removing the oldest profiles.
+def save_profile(profiler, view, duration, reason):
+    directory = profiles_dir()
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    name = f"{timestamp}_{view}_{reason}_{int(duration * 1000)}ms_{os.getpid()}.prof"
+    profiler.dump_stats(str(directory / name))
+    rotate_profiles()
+    return name
+
+
+def rotate_profiles():
+    max_files = getattr(settings, "MONK_PROFILING_MAX_FILES", 50)
+    profiles = sorted(profiles_dir().glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in profiles[max_files:]:
+        old.unlink(missing_ok=True)
+
+
+# Function listing the saved profiles, newest first.
+def list_profiles():
+    profiles = []
+    for path in profiles_dir().glob("*.prof"):
+        stat = path.stat()
+        profiles.append(
+            {
+                "name": path.name,
+                "size": stat.st_size,
+                "created": datetime.fromtimestamp(stat.st_mtime),
+            }
+        )
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+
+# Function returning the path of a saved profile, or None if the name is not a saved profile.
+# Only names from the directory listing are accepted, so the name can not point outside it.
+def profile_path(name):
+    for path in profiles_dir().glob("*.prof"):
+        if path.name == name:
+            return path
+    return None
+
+
+# Function returning a text summary of the most expensive functions of a saved profile.
+def profile_summary(path, limit=40):
+    output = io.StringIO()
+    stats = pstats.Stats(str(path), stream=output)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,115 @@
+import numpy as np
+
+# Signal quality scan of the channels of a recording.
+#
+# Every channel is read in chunks and checked for four kinds of problems, each found as runs of samples:
+#   flatline     the value does not change for at least FLATLINE_SECONDS
+#   dropout      samples are missing for at least DROPOUT_SECONDS, for example when a lead is off
+#   clipping     the value stays at the lowest or highest value the channel can record (the range of its
+#                data type, or a configured limit) for at least CLIPPING_SECONDS
+#   implausible  the value is outside the plausible range of the channel, if one is known
+# Flatlines and clipping also need a minimum number of samples, so slow numeric channels, such as a 1 Hz
+# SpO2 that stays at 100 %, are not marked after a few equal samples.
+# Runs are followed across chunk boundaries, so the result does not depend on the chunk size.
+# The problems are returned as lists of [start, end] times in seconds from the start of the recording.
+
+KINDS = ("flatline", "dropout", "clipping", "implausible")
+
+FLATLINE_SECONDS = 2.0
+DROPOUT_SECONDS = 0.5
+CLIPPING_SECONDS = 0.05
+FLATLINE_MIN_SAMPLES = 60
+CLIPPING_MIN_SAMPLES = 5
+# Number of samples read at a time.
+CHUNK_SIZE = 1 << 20
+# Largest number of intervals kept per kind of problem and channel; a very noisy channel is marked by the first ones.
+MAX_INTERVALS = 1000
+
+
+# Function returning the starts and ends of the runs of True values in a boolean array.
+def _runs(mask):
+    edges = np.diff(mask.astype(np.int8), prepend=0, append=0)
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+# Collector of the runs of one kind of problem, in sample numbers, over the chunks of a channel.
+class Runs:
+    def __init__(self, min_length):
+        self.min_length = min_length
+        self.runs = []
+
+    def add(self, mask, offset):
+        starts, ends = _runs(mask)
+        starts += offset
+        ends += offset
+        if starts.size and self.runs and self.runs[-1][1] == starts[0]:
+            # The run continues from the previous chunk.
+            starts[0] = self.runs.pop()[0]
+        # Short runs are dropped, except the one at the end of the chunk, which may continue in the next chunk.
+        keep = (ends - starts >= self.min_length) | (ends == offset + mask.size)
+        self.runs.extend(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+    def finish(self):
+        return [(start, end) for start, end in self.runs if end - start >= self.min_length]
+
+
+# Function scanning the samples of a channel, given as an array or as a ChannelView of an MFER file.
+# interval is the sampling interval in seconds, minimum and maximum are the lowest and highest values the channel
+# can record, used to recognise clipping, and plausible an optional (low, high) range of plausible values.
+# times is an optional function returning the time of a sample number; by default sample n is at n * interval.
+# Returns a dictionary with a list of [start, end] intervals in seconds for every kind of problem.
+def scan_quality(values, interval, minimum=None, maximum=None, plausible=None, times=None):
+    if times is None:
+        times = lambda number: number * interval
+    runs = {
+        # Flatlines are found as runs of samples equal to the sample before them, one shorter than the flatline.
+        "flatline": Runs(max(int(FLATLINE_SECONDS / interval), FLATLINE_MIN_SAMPLES) - 1),
+        "dropout": Runs(max(int(DROPOUT_SECONDS / interval), 1)),
+        "clipping": Runs(max(int(CLIPPING_SECONDS / interval), CLIPPING_MIN_SAMPLES)),
+        "implausible": Runs(1),
+    }
+    previous = np.nan
+    for first in range(0, len(values), CHUNK_SIZE):
+        chunk = np.asarray(values[first : first + CHUNK_SIZE], dtype=np.float64)
+        missing = np.isnan(chunk)
+        # Only samples equal to the sample before them are marked, so steady stretches of different values that
+        # follow each other are not joined into one flatline; the first sample of every run is added below.
+        same = chunk == np.concatenate([[previous], chunk[:-1]])
+        runs["flatline"].add(same, first)
+        runs["dropout"].add(missing, first)
+        if minimum is not None and maximum is not None and maximum > minimum:
+            runs["clipping"].add((chunk <= minimum) | (chunk >= maximum), first)
+        if plausible is not None:
+            runs["implausible"].add(~missing & ((chunk < plausible[0]) | (chunk > plausible[1])), first)
+        previous = chunk[-1] if chunk.size else previous
+
+    result = {}
+    for kind in KINDS:
+        # A flatline starts at the sample before its first repeated value.
+        lead = 1 if kind == "flatline" else 0
+        result[kind] = [
+            [float(times(start - lead)), float(times(end - 1) + interval)]
+            for start, end in runs[kind].finish()[:MAX_INTERVALS]
+        ]
+    return result
+
+
+# Function returning the number and total duration in seconds of the intervals of every kind of problem,
+# as a list with one entry per channel, for display.
+def summarize(quality):
+    summary = []
+    for channel, problems in (quality or {}).get("channels", {}).items():
+        summary.append(
+            {
+                "channel": channel,
+                "problems": [
+                    {
+                        "kind": kind,
+                        "count": len(problems.get(kind, [])),
+                        "seconds": sum(end - start for start, end in problems.get(kind, [])),
+                    }
+                    for kind in KINDS
+                ],
+            }
+        )
+    return summary
@@ -0,0 +1,79 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Spectral analysis of the channels of a recording.
+#
+# The power spectral density is estimated with Welch's method: the samples are split into overlapping
+# segments, every segment has its mean removed and is multiplied by a Hann window, and the power spectra
+# of the segments are averaged. The segments are read and transformed in batches of SEGMENT_BATCH, with
+# one vectorized FFT per batch, so memory use does not depend on the length of the time window. The
+# spectrogram keeps the spectra of the segments apart instead, averaging neighbouring segments when there
+# are more than MAX_COLUMNS of them. Segments holding missing samples are left out.
+
+# Number of segments transformed at a time.
+SEGMENT_BATCH = 256
+# Largest number of time columns of a spectrogram.
+MAX_COLUMNS = 500
+
+
+# Function returning the number of samples per segment for a segment length in seconds, as a power of two.
+def segment_samples(seconds, sampling_rate):
+    return 1 << max(int(np.round(np.log2(max(seconds * sampling_rate, 8)))), 3)
+
+
+# Function yielding the first sample number and the power spectra of the segments, a batch at a time.
+# values is an array or a ChannelView, and the segments cover samples [first, last).
+def _segment_spectra(values, first, last, size, step, sampling_rate):
+    window = np.hanning(size)
+    # Scaling to a one-sided density in units squared per Hz.
+    scale = 1 / (sampling_rate * (window * window).sum())
+    count = (last - first - size) // step + 1 if last - first >= size else 0
+    for batch in range(0, count, SEGMENT_BATCH):
+        number = min(SEGMENT_BATCH, count - batch)
+        low = first + batch * step
+        samples = np.asarray(values[low : low + (number - 1) * step + size], dtype=np.float64)
+        segments = sliding_window_view(samples, size)[::step][:number]
+        spectra = np.abs(np.fft.rfft((segments - segments.mean(axis=1, keepdims=True)) * window, axis=1)) ** 2
+        spectra *= scale
+        # Every frequency except 0 and the Nyquist frequency also stands for its negative counterpart.
+        spectra[:, 1 : size // 2 + (size % 2)] *= 2
+        yield low, spectra
+
+
+# Function returning the frequencies and the Welch power spectral density of samples [first, last).
+# The density is None when no segment without missing samples fits in the samples.
+def welch(values, sampling_rate, first, last, segment_seconds=2.0, overlap=0.5):
+    size = segment_samples(segment_seconds, sampling_rate)
+    step = max(int(size * (1 - overlap)), 1)
+    total = np.zeros(size // 2 + 1)
+    used = 0
+    for _, spectra in _segment_spectra(values, first, last, size, step, sampling_rate):
+        valid = ~np.isnan(spectra).any(axis=1)
+        total += spectra[valid].sum(axis=0)
+        used += int(valid.sum())
+    frequencies = np.fft.rfftfreq(size, 1 / sampling_rate)
+    return frequencies, (total / used if used else None)
+
+
+# Function returning the frequencies, the times of the columns in seconds after the first sample and the
+# spectrogram of samples [first, last), with one row per frequency and one column per time.
+def spectrogram(values, sampling_rate, first, last, segment_seconds=2.0, overlap=0.5):
+    size = segment_samples(segment_seconds, sampling_rate)
+    step = max(int(size * (1 - overlap)), 1)
+    count = (last - first - size) // step + 1 if last - first >= size else 0
+    # Neighbouring segments are averaged in groups, so there are at most MAX_COLUMNS columns.
+    group = max(-(-count // MAX_COLUMNS), 1)
+    columns = -(-count // group) if count else 0
+    total = np.zeros((columns, size // 2 + 1))
+    used = np.zeros(columns)
+    for low, spectra in _segment_spectra(values, first, last, size, step, sampling_rate):
+        column = ((low - first) // step + np.arange(len(spectra))) // group
+        valid = ~np.isnan(spectra).any(axis=1)
+        np.add.at(total, column[valid], spectra[valid])
+        np.add.at(used, column[valid], 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        power = total / used[:, None]
+    # The time of a column is the middle of the segments it averages.
+    times = ((np.arange(columns) * group + (group - 1) / 2) * step + size / 2) / sampling_rate
+    frequencies = np.fft.rfftfreq(size, 1 / sampling_rate)
+    return frequencies, times, power.T
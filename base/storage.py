@@ -0,0 +1,63 @@
+import os
+import re
+import hashlib
+import tempfile
+from django.core.files.storage import FileSystemStorage
+
+# Content addressed storage of the imported recordings.
+#
+# An uploaded recording is stored under the SHA-256 of its content, in two levels of directories named
+# after the first characters of the hash, such as "originals/ab/cd/abcd....mwf", so no directory grows
+# large and uploads with the same name never overwrite each other. Uploading a recording that is already
+# stored reuses the stored copy. Files are written to a temporary file that is moved into place once
+# complete, so a write that is interrupted never leaves a partial file under the hash. The extension of the upload is kept, as the type of a file is recognised
+# by its extension. Files uploaded before this storage was used keep their names.
+
+# Name of a content addressed file without its extension.
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+# Function returning the sharded name of the file with the given hash, in the directory prefix.
+def sharded_name(digest, extension="", prefix=""):
+    return os.path.join(prefix, digest[:2], digest[2:4], digest + extension)
+
+
+# Function returning the SHA-256 of a content addressed file from its name or path, or None for other files.
+def content_digest(name):
+    stem = os.path.splitext(os.path.basename(str(name)))[0]
+    return stem if DIGEST_PATTERN.fullmatch(stem) else None
+
+
+# Storage saving every file under the hash of its content.
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        # The directory of the name (the upload_to of the field) is kept as prefix of the shards.
+        name = sharded_name(
+            digest.hexdigest(), os.path.splitext(name)[1].lower(), os.path.dirname(name)
+        )
+        path = self.path(name)
+        # The size is checked too, as files stored before writes were atomic may be incomplete.
+        if self.exists(name) and os.path.getsize(path) == content.size:
+            return name
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        handle, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return name
+
+
+# Function returning the storage of the imported recordings, used by File.file.
+def originals_storage():
+    return ContentAddressedStorage()
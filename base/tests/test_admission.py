@@ -0,0 +1,88 @@
+import tempfile
+import threading
+import time
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from base.admission import admission_slot, limit_concurrency, ServerBusy
+
+LIMITS = {
+    'heavy': {'concurrency': 1, 'queue': 1, 'per_user': 2, 'timeout': 0.5, 'retry_after': 7},
+}
+
+
+class TestAdmission(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.override = override_settings(
+            MONK_ADMISSION_DIR=self.temp_dir.name,
+            MONK_ADMISSION_LIMITS=LIMITS,
+            MONK_ADMISSION_POLL_INTERVAL=0.01,
+        )
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.temp_dir.cleanup()
+
+    def test_unlimited_endpoint(self):
+        with admission_slot('light', 1):
+            with admission_slot('light', 1):
+                pass
+
+    def test_queue_full(self):
+        with admission_slot('heavy', 1):
+            with self.assertRaises(ServerBusy):
+                # The run slot is taken and waiting times out.
+                with admission_slot('heavy', 2):
+                    pass
+
+    def test_without_queue_fails_fast(self):
+        limits = {'heavy': dict(LIMITS['heavy'], queue=0, timeout=60)}
+        with override_settings(MONK_ADMISSION_LIMITS=limits):
+            with admission_slot('heavy', 1):
+                started = time.monotonic()
+                with self.assertRaises(ServerBusy):
+                    with admission_slot('heavy', 2):
+                        pass
+                self.assertLess(time.monotonic() - started, 1)
+
+    def test_queued_request_runs_after_release(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def hold_slot():
+            with admission_slot('heavy', 1):
+                started.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_slot)
+        holder.start()
+        started.wait()
+        threading.Timer(0.1, release.set).start()
+        with admission_slot('heavy', 2):
+            pass
+        holder.join()
+
+    def test_per_user_cap(self):
+        limits = {'heavy': dict(LIMITS['heavy'], concurrency=5, per_user=1)}
+        with override_settings(MONK_ADMISSION_LIMITS=limits):
+            with admission_slot('heavy', 1):
+                with self.assertRaises(ServerBusy):
+                    with admission_slot('heavy', 1):
+                        pass
+                with admission_slot('heavy', 2):
+                    pass
+
+    def test_decorator_returns_503_with_retry_after(self):
+        @limit_concurrency('heavy')
+        def view(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(view(request).status_code, 200)
+        with admission_slot('heavy', 1):
+            response = view(request)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
@@ -0,0 +1,56 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from base import analysis
+from base.models import File, AnalysisStage
+
+
+def good(file, layout, reader):
+    pass
+
+
+def bad(file, layout, reader):
+    raise ValueError("broken channel")
+
+
+class TestAnalysis(TestCase):
+    def setUp(self):
+        self.file = File.objects.create(title='test_file', file='nihon_kohden_files/test.mwf')
+        patches = [
+            mock.patch.object(analysis, 'STAGES', [good, bad]),
+            mock.patch.object(analysis, 'get_waveform_index', return_value={}),
+            mock.patch.object(analysis, 'MferReader'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def statuses(self):
+        return dict(self.file.analysis_stages.values_list('stage', 'status'))
+
+    def test_analyze_records_the_outcome_of_every_stage(self):
+        self.assertTrue(analysis.analyze(self.file.id))
+        self.assertEqual(self.statuses(), {'good': AnalysisStage.DONE, 'bad': AnalysisStage.FAILED})
+        self.assertEqual(self.file.analysis_stages.get(stage='bad').error, 'broken channel')
+        self.assertEqual(analysis.missing_stages(self.file), ['bad'])
+
+    def test_interrupted_stages_are_missing(self):
+        analysis.analyze(self.file.id, ['good'])
+        AnalysisStage.objects.filter(file=self.file, stage='good').update(status=AnalysisStage.RUNNING)
+        self.assertEqual(analysis.missing_stages(self.file), ['good', 'bad'])
+
+    def test_command_runs_missing_stages(self):
+        analysis.analyze(self.file.id, ['good'])
+        with mock.patch.object(analysis, 'analyze', wraps=analysis.analyze) as analyze:
+            call_command('analyze_files', '--missing', stdout=StringIO(), stderr=StringIO())
+            analyze.assert_called_once_with(self.file.id, ['bad'])
+            AnalysisStage.objects.filter(stage='bad').update(status=AnalysisStage.DONE)
+            call_command('analyze_files', '--missing', stdout=StringIO())
+            analyze.assert_called_once()
+
+    def test_command_skips_files_that_can_not_be_analysed(self):
+        out = StringIO()
+        with mock.patch.object(analysis, 'get_waveform_index', return_value=None):
+            call_command('analyze_files', str(self.file.id), stdout=out)
+        self.assertIn('Analysed 0 files; 1 files can not be analysed.', out.getvalue())
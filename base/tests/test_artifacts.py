@@ -0,0 +1,188 @@
+import os
+import time
+import fcntl
+import tempfile
+import threading
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from base.artifacts import derived_path, artifact_dir, single_flight, open_artifact, open_fresh, collect_garbage
+
+
+class TestArtifacts(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_path = os.path.join(self.temp_dir.name, 'recording.mwf')
+        with open(self.source_path, 'wb') as f:
+            f.write(b'MWF content')
+        self.artifact_dir = os.path.join(self.temp_dir.name, 'artifacts')
+        settings = override_settings(MONK_ARTIFACT_DIR=self.artifact_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_derived_path(self):
+        path = derived_path('/data/recording.mwf', '.csv')
+        self.assertEqual(os.path.basename(path), 'recording.csv')
+        self.assertTrue(path.startswith(self.artifact_dir + os.sep))
+        self.assertNotEqual(os.path.dirname(path), os.path.dirname(derived_path('/other/recording.mwf', '.csv')))
+        with_params = derived_path('/data/recording.mwf', '.csv', {'channels': ['II']})
+        self.assertNotEqual(with_params, derived_path('/data/recording.mwf', '.csv', {'channels': ['V1']}))
+        self.assertTrue(with_params.endswith('.csv'))
+
+    def test_artifacts_of_content_addressed_files_are_sharded_by_hash(self):
+        digest = 'ab' * 32
+        path = derived_path(f'/data/originals/ab/ab/{digest}.mwf', '_anonymized.mwf')
+        self.assertEqual(path, os.path.join(self.artifact_dir, 'ab', 'ab', digest, f'{digest}_anonymized.mwf'))
+
+    def test_concurrent_requests_share_one_computation(self):
+        calls = []
+
+        def compute(output_path):
+            calls.append(output_path)
+            time.sleep(0.2)
+            with open(output_path, 'w') as f:
+                f.write('a,b\n1,2\n')
+
+        output_path = derived_path(self.source_path, '.csv')
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight(output_path, self.source_path, compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [output_path] * 4)
+        with open(output_path) as f:
+            self.assertEqual(f.read(), 'a,b\n1,2\n')
+
+    def test_stale_artifact_is_recomputed(self):
+        calls = []
+
+        def compute(output_path):
+            calls.append(output_path)
+            open(output_path, 'w').close()
+
+        output_path = derived_path(self.source_path, '.csv')
+        single_flight(output_path, self.source_path, compute)
+        single_flight(output_path, self.source_path, compute)
+        self.assertEqual(len(calls), 1)
+
+        # Touch the source so it is newer than the artifact.
+        future = time.time() + 10
+        os.utime(self.source_path, (future, future))
+        single_flight(output_path, self.source_path, compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_failed_computation_leaves_no_artifact(self):
+        def compute(output_path):
+            open(output_path, 'w').close()
+            raise RuntimeError('conversion failed')
+
+        output_path = derived_path(self.source_path, '.csv')
+        with self.assertRaises(RuntimeError):
+            single_flight(output_path, self.source_path, compute)
+        self.assertFalse(os.path.exists(output_path))
+        self.assertEqual(os.listdir(artifact_dir(self.source_path)), ['recording.csv.lock'])
+
+    def make_artifact(self, source_path, suffix, size, accessed):
+        path = single_flight(
+            derived_path(source_path, suffix), source_path, lambda p: open(p, 'wb').write(b'x' * size)
+        )
+        os.utime(path, (accessed, os.path.getmtime(path)))
+        return path
+
+    def test_collect_garbage_removes_orphaned_artifacts(self):
+        path = self.make_artifact(self.source_path, '.csv', 10, 1000)
+        orphan = self.make_artifact(os.path.join(self.temp_dir.name, 'deleted.mwf'), '.csv', 20, 2000)
+        result = collect_garbage([self.source_path])
+        self.assertEqual(result, {'orphaned': 1, 'evicted': 0, 'freed': 20, 'remaining': 10})
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertFalse(os.path.exists(os.path.dirname(orphan)))
+
+    def test_collect_garbage_evicts_least_recently_used_artifacts(self):
+        old = self.make_artifact(self.source_path, '.csv', 100, 1000)
+        recent = self.make_artifact(self.source_path, '.edf', 100, 3000)
+        middle = self.make_artifact(self.source_path, '.mwf', 100, 2000)
+        result = collect_garbage([self.source_path], max_bytes=150)
+        self.assertEqual(result, {'orphaned': 0, 'evicted': 2, 'freed': 200, 'remaining': 100})
+        self.assertFalse(os.path.exists(old))
+        self.assertFalse(os.path.exists(middle))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_reading_an_artifact_marks_it_as_used(self):
+        old = self.make_artifact(self.source_path, '.csv', 100, 1000)
+        recent = self.make_artifact(self.source_path, '.edf', 100, 2000)
+        with open_artifact(old) as f:
+            self.assertEqual(f.read(), b'x' * 100)
+        collect_garbage([self.source_path], max_bytes=100)
+        self.assertTrue(os.path.exists(old))
+        self.assertFalse(os.path.exists(recent))
+
+    def test_collect_garbage_skips_served_and_kept_artifacts(self):
+        served = self.make_artifact(self.source_path, '.csv', 100, 1000)
+        kept = self.make_artifact(self.source_path, '.edf', 100, 2000)
+        with open_artifact(served):
+            os.utime(served, (1000, os.path.getmtime(served)))
+            result = collect_garbage([], max_bytes=0, keep=[kept])
+        self.assertEqual(result, {'orphaned': 0, 'evicted': 0, 'freed': 0, 'remaining': 200})
+        self.assertTrue(os.path.exists(served))
+        self.assertTrue(os.path.exists(kept))
+        collect_garbage([], max_bytes=0, keep=[kept])
+        self.assertFalse(os.path.exists(served))
+
+    def test_collect_garbage_dry_run_removes_nothing(self):
+        path = self.make_artifact(self.source_path, '.csv', 100, 1000)
+        result = collect_garbage([], dry_run=True)
+        self.assertEqual(result, {'orphaned': 1, 'evicted': 0, 'freed': 100, 'remaining': 0})
+        self.assertTrue(os.path.exists(path))
+
+    def test_reader_racing_the_garbage_collector_locks_the_current_lock_file(self):
+        path = self.make_artifact(self.source_path, '.csv', 100, 1000)
+        flock = fcntl.flock
+        raced = []
+
+        def racing_flock(lock_file, operation):
+            # After the reader opened the lock file, the collector removes the artifact with its lock file, and
+            # the artifact is computed again, before the reader gets its lock.
+            if operation == fcntl.LOCK_SH and not raced:
+                raced.append(True)
+                self.assertEqual(collect_garbage([self.source_path], max_bytes=0)['evicted'], 1)
+                self.make_artifact(self.source_path, '.csv', 100, 1000)
+            flock(lock_file, operation)
+
+        with mock.patch('base.artifacts.fcntl.flock', racing_flock):
+            f = open_artifact(path)
+        with f:
+            self.assertEqual(collect_garbage([self.source_path], max_bytes=0)['evicted'], 0)
+            self.assertEqual(f.read(), b'x' * 100)
+        self.assertTrue(raced)
+
+    def test_open_fresh_computes_an_artifact_removed_before_it_is_opened(self):
+        output_path = derived_path(self.source_path, '.csv')
+        calls = []
+
+        def compute(temporary_path):
+            calls.append(temporary_path)
+            with open(temporary_path, 'w') as f:
+                f.write('content')
+
+        def racing_single_flight(*args):
+            # The collector removes the artifact after single_flight returned it, the first time only.
+            path = single_flight(*args)
+            if len(calls) == 1:
+                self.assertEqual(collect_garbage([], max_bytes=0)['orphaned'], 1)
+            return path
+
+        with mock.patch('base.artifacts.single_flight', side_effect=racing_single_flight):
+            f = open_fresh(output_path, self.source_path, compute)
+        with f:
+            self.assertEqual(f.read(), b'content')
+            self.assertEqual(collect_garbage([], max_bytes=0)['orphaned'], 0)
+        self.assertEqual(len(calls), 2)
@@ -0,0 +1,38 @@
+import numpy as np
+from unittest import mock
+from django.test import SimpleTestCase
+from base import channel_stats
+from base.channel_stats import channel_statistics
+
+
+class TestChannelStats(SimpleTestCase):
+    def test_statistics_match_numpy(self):
+        values = np.random.default_rng(0).normal(5, 2, 10000)
+        values[::10] = np.nan
+        valid = values[~np.isnan(values)]
+        # Small chunks, so the statistics are combined from many chunks.
+        with mock.patch.object(channel_stats, 'CHUNK_SIZE', 777):
+            statistics = channel_statistics(values, 0.01)
+        self.assertEqual(statistics['samples'], 10000)
+        self.assertAlmostEqual(statistics['duration'], 100)
+        self.assertAlmostEqual(statistics['missing_fraction'], 0.1)
+        self.assertAlmostEqual(statistics['mean'], valid.mean())
+        self.assertAlmostEqual(statistics['std'], valid.std())
+        self.assertEqual(statistics['minimum'], valid.min())
+        self.assertEqual(statistics['maximum'], valid.max())
+        self.assertAlmostEqual(statistics['median'], np.median(valid))
+        self.assertAlmostEqual(statistics['p95'], np.percentile(valid, 95))
+
+    def test_percentiles_from_subsample(self):
+        values = np.arange(100000, dtype=np.float64)
+        with mock.patch.object(channel_stats, 'PERCENTILE_SAMPLES', 1000), mock.patch.object(channel_stats, 'CHUNK_SIZE', 333):
+            statistics = channel_statistics(values, 1)
+        self.assertAlmostEqual(statistics['median'], 50000, delta=100)
+        self.assertAlmostEqual(statistics['p5'], 5000, delta=100)
+
+    def test_channel_without_signal(self):
+        statistics = channel_statistics(np.full(100, np.nan), 0.5)
+        self.assertEqual(statistics['missing_fraction'], 1)
+        self.assertIsNone(statistics['mean'])
+        self.assertIsNone(statistics['median'])
+        self.assertEqual(statistics['duration'], 50)
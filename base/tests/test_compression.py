@@ -0,0 +1,76 @@
+import os
+import gzip
+import tempfile
+import unittest
+from unittest import mock
+from django.http import FileResponse
+from django.test import SimpleTestCase, RequestFactory
+from base import compression
+from base.compression import negotiate, compress_chunks, check_compression, download_response, CompressionError
+
+
+class TestCompression(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "wb") as f:
+            f.write(b"Time,II\n" + b"".join(b"%d,%d\n" % (number, number % 7) for number in range(100000)))
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(lambda: os.path.exists(self.path + ".lock") and os.remove(self.path + ".lock"))
+        self.factory = RequestFactory()
+
+    def read(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_negotiate(self):
+        with mock.patch.object(compression, "HAS_ZSTD", False):
+            self.assertEqual(negotiate("gzip, deflate, br, zstd"), "gzip")
+            self.assertIsNone(negotiate("gzip;q=0, deflate"))
+            self.assertIsNone(negotiate(None))
+        with mock.patch.object(compression, "HAS_ZSTD", True):
+            self.assertEqual(negotiate("gzip, zstd"), "zstd")
+            self.assertEqual(negotiate("zstd;q=0, *"), "gzip")
+
+    def test_check_compression(self):
+        self.assertIsNone(check_compression(""))
+        self.assertEqual(check_compression("GZIP"), "gzip")
+        with self.assertRaises(CompressionError):
+            check_compression("rar")
+
+    def test_compress_chunks(self):
+        chunks = [b"a" * 1000, b"", b"b" * 1000]
+        self.assertEqual(gzip.decompress(b"".join(compress_chunks(chunks, "gzip"))), b"".join(chunks))
+
+    def test_negotiated_download(self):
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip")
+        with mock.patch.object(compression, "CHUNK_SIZE", 1 << 16):
+            response = download_response(request, self.path, "export.csv", "text/csv")
+            content = self.read(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="export.csv"')
+        with open(self.path, "rb") as f:
+            original = f.read()
+        self.assertEqual(gzip.decompress(content), original)
+        self.assertLess(len(content), len(original) / 3)
+
+    def test_compressed_file_download(self):
+        response = download_response(self.factory.get("/"), b"header", "file_header.txt", "text/plain", "gzip")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="file_header.txt.gz"')
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(gzip.decompress(self.read(response)), b"header")
+
+    def test_uncompressed_download(self):
+        response = download_response(self.factory.get("/"), self.path, "export.npz", "application/octet-stream", text=False)
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(int(response["Content-Length"]), os.path.getsize(self.path))
+        response.close()
+
+    @unittest.skipUnless(compression.HAS_ZSTD, "zstandard is not installed")
+    def test_zstd(self):
+        response = download_response(self.factory.get("/"), self.path, "export.csv", "text/csv", "zstd")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="export.csv.zst"')
+        with open(self.path, "rb") as f:
+            original = f.read()
+        content = self.read(response)
+        self.assertEqual(compression.zstandard.ZstdDecompressor().decompressobj().decompress(content), original)
@@ -0,0 +1,73 @@
+import os
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from base import datapool
+from base.datapool import LRUPool
+
+
+class TestLRUPool(SimpleTestCase):
+    def test_evicts_least_recently_used_by_count(self):
+        pool = LRUPool(max_entries=2, max_bytes=100)
+        pool.put('a', 1, 1)
+        pool.put('b', 2, 1)
+        pool.get('a')
+        pool.put('c', 3, 1)
+        self.assertEqual(pool.get('a'), 1)
+        self.assertIsNone(pool.get('b'))
+        self.assertEqual(pool.get('c'), 3)
+
+    def test_evicts_by_size(self):
+        pool = LRUPool(max_entries=10, max_bytes=10)
+        pool.put('a', 1, 6)
+        pool.put('b', 2, 6)
+        self.assertIsNone(pool.get('a'))
+        self.assertEqual(pool.total_bytes, 6)
+        # Objects larger than the pool are not kept at all.
+        pool.put('c', 3, 11)
+        self.assertIsNone(pool.get('c'))
+
+
+class TestDataPool(SimpleTestCase):
+    def setUp(self):
+        datapool._headers.clear()
+        datapool._data.clear()
+        self.temp_file = tempfile.NamedTemporaryFile(suffix='.mwf', delete=False)
+        self.temp_file.write(b'Test content')
+        self.temp_file.close()
+
+    def tearDown(self):
+        os.unlink(self.temp_file.name)
+
+    @mock.patch('base.datapool.get_header', return_value='header')
+    def test_header_is_parsed_once(self, get_header):
+        self.assertEqual(datapool.get_cached_header(self.temp_file.name), 'header')
+        self.assertEqual(datapool.get_cached_header(self.temp_file.name), 'header')
+        get_header.assert_called_once()
+
+    @mock.patch('base.datapool.get_header', return_value='header')
+    def test_changed_file_is_parsed_again(self, get_header):
+        datapool.get_cached_header(self.temp_file.name)
+        with open(self.temp_file.name, 'ab') as f:
+            f.write(b' more content')
+        datapool.get_cached_header(self.temp_file.name)
+        self.assertEqual(get_header.call_count, 2)
+
+    @mock.patch('base.datapool.Data', side_effect=lambda path: {'content': open(path, 'rb').read(), 'channels': []})
+    def test_data_is_parsed_from_pooled_content(self, data_class):
+        first = datapool.get_data(self.temp_file.name)
+        first['channels'].append('modified')
+        # The second request parses the pooled content without reading the recording again.
+        with mock.patch('base.datapool.open', create=True, side_effect=AssertionError('read from disk')):
+            second = datapool.get_data(self.temp_file.name)
+        self.assertEqual(data_class.call_count, 2)
+        self.assertEqual(second['content'], b'Test content')
+        self.assertEqual(second['channels'], [])
+        self.assertEqual(datapool._data.get(datapool._key(self.temp_file.name)), b'Test content')
+
+    @mock.patch('base.datapool.get_header', return_value='header')
+    def test_pool_limits_are_read_from_settings(self, get_header):
+        with override_settings(MONK_HEADER_POOL_MAX_BYTES=1):
+            datapool.get_cached_header(self.temp_file.name)
+            datapool.get_cached_header(self.temp_file.name)
+        self.assertEqual(get_header.call_count, 2)
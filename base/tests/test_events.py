@@ -0,0 +1,25 @@
+import numpy as np
+from unittest import mock
+from django.test import SimpleTestCase
+from base import events
+from base.events import find_events
+
+
+class TestEvents(SimpleTestCase):
+    def setUp(self):
+        # SpO2 at 1 Hz for 10 minutes.
+        self.values = np.full(600, 97.0)
+        self.values[100:130] = 85  # 30 s desaturation
+        self.values[115] = 80
+        self.values[300:305] = 88  # too short
+        self.values[400:450] = np.nan
+
+    def test_desaturations_across_chunks(self):
+        with mock.patch.object(events, 'CHUNK_SIZE', 7):
+            found = find_events(self.values, 1.0, below=90, min_seconds=10)
+        self.assertEqual(found, [(100.0, 130.0, 80.0)])
+
+    def test_above_threshold_and_times(self):
+        found = find_events(self.values, 1.0, above=96, min_seconds=160, times=lambda sample: 1000 + sample)
+        # Missing samples are neither below nor above a threshold.
+        self.assertEqual(found, [(1130.0, 1300.0, 97.0)])
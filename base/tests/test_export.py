@@ -0,0 +1,49 @@
+import io
+import os
+import zipfile
+import tempfile
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from base import export
+from base.export import stream_zip, convert_ahead
+
+
+class TestExport(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_stream_zip_writes_members_in_chunks(self):
+        content = os.urandom(5000) + b"0" * 20000
+        path = self.write("a.csv", content)
+        with mock.patch.object(export, "CHUNK_SIZE", 1000):
+            chunks = list(stream_zip([("s1/1.csv", path, None), ("s2/2.csv", None, "Not indexed.")]))
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual(archive.namelist(), ["s1/1.csv", "s2/2.csv.error.txt"])
+            self.assertEqual(archive.read("s1/1.csv"), content)
+            self.assertEqual(archive.read("s2/2.csv.error.txt"), b"Not indexed.")
+            self.assertIsNone(archive.testzip())
+
+    @override_settings(MONK_EXPORT_WORKERS=0)
+    def test_convert_in_order_with_errors(self):
+        path = self.write("b.csv", b"1,2\n")
+        missing = os.path.join(self.directory.name, "missing.csv")
+        results = list(convert_ahead([("b", os.path.realpath, (path,)), ("c", os.stat, (missing,))]))
+        self.assertEqual(results[0], ("b", os.path.realpath(path), None))
+        self.assertEqual(results[1][:2], ("c", None))
+        self.assertIn("missing.csv", results[1][2])
+
+    @override_settings(MONK_EXPORT_WORKERS=2)
+    def test_convert_in_process_pool(self):
+        paths = [self.write(f"{number}.csv", b"") for number in range(6)]
+        with mock.patch.object(export, "_pool", None):
+            results = list(convert_ahead([(str(number), os.path.realpath, (path,)) for number, path in enumerate(paths)]))
+            export._pool.shutdown()
+        self.assertEqual(results, [(str(number), os.path.realpath(path), None) for number, path in enumerate(paths)])
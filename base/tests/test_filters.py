@@ -0,0 +1,83 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from base.filters import parse_filters, format_filters, design, apply_filters, filter_chunks, filtered_channel, FilterError
+from base.mfer import build_index, MferReader
+from base.tests.test_mfer import write_mfer
+
+
+def amplitude(values, frequency, sampling_rate):
+    # Amplitude of one frequency in the middle of a signal, away from the edges.
+    middle = values[len(values) // 4 : 3 * len(values) // 4]
+    times = np.arange(middle.size) / sampling_rate
+    return 2 * abs(np.mean(middle * np.exp(-2j * np.pi * frequency * times)))
+
+
+class TestFilters(SimpleTestCase):
+    def setUp(self):
+        self.rate = 250.0
+        self.times = np.arange(20000) / self.rate
+
+    def test_parse_filters(self):
+        filters = parse_filters(' highpass:0.5, notch:50,bandpass:1-40,median:0.2')
+        self.assertEqual(filters, [('highpass', (0.5,)), ('notch', (50.0,)), ('bandpass', (1.0, 40.0)), ('median', (0.2,))])
+        self.assertEqual(format_filters(filters), 'highpass:0.5,notch:50,bandpass:1-40,median:0.2')
+        self.assertEqual(parse_filters(''), [])
+        for text in ['smooth:1', 'lowpass:', 'bandpass:1', 'lowpass:-1', 'notch:nan']:
+            with self.assertRaises(FilterError):
+                parse_filters(text)
+
+    def test_design_rejects_frequencies_above_nyquist(self):
+        with self.assertRaises(FilterError):
+            design('lowpass', (200.0,), self.rate)
+        with self.assertRaises(FilterError):
+            design('bandpass', (40.0, 10.0), self.rate)
+
+    def test_notch_removes_mains(self):
+        signal = np.sin(2 * np.pi * 5 * self.times) + np.sin(2 * np.pi * 50 * self.times)
+        filtered = apply_filters(signal, parse_filters('notch:50'), self.rate)
+        self.assertEqual(filtered.shape, signal.shape)
+        self.assertEqual(filtered.dtype, np.float32)
+        self.assertLess(amplitude(filtered, 50, self.rate), 0.01)
+        self.assertAlmostEqual(amplitude(filtered, 5, self.rate), 1, delta=0.01)
+
+    def test_highpass_removes_baseline_without_delay(self):
+        signal = np.sin(2 * np.pi * 10 * self.times)
+        filtered = apply_filters(signal + 0.5 * self.times / self.times[-1] + 3, parse_filters('highpass:0.5'), self.rate)
+        middle = slice(len(signal) // 4, 3 * len(signal) // 4)
+        np.testing.assert_allclose(filtered[middle], signal[middle], atol=0.02)
+
+    def test_median_keeps_steps(self):
+        signal = np.where(self.times < 40, 0.0, 1.0)
+        signal[1000] = 10
+        filtered = apply_filters(signal, parse_filters('median:0.02'), self.rate)
+        self.assertEqual(filtered[1000], 0)
+        np.testing.assert_array_equal(filtered, np.where(self.times < 40, 0.0, 1.0))
+
+    def test_chunks_give_the_same_result(self):
+        signal = np.random.default_rng(0).normal(size=5000)
+        filters = parse_filters('bandpass:1-40,median:0.05')
+        whole = apply_filters(signal, filters, self.rate)
+        chunked = np.concatenate(list(filter_chunks(np.array_split(signal, 37), filters, self.rate)))
+        np.testing.assert_allclose(chunked, whole, atol=1e-5)
+
+    def test_missing_samples_stay_missing(self):
+        signal = np.sin(2 * np.pi * 5 * self.times)
+        signal[100:110] = np.nan
+        filtered = apply_filters(signal, parse_filters('lowpass:40'), self.rate)
+        self.assertTrue(np.isnan(filtered[100:110]).all())
+        self.assertFalse(np.isnan(np.delete(filtered, range(100, 110))).any())
+
+    def test_filtered_channel_is_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recording.mwf')
+            write_mfer(path, [np.arange(2000, dtype=np.int16).reshape(100, 2, 10)])
+            view = MferReader(path, build_index(path)).channel(1)
+            filters = parse_filters('lowpass:10')
+            first = filtered_channel(path, view, filters)
+            self.assertEqual(first.shape, (len(view),))
+            np.testing.assert_allclose(first, apply_filters(view[:], filters, 100.0), atol=1e-4)
+            modified = os.path.getmtime(first.filename)
+            second = filtered_channel(path, view, filters)
+            self.assertEqual(os.path.getmtime(second.filename), modified)
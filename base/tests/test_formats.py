@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from base import formats
+from base.formats import check_format, write_aligned, FormatError
+
+
+class TestFormats(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.start = np.datetime64("2024-01-01T10:00:00")
+        self.grid = np.arange(5) * 0.5
+        self.aligned = np.array([[1, 2, np.nan, 4, 5], [97, 97, 97, 97, 97]], dtype=np.float32)
+        self.times = self.start + np.arange(5) * np.timedelta64(500, "ms")
+
+    # Function writing the test channels in slices of two grid points, as an export would.
+    def write(self, name, start=True, progress=None):
+        def slices(rows):
+            for first in range(0, self.grid.size, 2):
+                yield self.grid[first : first + 2], self.aligned[rows, first : first + 2]
+
+        write_aligned(
+            self.path(f"export.{name}"), name, ["II", "SpO2"], self.grid.size, slices,
+            self.start if start else None, progress,
+        )
+        return self.path(f"export.{name}")
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_check_format(self):
+        self.assertEqual(check_format(None), "csv")
+        self.assertEqual(check_format("NPZ"), "npz")
+        with self.assertRaises(FormatError):
+            check_format("xlsx")
+
+    def test_missing_packages_are_refused(self):
+        with mock.patch.object(formats, "HAS_PYARROW", False), mock.patch.object(formats, "HAS_H5PY", False):
+            for name in ("parquet", "arrow", "hdf5"):
+                with self.assertRaises(FormatError):
+                    check_format(name)
+
+    def test_npz(self):
+        fractions = []
+        with np.load(self.write("npz", progress=fractions.append)) as archive:
+            self.assertEqual(list(archive["channels"]), ["II", "SpO2"])
+            self.assertEqual(archive["values"].dtype, np.float32)
+            np.testing.assert_array_equal(archive["values"], self.aligned)
+            np.testing.assert_array_equal(archive["time"], self.times)
+        self.assertEqual(fractions[-1], 1)
+        with np.load(self.write("npz", start=False)) as archive:
+            np.testing.assert_array_equal(archive["time"], self.grid)
+
+    def test_csv(self):
+        fractions = []
+        with open(self.write("csv", progress=fractions.append)) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "Time,II,SpO2")
+        self.assertEqual(lines[1], "2024-01-01T10:00:00.000000,1.0,97.0")
+        self.assertEqual(lines[3], "2024-01-01T10:00:01.000000,,97.0")
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(fractions, [0.4, 0.8, 1])
+
+    def test_empty_export(self):
+        write_aligned(self.path("export.csv"), "csv", ["II"], 0, lambda rows: iter([]))
+        with open(self.path("export.csv")) as f:
+            self.assertEqual(f.read().strip(), "Time,II")
+
+    @unittest.skipUnless(formats.HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_and_arrow(self):
+        for df in (pd.read_parquet(self.write("parquet")), pd.read_feather(self.write("arrow"))):
+            self.assertEqual(list(df.columns), ["time", "II", "SpO2"])
+            self.assertEqual(df["II"].dtype, np.float32)
+            np.testing.assert_array_equal(df["SpO2"], self.aligned[1])
+            self.assertEqual(df["time"].iloc[4], pd.Timestamp(self.times[4]))
+
+    @unittest.skipUnless(formats.HAS_H5PY, "h5py is not installed")
+    def test_hdf5(self):
+        with formats.h5py.File(self.write("hdf5")) as f:
+            self.assertEqual(f["values"].shape, (2, 5))
+            np.testing.assert_array_equal(f["values"][:], self.aligned)
+            self.assertEqual([name.decode() for name in f["channels"][:]], ["II", "SpO2"])
+            self.assertEqual(f["time"][4], self.times[4].astype("datetime64[ns]").astype(np.int64))
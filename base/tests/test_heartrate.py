@@ -0,0 +1,52 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from base.heartrate import detect_r_peaks, detect_beats, beat_rates, heart_rate_trend
+from base.mfer import build_index, MferReader
+from base.tests.test_mfer import write_mfer
+
+
+# Function returning a synthetic ECG with narrow R waves at the given beat times, wider T waves, baseline wander and noise.
+def synthetic_ecg(beats, duration, sampling_rate):
+    times = np.arange(0, duration, 1 / sampling_rate)
+    signal = 0.5 * np.sin(2 * np.pi * 0.2 * times)
+    for beat in beats:
+        signal += 1.5 * np.exp(-(((times - beat) / 0.01) ** 2)) + 0.3 * np.exp(-(((times - beat - 0.25) / 0.05) ** 2))
+    signal += np.random.default_rng(0).normal(0, 0.03, times.size)
+    return times, signal
+
+
+class TestHeartRate(SimpleTestCase):
+    def test_detect_r_peaks(self):
+        beats = np.cumsum(np.random.default_rng(1).uniform(0.6, 1.0, 100))
+        times, signal = synthetic_ecg(beats, beats[-1] + 1, 250)
+        peaks, _ = detect_r_peaks(signal, 250)
+        self.assertEqual(len(peaks), len(beats))
+        np.testing.assert_allclose(times[peaks], beats, atol=0.01)
+
+    def test_flat_signal_has_no_beats(self):
+        peaks, _ = detect_r_peaks(np.zeros(1000), 250)
+        self.assertEqual(len(peaks), 0)
+        peaks, _ = detect_r_peaks(np.full(1000, np.nan), 250)
+        self.assertEqual(len(peaks), 0)
+
+    def test_detect_beats_across_blocks(self):
+        beats = np.arange(0.5, 150, 0.8)
+        _, signal = synthetic_ecg(beats, 150, 100)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recording.mwf')
+            # One channel, in sequences of one second.
+            write_mfer(path, [np.round(signal * 1000).astype(np.int16).reshape(150, 1, 100)], resolution_exponent=-3)
+            found = detect_beats(MferReader(path, build_index(path)).channel(0))
+        self.assertEqual(len(found), len(beats))
+        np.testing.assert_allclose(found, beats, atol=0.02)
+
+    def test_beat_rates_leave_out_implausible_intervals(self):
+        times, rates = beat_rates([0, 1, 1.1, 2.1, 12.1])
+        np.testing.assert_allclose(rates, [60, 60])
+        np.testing.assert_allclose(times, [1, 2.1])
+
+    def test_heart_rate_trend(self):
+        beats = np.concatenate([np.arange(0, 10, 1.0), np.arange(20, 30, 0.5)])
+        self.assertEqual(heart_rate_trend(beats, 10, 30), [60.0, None, 120.0])
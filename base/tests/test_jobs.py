@@ -0,0 +1,117 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from base import jobs
+from base.models import UserProfile, File, ExportJob
+
+
+class TestJobs(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "wb") as f:
+            f.write(bytes(range(256)) * 40)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+        self.addCleanup(lambda: os.path.exists(self.path + ".lock") and os.remove(self.path + ".lock"))
+        self.factory = RequestFactory()
+        user = User.objects.create_user(username='testuser', password='password123')
+        self.user_profile = UserProfile.objects.create(user=user, name='Test User', mobile='123456789')
+        self.file = File.objects.create(title='test_file', file='nihon_kohden_files/test.mwf')
+        self.parameters = {
+            "channels": ["II"], "start_time": None, "end_time": 10.0, "timestamps": True,
+            "sampling_rate": None, "filters": "highpass:0.5", "format": "csv",
+        }
+
+    def get(self, **headers):
+        response = jobs.ranged_response(self.factory.get("/", **headers), self.path, "export.csv", "text/csv")
+        return response, b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_whole_file(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(content, bytes(range(256)) * 40)
+
+    def test_ranges(self):
+        response, content = self.get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 100-199/10240")
+        self.assertEqual(content, bytes(range(100, 200)))
+        response, content = self.get(HTTP_RANGE="bytes=10200-")
+        self.assertEqual((response["Content-Length"], len(content)), ("40", 40))
+        response, content = self.get(HTTP_RANGE="bytes=-10")
+        self.assertEqual(content, bytes(range(246, 256)))
+        response, _ = self.get(HTTP_RANGE="bytes=20000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10240")
+
+    def test_if_range_with_an_old_etag_gets_the_whole_file(self):
+        response, content = self.get(HTTP_RANGE="bytes=100-199", HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(content), 10240)
+        etag = response["ETag"]
+        response, _ = self.get(HTTP_RANGE="bytes=100-199", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_run(self):
+        job = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="test.csv")
+
+        def export(file_path, layout, channels, start, end, timestamps, sampling_rate, filters, export_format, progress):
+            self.assertEqual((channels, start, end, filters), (["II"], None, 10.0, [("highpass", (0.5,))]))
+            progress(0.5)
+            self.assertEqual(ExportJob.objects.get(id=job.id).status, ExportJob.RUNNING)
+            return self.path
+
+        with mock.patch.object(jobs, "export_waveforms", export), mock.patch.object(jobs, "get_waveform_index", return_value={}):
+            jobs.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.result), (ExportJob.DONE, 1, self.path))
+        self.assertGreater(job.expires_at, timezone.now() + timedelta(hours=23))
+
+    def test_failed_run(self):
+        job = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="test.csv")
+        with mock.patch.object(jobs, "get_waveform_index", return_value=None):
+            jobs.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.FAILED)
+        self.assertIn("not supported", job.error)
+
+    def test_expire_keeps_shared_results(self):
+        past = timezone.now() - timedelta(seconds=1)
+        old = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="a.csv", status=ExportJob.DONE, result=self.path, expires_at=past)
+        current = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="a.csv", status=ExportJob.DONE, result=self.path, expires_at=past + timedelta(hours=1))
+        self.assertEqual(jobs.expire(), 1)
+        self.assertTrue(os.path.exists(self.path))
+        ExportJob.objects.filter(id=current.id).update(expires_at=past)
+        self.assertEqual(jobs.expire(), 1)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(ExportJob.objects.filter(id__in=[old.id, current.id]).exists())
+
+    def test_expire_fails_jobs_that_did_not_finish_in_time(self):
+        past = timezone.now() - timedelta(seconds=1)
+        overdue = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="a.csv", status=ExportJob.RUNNING, expires_at=past)
+        pending = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="a.csv", expires_at=past + timedelta(hours=1))
+        # A job submitted before jobs were given a deadline.
+        old = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="a.csv")
+        ExportJob.objects.filter(id=old.id).update(created_at=past - timedelta(days=1))
+        self.assertEqual(jobs.expire(), 0)
+        for job, status in ((overdue, ExportJob.FAILED), (pending, ExportJob.QUEUED), (old, ExportJob.FAILED)):
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+        self.assertIn("did not finish in time", overdue.error)
+        self.assertGreater(overdue.expires_at, timezone.now())
+        # A failed job is not run anymore.
+        with mock.patch.object(jobs, "export_waveforms") as export:
+            jobs.run(overdue.id)
+        export.assert_not_called()
+
+    def test_expire_keeps_results_that_are_being_downloaded(self):
+        past = timezone.now() - timedelta(seconds=1)
+        ExportJob.objects.create(user=self.user_profile, file=self.file, parameters=self.parameters, filename="a.csv", status=ExportJob.DONE, result=self.path, expires_at=past)
+        response = jobs.ranged_response(self.factory.get("/"), self.path, "export.csv", "text/csv")
+        self.assertEqual(jobs.expire(), 1)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(b"".join(response.streaming_content), bytes(range(256)) * 40)
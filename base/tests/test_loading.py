@@ -0,0 +1,47 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from base.loading import read_waveform_csv, fill_missing
+
+
+class TestLoading(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.temp_dir.name, 'recording.csv')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_csv(self, content):
+        with open(self.csv_path, 'w') as f:
+            f.write(content)
+
+    def test_reads_channel_columns_as_float32(self):
+        self.write_csv('II,V1,Marker\n1,2,3\n4,5,6\n')
+        columns, array = read_waveform_csv(self.csv_path, channels=['II', 'V1'])
+        self.assertEqual(columns, ['II', 'V1'])
+        self.assertEqual(array.dtype, np.float32)
+        np.testing.assert_array_equal(array, [[1, 4], [2, 5]])
+
+    def test_usecols_and_nrows(self):
+        self.write_csv('II,V1\n1,2\n4,5\n7,8\n')
+        columns, array = read_waveform_csv(self.csv_path, usecols=['V1'], nrows=2)
+        self.assertEqual(columns, ['V1'])
+        np.testing.assert_array_equal(array, [[2, 5]])
+
+    def test_values_that_are_not_numbers_are_missing(self):
+        self.write_csv('II,V1\n1,2\nn/a,5\n7,8\n')
+        columns, array = read_waveform_csv(self.csv_path)
+        self.assertTrue(np.isnan(array[0, 1]))
+        self.assertEqual(array[1, 1], 5)
+
+    def test_fill_missing_matches_pandas(self):
+        array = np.array(
+            [[np.nan, 1, np.nan, 3, np.nan], [0, np.nan, np.nan, 3, 4]], dtype=np.float32
+        )
+        filled, complete = fill_missing(array)
+        expected = pd.DataFrame(array.T).interpolate().dropna()
+        np.testing.assert_array_equal(np.flatnonzero(complete), expected.index)
+        np.testing.assert_allclose(filled[:, complete].T, expected.to_numpy())
@@ -0,0 +1,87 @@
+import os
+import json
+import threading
+import tempfile
+from django.test import SimpleTestCase, override_settings
+from base import metrics
+
+
+class TestMetrics(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.override = override_settings(MONK_METRICS_ENABLED=True, MONK_METRICS_DIR=self.temp_dir.name)
+        self.override.enable()
+        metrics._state = None
+
+    def tearDown(self):
+        if metrics._pending_flush is not None:
+            metrics._pending_flush.cancel()
+        metrics._state = None
+        self.override.disable()
+        self.temp_dir.cleanup()
+
+    def test_request_counts_and_histogram(self):
+        metrics.request_started('plot_graph')
+        metrics.request_finished('plot_graph', 'GET', 200, 0.3, response_bytes=1024)
+        output = metrics.render(metrics.collect())
+        self.assertIn('monk_http_requests_total{view="plot_graph",method="GET",status="200"} 1', output)
+        self.assertIn('monk_http_request_duration_seconds_bucket{view="plot_graph",le="0.25"} 0', output)
+        self.assertIn('monk_http_request_duration_seconds_bucket{view="plot_graph",le="0.5"} 1', output)
+        self.assertIn('monk_http_request_duration_seconds_bucket{view="plot_graph",le="+Inf"} 1', output)
+        self.assertIn('monk_http_response_bytes_total{view="plot_graph"} 1024', output)
+        self.assertIn('monk_http_requests_in_flight{view="plot_graph"} 0', output)
+
+    def test_throttled_flush_is_written_later(self):
+        with override_settings(MONK_METRICS_FLUSH_INTERVAL=0.2):
+            metrics.flush(force=True)
+            metrics.request_started('plot_graph')
+            metrics.request_finished('plot_graph', 'GET', 200, 0.1)
+            path = f'{self.temp_dir.name}/{os.getpid()}.json'
+            with open(path) as f:
+                self.assertEqual(json.load(f)['state']['requests'], {})
+            timer = metrics._pending_flush
+            timer.join(2)
+            with open(path) as f:
+                state = json.load(f)['state']
+        self.assertEqual(state['requests'], {'plot_graph': {'GET 200': 1}})
+        self.assertEqual(state['in_flight'], {'plot_graph': 0})
+
+    def test_concurrent_flushes(self):
+        errors = []
+
+        def flush_repeatedly():
+            try:
+                for _ in range(100):
+                    metrics.request_started('plot_graph')
+                    metrics.flush(force=True)
+            except OSError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=flush_repeatedly) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIn('monk_http_requests_in_flight{view="plot_graph"} 800', metrics.render(metrics.collect()))
+
+    def test_snapshots_of_exited_processes_are_archived(self):
+        # A snapshot left behind by a worker that no longer exists.
+        state = metrics._empty_state()
+        state['requests'] = {'download_mwf': {'GET 200': 2}}
+        state['in_flight'] = {'download_mwf': 1}
+        with open(f'{self.temp_dir.name}/999999999.json', 'w') as f:
+            json.dump({'pid': 999999999, 'state': state}, f)
+
+        for _ in range(2):
+            output = metrics.render(metrics.collect())
+            self.assertIn('monk_http_requests_total{view="download_mwf",method="GET",status="200"} 2', output)
+            self.assertNotIn('monk_http_requests_in_flight{view="download_mwf"}', output)
+
+    def test_cache_hit_ratio(self):
+        metrics.record_cache('plots', True)
+        metrics.record_cache('plots', True)
+        metrics.record_cache('plots', False)
+        output = metrics.render(metrics.collect())
+        self.assertIn('monk_cache_requests_total{cache="plots",result="hit"} 2', output)
+        self.assertIn('monk_cache_hit_ratio{cache="plots"} 0.6666666666666666', output)
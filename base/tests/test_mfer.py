@@ -0,0 +1,111 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from base.mfer import build_index, read_window, recordable_range, MferReader, MferError
+
+
+def field(tag, body):
+    if len(body) < 0x80:
+        return bytes([tag, len(body)]) + body
+    length = len(body).to_bytes(4, 'big')
+    return bytes([tag, 0x80 | len(length)]) + length + body
+
+
+# Function writing a little endian MFER file with 16-bit samples, one waveform data field per segment.
+# Every segment is an array of shape (sequences, channels, block_length).
+def write_mfer(path, segments, frequency=100, resolution_exponent=0, null=None):
+    content = field(0x01, b'\x01')
+    content += field(0x0B, bytes([0, 0]) + frequency.to_bytes(2, 'little'))
+    content += field(0x0C, bytes([1, resolution_exponent & 0xFF]) + (1).to_bytes(2, 'little'))
+    if null is not None:
+        content += field(0x0E, null.to_bytes(2, 'little', signed=True))
+    for segment in segments:
+        sequences, channels, block_length = segment.shape
+        content += field(0x04, block_length.to_bytes(2, 'little'))
+        content += field(0x05, bytes([channels]))
+        content += field(0x06, sequences.to_bytes(4, 'little'))
+        content += field(0x1E, segment.astype('<i2').tobytes())
+    content += b'\x80\x00'
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+class TestMfer(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'recording.mwf')
+        # 2 channels, 10 samples per block, 100 Hz: every sequence holds 0.1 seconds.
+        samples = np.arange(2 * 300, dtype=np.int16).reshape(2, 300)
+        self.segment = samples.reshape(2, 30, 10).transpose(1, 0, 2)
+        self.samples = samples
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_build_index(self):
+        write_mfer(self.path, [self.segment])
+        index = build_index(self.path)
+        self.assertEqual(index['channels'], 2)
+        self.assertAlmostEqual(index['duration'], 3.0)
+        segment = index['segments'][0]
+        self.assertEqual(segment['sequences'], 30)
+        self.assertEqual(segment['block_bytes'], 40)
+        self.assertEqual(segment['channels'][1]['offset'], 20)
+
+    def test_read_whole_recording(self):
+        write_mfer(self.path, [self.segment])
+        index = build_index(self.path)
+        (times, first), (_, second) = read_window(self.path, index, [0, 1])
+        np.testing.assert_array_equal(first, self.samples[0])
+        np.testing.assert_array_equal(second, self.samples[1])
+        self.assertAlmostEqual(times[1], 0.01)
+
+    def test_read_window(self):
+        write_mfer(self.path, [self.segment])
+        index = build_index(self.path)
+        [(times, values)] = read_window(self.path, index, [1], start=1.05, end=1.25)
+        np.testing.assert_array_equal(values, self.samples[1][105:125])
+        self.assertAlmostEqual(times[0], 1.05)
+
+    def test_read_window_across_segments(self):
+        write_mfer(self.path, [self.segment[:10], self.segment[10:]])
+        index = build_index(self.path)
+        self.assertEqual(len(index['segments']), 2)
+        self.assertAlmostEqual(index['segments'][1]['start'], 1.0)
+        [(times, values)] = read_window(self.path, index, [0], start=0.95, end=1.05)
+        np.testing.assert_array_equal(values, self.samples[0][95:105])
+
+    def test_resolution_and_null_values(self):
+        write_mfer(self.path, [self.segment], resolution_exponent=-1, null=5)
+        index = build_index(self.path)
+        [(times, values)] = read_window(self.path, index, [0], end=0.1)
+        self.assertTrue(np.isnan(values[5]))
+        self.assertAlmostEqual(float(values[6]), 0.6, places=5)
+
+    def test_recordable_range(self):
+        write_mfer(self.path, [self.segment], resolution_exponent=-1, null=5)
+        channel = build_index(self.path)['segments'][0]['channels'][0]
+        np.testing.assert_allclose(recordable_range(channel), (-3276.8, 3276.7))
+        channel['null'] = -32768
+        np.testing.assert_allclose(recordable_range(channel), (-3276.7, 3276.7))
+        self.assertIsNone(recordable_range(dict(channel, dtype='<f4')))
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'This is a test MWF content')
+        with self.assertRaises(MferError):
+            build_index(self.path)
+
+    def test_channel_view_slicing(self):
+        write_mfer(self.path, [self.segment[:10], self.segment[10:]])
+        reader = MferReader(self.path, build_index(self.path))
+        self.assertEqual(len(reader), 2)
+        channel = reader.channel(1)
+        self.assertEqual(len(channel), 300)
+        np.testing.assert_array_equal(channel[95:105], self.samples[1][95:105])
+        np.testing.assert_array_equal(channel[::50], self.samples[1][::50])
+        self.assertEqual(channel[-1], self.samples[1][-1])
+        np.testing.assert_allclose(channel.times(slice(99, 101)), [0.99, 1.0])
+        with self.assertRaises(IndexError):
+            channel[300]
@@ -1,6 +1,6 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
-from base.models import UserProfile, File, Subject, Project, FileImport
+from base.models import UserProfile, File, Subject, Project, FileImport, WaveformIndex, HeartRateSeries, ChannelStatistics, Event, TrendAggregate, ExportJob, AnalysisStage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
 import datetime
@@ -78,3 +78,46 @@ class TestModels(TestCase):
         new_project = Project.objects.create(description='A new project with no rekNummer')
         self.assertIsNone(new_project.rekNummer)
         self.assertEqual(new_project.description, 'A new project with no rekNummer')
+
+    def test_waveform_index_creation_and_str(self):
+        index = WaveformIndex.objects.create(file=self.file, layout=None)
+        self.assertEqual(str(index), 'Waveform index of test_file')
+        self.assertEqual(self.file.waveform_index, index)
+
+    def test_heart_rate_series_str(self):
+        series = HeartRateSeries.objects.create(
+            file=self.file, channel='II', beat_times=b'', trend_interval=10, trend=[60.0, None]
+        )
+        self.assertEqual(str(series), 'Heart rate of test_file (II)')
+        self.assertEqual(list(self.file.heart_rates.all()), [series])
+
+    def test_channel_statistics_str(self):
+        statistics = ChannelStatistics.objects.create(
+            file=self.file, number=0, channel='II', samples=0, duration=0, missing_fraction=1
+        )
+        self.assertEqual(str(statistics), 'Statistics of test_file (II)')
+        self.assertIsNone(statistics.mean)
+
+    def test_event_str(self):
+        event = Event.objects.create(file=self.file, channel='SpO2', kind='desaturation', start=12.34, end=30, value=85)
+        self.assertEqual(str(event), 'desaturation in test_file (SpO2) at 12.3 s')
+        self.assertEqual(list(self.file.events.all()), [event])
+
+    def test_trend_aggregate_str(self):
+        trend = TrendAggregate.objects.create(
+            file=self.file, channel='HR', start=120, interval=60, mean=72.5, minimum=70, maximum=75, count=60
+        )
+        self.assertEqual(str(trend), 'Trend of test_file (HR) at 120 s')
+        self.assertEqual(list(self.file.trend_aggregates.all()), [trend])
+
+    def test_export_job_str(self):
+        job = ExportJob.objects.create(user=self.user_profile, file=self.file, parameters={'format': 'csv'}, filename='test_file.csv')
+        self.assertEqual(str(job), 'Export of test_file (queued)')
+        self.assertFalse(job.is_expired())
+        job.expires_at = timezone.now() - datetime.timedelta(seconds=1)
+        self.assertTrue(job.is_expired())
+
+    def test_analysis_stage_str(self):
+        stage = AnalysisStage.objects.create(file=self.file, stage='statistics', started_at=timezone.now())
+        self.assertEqual(str(stage), 'Analysis stage statistics of test_file (running)')
+        self.assertEqual(list(self.file.analysis_stages.all()), [stage])
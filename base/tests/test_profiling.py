@@ -0,0 +1,81 @@
+import cProfile
+import tempfile
+from unittest import mock
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from base import profiling
+from base import middleware
+from base.middleware import ProfilingMiddleware
+
+
+def produce_chunk(number):
+    return b'%d\n' % sum(range(number))
+
+
+class TestProfiling(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.override = override_settings(
+            MONK_PROFILING_ENABLED=True,
+            MONK_PROFILING_DIR=self.temp_dir.name,
+            MONK_PROFILING_VIEWS=['plot_graph'],
+            MONK_PROFILING_THRESHOLD=1.0,
+            MONK_PROFILING_SAMPLE_RATES={'download_format_csv': 1},
+            MONK_PROFILING_MAX_FILES=2,
+        )
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.temp_dir.cleanup()
+
+    def test_should_profile(self):
+        self.assertTrue(profiling.should_profile('plot_graph'))
+        self.assertTrue(profiling.should_profile('download_format_csv'))
+        self.assertFalse(profiling.should_profile('home'))
+
+    def test_keep_reason(self):
+        self.assertEqual(profiling.keep_reason('plot_graph', 1.5), 'slow')
+        self.assertIsNone(profiling.keep_reason('plot_graph', 0.5))
+        # A sample rate of 1 keeps every request.
+        self.assertEqual(profiling.keep_reason('download_format_csv', 0.1), 'sampled')
+
+    def test_profiles_are_rotated(self):
+        for _ in range(3):
+            profiler = cProfile.Profile()
+            profiler.enable()
+            sum(range(100))
+            profiler.disable()
+            profiling.save_profile(profiler, 'plot_graph', 1.5, 'slow')
+        profiles = profiling.list_profiles()
+        self.assertEqual(len(profiles), 2)
+        path = profiling.profile_path(profiles[0]['name'])
+        self.assertIn('function calls', profiling.profile_summary(path))
+
+    def test_profile_path_rejects_unknown_names(self):
+        self.assertIsNone(profiling.profile_path('../db.sqlite3'))
+
+    def test_streamed_responses_are_profiled_until_sent(self):
+        def get_response(request):
+            return StreamingHttpResponse(produce_chunk(number) for number in range(3))
+
+        request = RequestFactory().get('/')
+        with mock.patch('base.middleware.view_name', return_value='download_format_csv'):
+            response = ProfilingMiddleware(get_response)(request)
+        self.assertEqual(profiling.list_profiles(), [])
+        self.assertEqual(b''.join(response.streaming_content), b'0\n0\n1\n')
+        profiles = profiling.list_profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('produce_chunk', profiling.profile_summary(profiling.profile_path(profiles[0]['name'])))
+
+    def test_requests_run_unprofiled_while_the_profiler_is_busy(self):
+        request = RequestFactory().get('/')
+        with mock.patch('base.middleware.view_name', return_value='download_format_csv'):
+            with middleware._profiler_lock:
+                response = ProfilingMiddleware(lambda request: StreamingHttpResponse([b'ok']))(request)
+                self.assertEqual(b''.join(response.streaming_content), b'ok')
+            with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is already active')):
+                response = ProfilingMiddleware(lambda request: StreamingHttpResponse([b'ok']))(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(middleware._profiler_lock.locked())
+        self.assertEqual(profiling.list_profiles(), [])
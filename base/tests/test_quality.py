@@ -0,0 +1,49 @@
+import numpy as np
+from unittest import mock
+from django.test import SimpleTestCase
+from base import quality
+from base.quality import scan_quality, summarize
+
+
+class TestQuality(SimpleTestCase):
+    def setUp(self):
+        # 60 seconds of noise at 100 Hz.
+        self.values = np.random.default_rng(0).normal(0, 1, 6000)
+
+    def test_clean_signal(self):
+        result = scan_quality(self.values, 0.01, self.values.min(), self.values.max(), (-10, 10))
+        self.assertEqual(result, {'flatline': [], 'dropout': [], 'clipping': [], 'implausible': []})
+
+    def test_problems_are_found_across_chunks(self):
+        values = self.values.copy()
+        values[1000:1500] = 0.5  # 5 s flatline
+        values[2000:2100] = np.nan  # 1 s dropout
+        values[3000:3010] = 4  # clipped at the maximum
+        values[3500] = 50  # implausible
+        values[4000:4010] = np.nan  # too short to be a dropout
+        with mock.patch.object(quality, 'CHUNK_SIZE', 97):
+            result = scan_quality(values, 0.01, np.nanmin(values[values < 10]), 4, (-10, 10))
+        np.testing.assert_allclose(result['flatline'], [[10, 15]])
+        np.testing.assert_allclose(result['dropout'], [[20, 21]])
+        np.testing.assert_allclose(result['clipping'], [[30, 30.1]])
+        np.testing.assert_allclose(result['implausible'], [[35, 35.01]])
+
+    def test_slow_channel_at_its_highest_value_is_not_clipping(self):
+        # 10 minutes of a 1 Hz SpO2 that stays at 100 %, with short steady stretches.
+        values = np.repeat([100.0, 99.0] * 30, 10)
+        result = scan_quality(values, 1.0, -3276.8, 3276.7, (0, 100))
+        self.assertEqual(result, {'flatline': [], 'dropout': [], 'clipping': [], 'implausible': []})
+        values[100:200] = 3276.7
+        np.testing.assert_allclose(scan_quality(values, 1.0, -3276.8, 3276.7)['clipping'], [[100, 200]])
+        np.testing.assert_allclose(scan_quality(values, 1.0)['flatline'], [[100, 200]])
+
+    def test_times_of_samples(self):
+        values = np.zeros(300)
+        result = scan_quality(values, 0.01, times=lambda sample: 100 + sample * 0.01)
+        np.testing.assert_allclose(result['flatline'], [[100, 103]])
+
+    def test_summarize(self):
+        summary = summarize({'channels': {'II': {'flatline': [[0, 2], [5, 8]], 'dropout': []}}})
+        self.assertEqual(summary[0]['channel'], 'II')
+        self.assertEqual(summary[0]['problems'][0], {'kind': 'flatline', 'count': 2, 'seconds': 5})
+        self.assertEqual(summarize(None), [])
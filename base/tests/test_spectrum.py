@@ -0,0 +1,42 @@
+import numpy as np
+from unittest import mock
+from django.test import SimpleTestCase
+from base import spectrum
+from base.spectrum import segment_samples, welch, spectrogram
+
+
+class TestSpectrum(SimpleTestCase):
+    def setUp(self):
+        self.rate = 200.0
+        times = np.arange(60 * 200) / self.rate
+        # A 10 Hz sine with amplitude 2 (power 2) and white noise with variance 0.01 (density 0.0001 per Hz).
+        self.values = 2 * np.sin(2 * np.pi * 10 * times) + np.random.default_rng(0).normal(0, 0.1, times.size)
+
+    def test_segment_samples(self):
+        self.assertEqual(segment_samples(2.0, 200), 512)
+        self.assertEqual(segment_samples(0.001, 200), 8)
+
+    def test_welch_finds_the_sine_and_its_power(self):
+        with mock.patch.object(spectrum, 'SEGMENT_BATCH', 7):
+            frequencies, density = welch(self.values, self.rate, 0, self.values.size)
+        self.assertAlmostEqual(frequencies[np.argmax(density)], 10, delta=0.5)
+        resolution = frequencies[1]
+        self.assertAlmostEqual(density.sum() * resolution, 2.01, delta=0.1)
+        # Away from the sine, the density is the one of the noise.
+        self.assertAlmostEqual(np.median(density), 0.0001, delta=0.00003)
+
+    def test_welch_skips_missing_samples(self):
+        values = self.values.copy()
+        values[1000:1100] = np.nan
+        _, density = welch(values, self.rate, 0, values.size)
+        self.assertFalse(np.isnan(density).any())
+        _, density = welch(np.full(1000, np.nan), self.rate, 0, 1000)
+        self.assertIsNone(density)
+
+    def test_spectrogram_columns_are_limited(self):
+        with mock.patch.object(spectrum, 'MAX_COLUMNS', 10), mock.patch.object(spectrum, 'SEGMENT_BATCH', 5):
+            frequencies, times, power = spectrogram(self.values, self.rate, 0, self.values.size, segment_seconds=1)
+        self.assertLessEqual(len(times), 10)
+        self.assertEqual(power.shape, (len(frequencies), len(times)))
+        self.assertTrue((np.diff(times) > 0).all())
+        np.testing.assert_allclose(frequencies[np.argmax(power, axis=0)], 10, atol=frequencies[1])
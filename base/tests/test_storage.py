@@ -0,0 +1,43 @@
+import os
+import tempfile
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from base.storage import ContentAddressedStorage, content_digest, sharded_name
+
+DIGEST = 'e1f3b1f5c9c1f5e1ba1d7e2c2c0c3a3f5d0e8a1c7b9e4d2f6a8b0c1d3e5f7a9b'
+
+
+class TestStorage(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.storage = ContentAddressedStorage(location=self.temp_dir.name)
+
+    def test_files_are_stored_under_their_hash(self):
+        name = self.storage.save('originals/recording.MWF', ContentFile(b'MWF content'))
+        digest = content_digest(name)
+        self.assertEqual(name, sharded_name(digest, '.mwf', 'originals'))
+        self.assertEqual(name, f'originals/{digest[:2]}/{digest[2:4]}/{digest}.mwf')
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'MWF content')
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('originals/a.mwf', ContentFile(b'MWF content'))
+        second = self.storage.save('originals/b.mwf', ContentFile(b'MWF content'))
+        other = self.storage.save('originals/a.mwf', ContentFile(b'other content'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(os.listdir(os.path.dirname(self.storage.path(first)))), 1)
+
+    def test_incomplete_file_is_replaced(self):
+        name = self.storage.save('originals/a.mwf', ContentFile(b'MWF content'))
+        with open(self.storage.path(name), 'wb') as f:
+            f.write(b'MWF')
+        self.assertEqual(self.storage.save('originals/b.mwf', ContentFile(b'MWF content')), name)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'MWF content')
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(name))), [os.path.basename(name)])
+
+    def test_content_digest(self):
+        self.assertEqual(content_digest(f'/media/originals/e1/f3/{DIGEST}.mwf'), DIGEST)
+        self.assertIsNone(content_digest('nihon_kohden_files/recording.mwf'))
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from base.mfer import build_index
+from unittest import mock
+from base import timebase
+from base.timebase import ChannelSeries, recording_start, absolute_times, read_series, common_grid, align, aligned_frame, grid_extent, aligned_slices
+from base.tests.test_mfer import write_mfer
+
+
+def series(name, interval, count, offset=0.0):
+    times = offset + np.arange(count) * interval
+    return ChannelSeries(name, interval, times, times.astype(np.float32))
+
+
+class TestTimebase(SimpleTestCase):
+    def test_recording_start(self):
+        self.assertEqual(recording_start({'start_time': '2024-01-02T03:04:05'}), np.datetime64('2024-01-02T03:04:05'))
+        # Falls back to the header, and ignores values that are not times.
+        header = type('Header', (), {'measurementTimeISO': '2024-01-02T03:04:05+01:00'})()
+        self.assertEqual(recording_start({'start_time': None}, header), np.datetime64('2024-01-02T02:04:05'))
+        self.assertIsNone(recording_start(None, type('Header', (), {'measurementTimeISO': 'N/A'})()))
+
+    def test_absolute_times(self):
+        times = absolute_times(np.datetime64('2024-01-01T00:00:00'), [0.0, 0.004])
+        self.assertEqual(times[1], np.datetime64('2024-01-01T00:00:00.004'))
+
+    def test_read_series_keeps_native_rate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recording.mwf')
+            write_mfer(path, [np.arange(60, dtype=np.int16).reshape(3, 2, 10)])
+            [channel] = read_series(path, build_index(path), ['I', 'II'], [1], start=0.1, end=0.2)
+        self.assertEqual(channel.name, 'II')
+        self.assertAlmostEqual(channel.interval, 0.01)
+        self.assertEqual(len(channel.values), 10)
+        np.testing.assert_array_equal(channel.values, np.arange(30, 40))
+
+    def test_aligned_slices_match_aligning_the_whole_window(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recording.mwf')
+            samples = (np.arange(600) ** 2 % 97).astype(np.int16).reshape(2, 300)
+            segment = samples.reshape(2, 30, 10).transpose(1, 0, 2)
+            write_mfer(path, [segment[:10], segment[10:]])
+            layout = build_index(path)
+            for interval in (None, 0.003):
+                grid, aligned = align(read_series(path, layout, ['I', 'II'], [0, 1], 0.42, 2.5), interval)
+                extent = grid_extent(path, layout, [0, 1], 0.42, 2.5, interval)
+                with mock.patch.object(timebase, 'SLICE_POINTS', 7):
+                    slices = list(aligned_slices(path, layout, ['I', 'II'], [0, 1], extent, 0.42, 2.5))
+                self.assertGreater(len(slices), 1)
+                np.testing.assert_allclose(np.concatenate([grid for grid, _ in slices]), grid)
+                np.testing.assert_allclose(np.concatenate([aligned for _, aligned in slices], axis=1), aligned)
+
+    def test_common_grid_uses_fastest_channel(self):
+        grid = common_grid([series('fast', 0.002, 501), series('slow', 0.01, 101)])
+        self.assertEqual(grid.size, 501)
+        self.assertEqual(common_grid([series('fast', 0.002, 501)], interval=0.1).size, 11)
+
+    def test_align_resamples_without_extrapolating(self):
+        grid, aligned = align([series('fast', 0.002, 501), series('late', 0.01, 51, offset=0.5)])
+        self.assertEqual(aligned.shape, (2, grid.size))
+        self.assertEqual(aligned.dtype, np.float32)
+        # The values are the times, so linear interpolation gives the grid back.
+        np.testing.assert_allclose(aligned[0], grid, atol=1e-5)
+        self.assertTrue(np.isnan(aligned[1, grid < 0.5]).all())
+        np.testing.assert_allclose(aligned[1, grid >= 0.5], grid[grid >= 0.5], atol=1e-5)
+
+    def test_align_leaves_gaps_empty(self):
+        first = series('gap', 0.01, 10)
+        second = series('gap', 0.01, 10, offset=1.0)
+        channel = ChannelSeries('gap', 0.01, np.concatenate([first.times, second.times]), np.ones(20))
+        grid, aligned = align([channel])
+        self.assertTrue(np.isnan(aligned[0, (grid > 0.2) & (grid < 0.98)]).all())
+        self.assertFalse(np.isnan(aligned[0, grid < 0.09]).any())
+
+    def test_aligned_frame_with_wall_clock(self):
+        df = aligned_frame([series('I', 0.5, 3)], start=np.datetime64('2024-01-01T00:00:00'))
+        self.assertEqual(list(df.columns), ['I'])
+        self.assertEqual(df.index[2], np.datetime64('2024-01-01T00:00:01'))
@@ -0,0 +1,27 @@
+import numpy as np
+from unittest import mock
+from django.test import SimpleTestCase
+from base import trends
+from base.trends import aggregate
+
+
+class TestTrends(SimpleTestCase):
+    def test_aggregates_across_chunks(self):
+        # 3 minutes at 2 Hz, with the value equal to the minute plus a small ramp.
+        values = np.repeat([1.0, 2.0, 3.0], 120) + np.tile(np.linspace(0, 0.5, 120), 3)
+        values[130:140] = np.nan
+        with mock.patch.object(trends, 'CHUNK_SIZE', 50):
+            result = aggregate(values, 0.5, 60)
+        self.assertEqual([row[0] for row in result], [0, 60, 120])
+        self.assertEqual([row[4] for row in result], [120, 110, 120])
+        self.assertAlmostEqual(result[0][1], 1.25)
+        self.assertEqual(result[1][2], 2.0)
+        self.assertAlmostEqual(result[1][1], np.nanmean(values[120:240]))
+        self.assertEqual(result[2][3], 3.5)
+
+    def test_intervals_without_samples_are_left_out(self):
+        values = np.ones(240)
+        values[60:180] = np.nan
+        result = aggregate(values, 1.0, 60, times=lambda first, last: 1000 + np.arange(first, last))
+        self.assertEqual([(row[0], row[4]) for row in result], [(960.0, 20), (1020.0, 40), (1140.0, 20), (1200.0, 40)])
+        self.assertEqual(aggregate(np.full(10, np.nan), 1.0, 60), [])
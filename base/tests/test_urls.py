@@ -80,6 +80,47 @@ class TestUrls(SimpleTestCase):
         url = reverse('plot_graph', kwargs={'file_id': 1})
         self.assertEquals(resolve(url).func, plot_graph)
 
+    def test_channel_data_url_resolves(self):
+        url = reverse('channel_data', kwargs={'file_id': 1})
+        self.assertEquals(resolve(url).func, channel_data)
+
+    def test_channel_statistics_url_resolves(self):
+        url = reverse('channel_statistics')
+        self.assertEquals(resolve(url).func, channel_statistics)
+
     def test_download_csv_format_url_resolves(self):
         url = reverse('download_format_csv', kwargs={'file_id': 1})
         self.assertEquals(resolve(url).func, download_format_csv)
+
+    def test_metrics_url_resolves(self):
+        url = reverse('metrics')
+        self.assertEquals(resolve(url).func, metrics_endpoint)
+
+    def test_view_profiles_url_resolves(self):
+        url = reverse('view_profiles')
+        self.assertEquals(resolve(url).func, view_profiles)
+
+    def test_download_profile_url_resolves(self):
+        url = reverse('download_profile', kwargs={'name': 'profile.prof'})
+        self.assertEquals(resolve(url).func, download_profile)
+
+    def test_spectrum_url_resolves(self):
+        url = reverse('spectrum', kwargs={'file_id': 1})
+        self.assertEquals(resolve(url).func, spectrum)
+
+    def test_events_url_resolves(self):
+        url = reverse('events')
+        self.assertEquals(resolve(url).func, events)
+
+    def test_trends_url_resolves(self):
+        url = reverse('trends')
+        self.assertEquals(resolve(url).func, trends)
+
+    def test_export_project_url_resolves(self):
+        url = reverse('export_project', args=[1])
+        self.assertEquals(resolve(url).func, export_project)
+
+    def test_export_job_urls_resolve(self):
+        self.assertEquals(resolve(reverse('submit_export', args=[1])).func, submit_export)
+        self.assertEquals(resolve(reverse('export_job', args=[1])).func, export_job)
+        self.assertEquals(resolve(reverse('download_export', args=[1])).func, download_export)
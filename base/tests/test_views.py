@@ -1,10 +1,16 @@
+import io
 import os
+import zipfile
 import tempfile
-from django.test import TestCase, Client
+import datetime
+from unittest import mock
+from django.core.cache import caches
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
-from base.models import UserProfile, File, Subject, Project, FileImport
+from base.models import UserProfile, File, Subject, Project, FileImport, ChannelStatistics, Event, TrendAggregate, ExportJob
 from django.http import HttpResponseForbidden, HttpResponse
 
 class TestViews(TestCase):
@@ -131,3 +137,178 @@ class TestViews(TestCase):
             response = self.client.post(reverse('import_multiple_files'), {'file_field': files}, follow=True)
             self.assertEqual(response.status_code, 200)
             self.assertTrue(File.objects.filter(title__contains='test').count(), 2)
+
+    def test_metrics_disabled_by_default(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_view_profiles_requires_staff(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('view_profiles'))
+        self.assertEqual(response.status_code, 302)  # Redirects to the admin login
+
+    @mock.patch('base.utils.render_plot', return_value='<div>plot</div>')
+    def test_plot_graph_is_cached_with_etag(self, render_plot):
+        caches['plots'].clear()
+        self.client.login(username='testuser', password='password123')
+        url = reverse('plot_graph', args=[self.file.id]) + '?combined=true&rows=100'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'graph_html': '<div>plot</div>'})
+        etag = response['ETag']
+
+        # The same plot is served from the cache, and not rendered again.
+        response = self.client.get(url)
+        self.assertEqual(response['ETag'], etag)
+        render_plot.assert_called_once()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Other parameters give another plot.
+        response = self.client.get(reverse('plot_graph', args=[self.file.id]) + '?combined=false&rows=100')
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(MONK_PLOT_CACHE_MAX_ITEM_BYTES=10)
+    @mock.patch('base.utils.render_plot', return_value='<div>plot</div>')
+    def test_large_plots_are_not_cached(self, render_plot):
+        caches['plots'].clear()
+        self.client.login(username='testuser', password='password123')
+        url = reverse('plot_graph', args=[self.file.id]) + '?combined=true&rows=100'
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.json(), {'graph_html': '<div>plot</div>'})
+        self.assertEqual(render_plot.call_count, 2)
+
+    def test_plot_graph_webgl_mode_is_cached_separately(self):
+        caches['plots'].clear()
+        self.client.login(username='testuser', password='password123')
+        url = reverse('plot_graph', args=[self.file.id]) + '?combined=true&rows=100'
+        with mock.patch('base.utils.render_plot', return_value='<div>plot</div>') as render_plot:
+            svg = self.client.get(url)
+            webgl = self.client.get(url + '&mode=webgl')
+        self.assertNotEqual(svg['ETag'], webgl['ETag'])
+        self.assertEqual(render_plot.call_args.args[5], 'webgl')
+
+    def test_channel_data_requires_login(self):
+        response = self.client.get(reverse('channel_data', args=[self.file.id]))
+        self.assertEqual(response.status_code, 302)
+
+    def test_channel_data_rejects_negative_channels(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('channel_data', args=[self.file.id]) + '?channel=-1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_spectrum_rejects_negative_channels(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('spectrum', args=[self.file.id]) + '?channel=-1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_decimate_min_max_keeps_peaks(self):
+        from base.utils import decimate_min_max
+        import numpy as np
+        values = np.zeros(10000, dtype=np.float32)
+        values[1234] = 5
+        values[8765] = -3
+        times = np.arange(values.size)
+        decimated_times, decimated = decimate_min_max(times, values, 100)
+        self.assertLessEqual(decimated.size, 101)
+        self.assertEqual(decimated.max(), 5)
+        self.assertEqual(decimated.min(), -3)
+        self.assertIn(1234, decimated_times)
+        self.assertTrue((np.diff(decimated_times) > 0).all())
+
+    def test_channel_statistics_of_accessible_files(self):
+        ChannelStatistics.objects.create(
+            file=self.file, number=0, channel='ECG II', samples=100, duration=1, missing_fraction=0, std=0.5
+        )
+        other_file = File.objects.create(title='Other File', file=SimpleUploadedFile('other.mwf', b'Other'))
+        ChannelStatistics.objects.create(
+            file=other_file, number=0, channel='ECG II', samples=100, duration=1, missing_fraction=0, std=0.5
+        )
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('channel_statistics'), {'channel': 'ecg', 'min_std': '0.1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['file_id'] for item in response.json()['statistics']], [self.file.id])
+        response = self.client.get(reverse('channel_statistics'), {'min_std': '1'})
+        self.assertEqual(response.json()['statistics'], [])
+        response = self.client.get(reverse('channel_statistics'), {'min_std': 'a lot'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_events_of_a_project(self):
+        Event.objects.create(file=self.file, channel='SpO2', kind='desaturation', start=100, end=130, value=85)
+        Event.objects.create(file=self.file, channel='SpO2', kind='dropout', start=400, end=450)
+        self.project.subjects.add(self.subject)
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('events'), {'project': self.project.id, 'kind': 'desaturation'})
+        self.assertEqual(response.status_code, 200)
+        [event] = response.json()['events']
+        self.assertEqual(event['value'], 85)
+        self.assertEqual(event['plot_url'], reverse('plot_graph', args=[self.file.id]) + '?start=70&end=160')
+        # Projects of other users are not found.
+        other_project = Project.objects.create(rekNummer='R002', description='Other Project')
+        response = self.client.get(reverse('events'), {'project': other_project.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_trends_of_a_project(self):
+        for start, mean, count in ((0, 70, 60), (60, 80, 30), (3600, 90, 60)):
+            TrendAggregate.objects.create(
+                file=self.file, subject=self.subject, channel='HR', start=start, interval=60,
+                mean=mean, minimum=mean - 5, maximum=mean + 5, count=count
+            )
+        self.project.subjects.add(self.subject)
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('trends'), {'project': self.project.id, 'channel': 'hr'})
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()['trends']
+        self.assertEqual((first['subject'], first['start'], first['count']), ('S001', 0, 90))
+        self.assertAlmostEqual(first['mean'], (70 * 60 + 80 * 30) / 90)
+        self.assertEqual((first['minimum'], first['maximum']), (65, 85))
+        self.assertEqual((second['start'], second['mean']), (3600, 90))
+        response = self.client.get(reverse('trends'), {'bucket': '0'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_project_of_other_users_is_not_found(self):
+        other_project = Project.objects.create(rekNummer='R002', description='Other Project')
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('export_project', args=[other_project.id]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('export_project', args=[self.project.id]), {'include': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('base.views.convert_ahead', return_value=iter([]))
+    @mock.patch('base.views.get_cached_header', side_effect=OSError('Unreadable header'))
+    def test_export_project_reports_files_that_can_not_be_read(self, get_cached_header, convert_ahead):
+        self.project.subjects.add(self.subject)
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('export_project', args=[self.project.id]))
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            [name] = archive.namelist()
+            self.assertTrue(name.endswith('.csv.error.txt'))
+            self.assertEqual(archive.read(name), b'Unreadable header')
+        self.assertEqual(list(convert_ahead.call_args.args[0]), [])
+
+    def test_export_jobs_of_other_users_are_not_found(self):
+        other_user = User.objects.create_user(username='other', password='password123')
+        other_profile = UserProfile.objects.create(user=other_user, name='Other User', mobile='987654321')
+        job = ExportJob.objects.create(user=other_profile, file=self.file, parameters={'format': 'csv'}, filename='test.csv')
+        self.client.login(username='testuser', password='password123')
+        self.assertEqual(self.client.get(reverse('export_job', args=[job.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('download_export', args=[job.id])).status_code, 404)
+
+    def test_expired_export_is_gone(self):
+        job = ExportJob.objects.create(
+            user=self.user_profile, file=self.file, parameters={'format': 'csv'}, filename='test.csv',
+            status=ExportJob.DONE, result=self.temp_file.name, expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('export_job', args=[job.id]), {'status': 'true'})
+        self.assertEqual(response.json()['status'], 'done')
+        self.assertEqual(self.client.get(reverse('download_export', args=[job.id])).status_code, 410)
+
+    def test_submit_export_with_invalid_format(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.post(reverse('submit_export', args=[self.file.id]), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
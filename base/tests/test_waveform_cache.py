@@ -0,0 +1,63 @@
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from base import waveform_cache
+
+
+class TestWaveformCache(SimpleTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.override = override_settings(
+            MONK_WAVEFORM_CACHE_DIR=os.path.join(self.temp_dir.name, 'waveforms'),
+            MONK_WAVEFORM_CACHE_MAX_BYTES=1000,
+        )
+        self.override.enable()
+        self.sources = []
+        for i in range(2):
+            path = os.path.join(self.temp_dir.name, f'recording{i}.mwf')
+            with open(path, 'wb') as f:
+                f.write(b'MWF content')
+            self.sources.append(path)
+        self.decoded = []
+
+    def tearDown(self):
+        self.override.disable()
+        self.temp_dir.cleanup()
+
+    def decode(self, samples=100):
+        def decode():
+            self.decoded.append(samples)
+            return ['II', 'V1'], np.arange(2 * samples, dtype=np.float64).reshape(2, samples)
+        return decode
+
+    def test_decoded_once_and_memory_mapped(self):
+        columns, array = waveform_cache.load(1, self.sources[0], self.decode())
+        columns, array = waveform_cache.load(1, self.sources[0], self.decode())
+        self.assertEqual(self.decoded, [100])
+        self.assertEqual(columns, ['II', 'V1'])
+        self.assertIsInstance(array, np.memmap)
+        self.assertEqual(array.dtype, np.float32)
+        self.assertEqual(array[1, 0], 100)
+
+    def test_least_recently_used_segment_is_evicted(self):
+        # Each recording takes 800 bytes, so only one fits in the budget.
+        waveform_cache.load(1, self.sources[0], self.decode())
+        waveform_cache.load(2, self.sources[1], self.decode())
+        segments = [name for name in os.listdir(waveform_cache.cache_dir()) if name.endswith('.npy')]
+        self.assertEqual(len(segments), 1)
+        self.assertTrue(segments[0].startswith('2-'))
+        # The lock file of the evicted segment is removed with it.
+        self.assertFalse(any(name.startswith('1-') for name in os.listdir(waveform_cache.cache_dir())))
+        waveform_cache.load(1, self.sources[0], self.decode())
+        self.assertEqual(self.decoded, [100, 100, 100])
+
+    def test_changed_recording_is_decoded_again(self):
+        waveform_cache.load(1, self.sources[0], self.decode())
+        with open(self.sources[0], 'ab') as f:
+            f.write(b' more content')
+        columns, array = waveform_cache.load(1, self.sources[0], self.decode(samples=50))
+        self.assertEqual(array.shape, (2, 50))
+        segments = [name for name in os.listdir(waveform_cache.cache_dir()) if name.endswith('.npy')]
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(len([name for name in os.listdir(waveform_cache.cache_dir()) if name.endswith('.npy.lock')]), 1)
@@ -0,0 +1,147 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from .mfer import MferReader
+from .filters import filtered_channel
+
+# Time base of the recordings.
+#
+# Every channel is kept at its own sampling rate, with the time of every sample computed from the block
+# index of the recording. Channels are only put on a common time grid when a plot or an export needs one
+# table, by linear interpolation onto that grid, instead of aligning all channels on the union of their
+# sample times. Times are in seconds from the start of the recording, and can be turned into wall clock
+# times with the start time of the recording. Exports of long windows are aligned a slice of the grid at a
+# time, so the memory they use does not grow with the length of the window.
+
+# Number of grid points aligned at a time by aligned_slices.
+SLICE_POINTS = 1 << 18
+
+# The samples of one channel at its native rate.
+ChannelSeries = namedtuple("ChannelSeries", ["name", "interval", "times", "values"])
+
+
+# Function returning the start of the recording as numpy datetime, from the block index or the header, or None if unknown.
+def recording_start(layout=None, header=None):
+    candidates = [
+        layout.get("start_time") if layout else None,
+        getattr(header, "measurementTimeISO", None),
+    ]
+    for value in candidates:
+        try:
+            timestamp = pd.Timestamp(value)
+        except (TypeError, ValueError):
+            continue
+        if timestamp is pd.NaT:
+            continue
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+        return timestamp.to_datetime64()
+    return None
+
+
+# Function turning times in seconds from the start of the recording into wall clock times.
+def absolute_times(start, seconds):
+    return start + np.round(np.asarray(seconds) * 1e9).astype("timedelta64[ns]")
+
+
+# Function reading the channels of an indexed recording within [start, end) seconds, each at its native rate.
+# names are the channel names from the header, and channels the numbers of the channels to read (all by default).
+# With a list of filters (see filters.parse_filters), the filtered samples are returned.
+def read_series(file_path, layout, names, channels=None, start=None, end=None, filters=None):
+    reader = MferReader(file_path, layout)
+    if len(names) != len(reader):
+        names = [f"Channel {number + 1}" for number in range(len(reader))]
+    if channels is None:
+        channels = range(len(reader))
+    series = []
+    for number in channels:
+        view = reader.channel(number)
+        if filters:
+            first, last = view.sample_range(start, end)
+            times = view.times(slice(first, last))
+            values = np.asarray(filtered_channel(file_path, view, filters)[first:last])
+        else:
+            times, values = view.window(start, end)
+        series.append(ChannelSeries(names[number], view.interval, times, values))
+    return series
+
+
+# Function returning a common time grid for the channels, from the first to the last sample of any channel.
+# interval is the time between grid points, by default the sampling interval of the fastest channel.
+def common_grid(series, interval=None):
+    series = [channel for channel in series if channel.times.size]
+    if not series:
+        return np.empty(0)
+    if interval is None:
+        interval = min(channel.interval for channel in series)
+    first = min(channel.times[0] for channel in series)
+    last = max(channel.times[-1] for channel in series)
+    return first + np.arange(int(np.floor((last - first) / interval + 1e-9)) + 1) * interval
+
+
+# Function resampling the channels onto a common time grid, returning the grid and a float32 array of shape
+# (channels, grid points). Points outside a channel, or within a gap in it, are NaN.
+def align(series, interval=None):
+    grid = common_grid(series, interval)
+    return grid, align_to(series, grid)
+
+
+# Function resampling the channels onto the given time grid, returning a float32 array of shape (channels, grid points).
+def align_to(series, grid):
+    aligned = np.full((len(series), grid.size), np.nan, dtype=np.float32)
+    for row, channel in enumerate(series):
+        times = channel.times
+        if times.size == 0:
+            continue
+        if times.size == 1:
+            aligned[row, np.abs(grid - times[0]) <= channel.interval / 2] = channel.values[0]
+            continue
+        aligned[row] = np.interp(grid, times, channel.values, left=np.nan, right=np.nan)
+        # Do not interpolate across gaps between the segments of a recording.
+        following = np.clip(np.searchsorted(times, grid), 1, times.size - 1)
+        nearest = np.minimum(np.abs(grid - times[following - 1]), np.abs(times[following] - grid))
+        aligned[row, nearest > channel.interval] = np.nan
+    return aligned
+
+
+# Function returning the first point, the interval and the number of points of the common grid of channels of an
+# indexed recording within [start, end) seconds, as common_grid would give for them, without reading the samples.
+def grid_extent(file_path, layout, channels, start=None, end=None, interval=None):
+    reader = MferReader(file_path, layout)
+    firsts, lasts, intervals = [], [], []
+    for number in channels:
+        view = reader.channel(number)
+        first, last = view.sample_range(start, end)
+        if last > first:
+            firsts.append(view.times(slice(first, first + 1))[0])
+            lasts.append(view.times(slice(last - 1, last))[0])
+            intervals.append(view.interval)
+    if not intervals:
+        return 0.0, interval or 1.0, 0
+    if interval is None:
+        interval = min(intervals)
+    first = min(firsts)
+    return first, interval, int(np.floor((max(lasts) - first) / interval + 1e-9)) + 1
+
+
+# Function reading channels of an indexed recording within [start, end) seconds and aligning them on the grid given
+# by grid_extent, SLICE_POINTS grid points at a time. Yields (grid, aligned) pairs like align. Only the samples
+# around every slice are read, so the memory used does not depend on the length of the window.
+def aligned_slices(file_path, layout, names, channels, extent, start=None, end=None, filters=None):
+    first, interval, count = extent
+    # The samples just outside a slice are read too, to interpolate up to its edges and to recognise gaps.
+    margin = 2 * max((layout["segments"][0]["channels"][number]["interval"] for number in channels), default=0)
+    for offset in range(0, count, SLICE_POINTS):
+        grid = first + np.arange(offset, min(offset + SLICE_POINTS, count)) * interval
+        window_start = grid[0] - margin if start is None else max(grid[0] - margin, start)
+        window_end = grid[-1] + margin if end is None else min(grid[-1] + margin, end)
+        series = read_series(file_path, layout, names, channels, window_start, window_end, filters)
+        yield grid, align_to(series, grid)
+
+
+# Function returning the channels aligned on a common time grid as a data frame indexed by time.
+# The index holds wall clock times if the start of the recording is given, and seconds otherwise.
+def aligned_frame(series, interval=None, start=None):
+    grid, aligned = align(series, interval)
+    index = pd.Index(absolute_times(start, grid) if start is not None else grid, name="Time")
+    return pd.DataFrame(aligned.T, index=index, columns=[channel.name for channel in series])
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Trend aggregates of the channels of a recording.
+#
+# The samples of a channel are grouped in intervals of fixed length (one minute by default), counted from
+# the start of the recording, and every interval is summarized by the mean, minimum, maximum and number of
+# its samples. The channel is read in chunks, with the aggregates of an interval that spans two chunks
+# combined, and missing samples are left out.
+
+# Number of samples read at a time.
+CHUNK_SIZE = 1 << 20
+
+
+# Function returning the aggregates of a channel, given as an array or as a ChannelView of an MFER file.
+# times is an optional function returning the times of the samples [first, last) in seconds; by default
+# sample n is at n * sampling interval. Returns a list of (start, mean, minimum, maximum, count) tuples,
+# one for every interval holding samples, where start is the start of the interval in seconds.
+def aggregate(values, sampling_interval, interval, times=None):
+    if times is None:
+        times = lambda first, last: np.arange(first, last) * sampling_interval
+    bins, sums, minimums, maximums, counts = [], [], [], [], []
+    for first in range(0, len(values), CHUNK_SIZE):
+        chunk = np.asarray(values[first : first + CHUNK_SIZE], dtype=np.float64)
+        valid = ~np.isnan(chunk)
+        if not valid.any():
+            continue
+        chunk_bins = (times(first, first + chunk.size)[valid] // interval).astype(np.int64)
+        chunk = chunk[valid]
+        # The samples are in time order, so every interval is one run of samples.
+        starts = np.flatnonzero(np.diff(chunk_bins, prepend=chunk_bins[0] - 1))
+        bins.append(chunk_bins[starts])
+        sums.append(np.add.reduceat(chunk, starts))
+        minimums.append(np.minimum.reduceat(chunk, starts))
+        maximums.append(np.maximum.reduceat(chunk, starts))
+        counts.append(np.diff(np.append(starts, chunk.size)))
+    if not bins:
+        return []
+
+    bins, sums = np.concatenate(bins), np.concatenate(sums)
+    minimums, maximums = np.concatenate(minimums), np.concatenate(maximums)
+    counts = np.concatenate(counts)
+    # Combine the parts of the intervals that span two chunks.
+    starts = np.flatnonzero(np.diff(bins, prepend=bins[0] - 1))
+    sums = np.add.reduceat(sums, starts)
+    minimums = np.minimum.reduceat(minimums, starts)
+    maximums = np.maximum.reduceat(maximums, starts)
+    counts = np.add.reduceat(counts, starts)
+    return [
+        (float(bin * interval), float(total / count), float(low), float(high), int(count))
+        for bin, total, low, high, count in zip(bins[starts], sums, minimums, maximums, counts)
+    ]
@@ -23,6 +23,7 @@ urlpatterns = [
     #path('addSubject/', views.addSubject, name = "addSubject"),
 
     path('project/<str:pk>', views.project, name="project"),
+    path('project/<int:pk>/export/', views.export_project, name="export_project"),
     path('view_projects/', views.view_projects, name = "view_projects"),
     path('add_project/', views.add_project, name = "add_project"),
     path('leave_project/<int:project_id>/', views.leave_project, name='leave_project'),
@@ -31,6 +32,18 @@ urlpatterns = [
     path('download-MFER-Header/<int:file_id>/', views.download_mfer_header, name='download_mfer_header'),
     path('download-MWF/<int:file_id>/', views.download_mwf, name='download_mwf'),
     path('plot_graph/<int:file_id>/', views.plot_graph, name='plot_graph'),
+    path('channel_data/<int:file_id>/', views.channel_data, name='channel_data'),
+    path('spectrum/<int:file_id>/', views.spectrum, name='spectrum'),
+    path('statistics/', views.channel_statistics, name='channel_statistics'),
+    path('events/', views.events, name='events'),
+    path('trends/', views.trends, name='trends'),
     path('download-CSV-Format/<int:file_id>/', views.download_format_csv, name='download_format_csv'),
+    path('export/<int:file_id>/', views.submit_export, name='submit_export'),
+    path('export_job/<int:job_id>/', views.export_job, name='export_job'),
+    path('export_job/<int:job_id>/download/', views.download_export, name='download_export'),
+
+    path('metrics', views.metrics_endpoint, name='metrics'),
+    path('profiles/', views.view_profiles, name='view_profiles'),
+    path('profiles/<str:name>', views.download_profile, name='download_profile'),
     
 ]
\ No newline at end of file
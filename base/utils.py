@@ -1,15 +1,39 @@
-import os
+import json
+import hashlib
 from datetime import datetime
+from django.conf import settings
 from django.db import IntegrityError
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, HttpResponseBadRequest
-import pandas as pd
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, HttpResponseBadRequest, HttpResponseNotModified
+from django.utils.http import parse_etags
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from monklib import get_header, convert_to_csv, Data
-from .models import Subject, File, FileImport
+from monklib import convert_to_csv
+from .models import Subject, File, FileImport, WaveformIndex
+from .admission import admission_slot, busy_response, limit_concurrency, ServerBusy
+from .artifacts import derived_path, single_flight, open_fresh
+from .storage import content_digest
+from .datapool import get_cached_header, get_data
+from . import waveform_cache
+from .mfer import build_index, MferReader, MferError
+from .loading import read_waveform_csv, fill_missing
+from .timebase import read_series, recording_start, absolute_times, grid_extent, aligned_slices
+from .filters import parse_filters, format_filters, filtered_channel, FilterError
+from .spectrum import welch, spectrogram
+from .formats import FORMATS, check_format, write_aligned
+from .compression import check_compression, download_response, CompressionError
 from django.views.decorators.http import require_GET, require_POST
+from django.contrib.auth.decorators import login_required
+from . import metrics
+
+# Version of the rendered plots, to be increased when plots are rendered differently so cached plots are not reused.
+PLOT_CACHE_VERSION = 3
+# Colors of the intervals with quality problems marked in plots, and the largest number of intervals marked in one plot.
+QUALITY_COLORS = {"flatline": "gray", "dropout": "red", "clipping": "orange", "implausible": "purple"}
+MAX_QUALITY_MARKS = 200
 
 # Function for processing and creating a subject from file upload.
 def process_and_create_subject(file, request):
@@ -17,7 +41,8 @@ def process_and_create_subject(file, request):
     if file.file.name.lower().endswith(".mwf"):
         try:
             # Use monklib's get_header function to extract header information from the file.
-            header = get_header(file.file.path)
+            # The parsed header is pooled, so the file page can show it without parsing the file again.
+            header = get_cached_header(file.file.path)
             # Extract necessary details from the header for creating a Subject.
             subject_id = getattr(header, "patientID", None)
             time_stamp = getattr(header, "measurementTimeISO", None)
@@ -63,48 +88,187 @@ def process_and_create_subject(file, request):
         )
 
 
-# Function to download a file in CSV format
+# Function for building the block index of an MWF file, which is used for reading time windows without decoding the whole file.
+def index_recording(file):
+    try:
+        layout = build_index(file.file.path)
+    except (MferError, OSError, ValueError, IndexError, OverflowError):
+        # Files that can not be indexed are still plotted and exported by decoding them with monklib.
+        layout = None
+    WaveformIndex.objects.update_or_create(file=file, defaults={"layout": layout})
+    return layout
+
+
+# Function returning the block index of a file, building it for files imported before indexing was added.
+def get_waveform_index(file):
+    try:
+        return file.waveform_index.layout
+    except WaveformIndex.DoesNotExist:
+        return index_recording(file)
+
+
+# Function returning the names of the channels of an indexed file, from the header of the file.
+def channel_names(file_path, layout):
+    header = get_cached_header(file_path)
+    names = [channel.attribute for channel in header.channels]
+    if len(names) != layout["channels"]:
+        names = [f"Channel {number + 1}" for number in range(layout["channels"])]
+    return names
+
+
+# Function reading a time window of the channels of an indexed file, each channel at its native sampling rate.
+# The channels are filtered first if a list of filters is given.
+def read_channel_series(file_path, layout, channels=None, start=None, end=None, filters=None):
+    return read_series(file_path, layout, channel_names(file_path, layout), channels, start, end, filters)
+
+
+# Function reading the selection and format of an export from the submitted form data, for download_format_csv
+# and for export jobs. Raises ValueError with a message for the user if a value is invalid.
+def parse_export_parameters(data):
+    try:
+        # Retrieve start and end times from the form, converting them to float, None meaning the start or end of the recording
+        start_time = float(data["start_time"]) if data.get("start_time") else None
+        end_time = float(data["end_time"]) if data.get("end_time") else None
+        # Optionally export a time column, with all channels resampled on one time grid
+        sampling_rate = float(data["sampling_rate"]) if data.get("sampling_rate") else None
+    except ValueError:
+        raise ValueError("The times and the sampling rate must be numbers.")
+    if sampling_rate is not None and sampling_rate <= 0:
+        raise ValueError("The sampling rate must be positive.")
+    # Optional filters, such as "highpass:0.5,notch:50", and the format of the export (CSV by default).
+    # Filtered exports and exports in binary formats are written with timestamps.
+    filters = parse_filters(data.get("filters"))
+    export_format = check_format(data.get("format"))
+    return {
+        # The list of channels selected by the user in the form
+        "channels": data.getlist("channels"),
+        "start_time": start_time,
+        "end_time": end_time,
+        "timestamps": data.get("timestamps") == "true" or bool(filters) or export_format != "csv",
+        "sampling_rate": sampling_rate,
+        "filters": format_filters(filters),
+        "format": export_format,
+    }
+
+
+# Function to download a file in CSV format, or in another format given by the "format" field
 @require_POST
+@limit_concurrency("download_format_csv")
 def download_format_csv(request, file_id):
     # Check for POST request to ensure that the request is a result of form submission
     if request.method == "POST":
-        # Retrieve the list of channels selected by the user from the form
-        selected_channels = request.POST.getlist("channels")
-        # Retrieve start and end times from the form, converting to float or defaulting to 0
-        start_time_str = request.POST.get("start_time")
-        end_time_str = request.POST.get("end_time")
-        start_seconds = float(start_time_str) if start_time_str else 0.0
-        end_seconds = float(end_time_str) if end_time_str else 0.0
+        try:
+            parameters = parse_export_parameters(request.POST)
+            # Optionally download the export as a compressed file, such as "export.csv.zst"
+            compress = check_compression(request.POST.get("compress") or request.GET.get("compress"))
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
 
         # Get the file object, ensuring it exists or return a 404 error
         file = get_object_or_404(File, id=file_id)
+        file_path = file.file.path
+        layout = get_waveform_index(file) if parameters["timestamps"] else None
+        if parameters["timestamps"] and layout is None:
+            return HttpResponseBadRequest("Timestamps, filters and binary formats are not supported for this file.")
+
+        output_path = export_waveforms(
+            file_path,
+            layout,
+            parameters["channels"],
+            parameters["start_time"],
+            parameters["end_time"],
+            parameters["timestamps"],
+            parameters["sampling_rate"],
+            parse_filters(parameters["filters"]),
+            parameters["format"],
+        )
+
+        # Stream the export to the user from disk, compressing CSVs on the fly if the client accepts it
+        return download_response(
+            request,
+            output_path,
+            export_filename(file, parameters["format"]),
+            FORMATS[parameters["format"]][1],
+            compress,
+            text=parameters["format"] == "csv",
+        )
+    # If the request is not POST, return a forbidden error response
+    else:
+        return HttpResponseForbidden("Invalid request")
+
+
+# Function returning the name of the download of an export of a file in the given format.
+def export_filename(file, export_format):
+    return f"{file.title}{FORMATS[export_format][0]}"
+
+
+# Function writing the export of a selection of the channels of a file, and returning its path.
+# start_time and end_time are in seconds, or None for the start and end of the recording. With timestamps,
+# the export is written from the block index (layout) with a time column, the channels filtered and resampled
+# on one grid of sampling_rate Hz (the fastest channel by default), in export_format (see formats.FORMATS).
+# Otherwise a CSV is written by monklib. progress is an optional function called with the fraction that is
+# done after every channel that is read.
+def export_waveforms(file_path, layout, selected_channels, start_time=None, end_time=None, timestamps=False, sampling_rate=None, filters=(), export_format="csv", progress=None):
+    # Write the CSV using monklib, with the data filtered on the selected channels and time interval
+    def write_csv(output_path):
         # Use monklib to retrieve the header of the file for channel information
-        header = get_header(file.file.path)
-        # Create a Data object using the monklib for further processing
-        data = Data(file.file.path)
+        header = get_cached_header(file_path)
+        # Get a Data object of the file from the pool of parsed recordings for further processing
+        data = get_data(file_path)
 
         # Filter the data based on the channels selected by the user
         for index, channel in enumerate(header.channels):
             data.setChannelSelection(index, channel.attribute in selected_channels)
 
         # If times were provided, set the data to only include the specified interval
-        if start_time_str or end_time_str:
-            data.setIntervalSelection(start_seconds, end_seconds)
+        if start_time is not None or end_time is not None:
+            data.setIntervalSelection(start_time or 0.0, end_time or 0.0)
 
-        # Define the output path for the CSV and use monklib to write the data to CSV
-        output_path = file.file.path.rsplit(".", 1)[0] + ".csv"
         data.writeToCsv(output_path)
 
-        # Open the CSV file, read its content and prepare a HTTP response to send the file to the user
-        with open(output_path, "rb") as f:
-            response = HttpResponse(f.read(), content_type="text/csv")
-            response["Content-Disposition"] = (
-                f'attachment; filename="{os.path.basename(output_path)}"'
-            )
-            return response
-    # If the request is not POST, return a forbidden error response
-    else:
-        return HttpResponseForbidden("Invalid request")
+    # Write the export from the block index, aligning the channels only on the grid of the export, and a slice
+    # of the grid at a time so the memory used does not grow with the length of the export
+    def write_timestamped(output_path):
+        header = get_cached_header(file_path)
+        channels = [
+            index
+            for index, channel in enumerate(header.channels)
+            if channel.attribute in selected_channels
+        ]
+        names = channel_names(file_path, layout)
+        interval = 1 / sampling_rate if sampling_rate else None
+        extent = grid_extent(file_path, layout, channels, start_time, end_time, interval)
+
+        def slices(rows):
+            selection = [channels[row] for row in rows]
+            return aligned_slices(file_path, layout, names, selection, extent, start_time, end_time, filters)
+
+        write_aligned(
+            output_path,
+            export_format,
+            [names[number] for number in channels],
+            extent[2],
+            slices,
+            recording_start(layout, header),
+            progress,
+        )
+
+    # Each selection gets its own export, and concurrent requests for the same selection share one conversion
+    selection = {
+        "channels": sorted(selected_channels),
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+    if timestamps:
+        selection.update(timestamps=True, sampling_rate=sampling_rate, filters=format_filters(filters))
+    if export_format != "csv":
+        selection["format"] = export_format
+    return single_flight(
+        derived_path(file_path, FORMATS[export_format][0], selection),
+        file_path,
+        write_timestamped if timestamps else write_csv,
+        "csv_exports",
+    )
 
 
 # Function to download the header information of an MFER file
@@ -114,24 +278,33 @@ def download_mfer_header(request, file_id):
     # Get the path of the file on the server
     file_path = file_instance.file.path
 
+    try:
+        compress = check_compression(request.POST.get("compress") or request.GET.get("compress"))
+    except CompressionError as e:
+        return HttpResponseBadRequest(str(e))
+
     try:
         # Check if anonymization is requested via POST parameters
         if "anonymize" in request.POST and request.POST["anonymize"] == "true":
-            # Anonymize the data if requested
-            anonymized_file_path = anonymize_data(file_path)
-            # Get the header information from the anonymized file using function from monklib
-            header_info = get_header(anonymized_file_path)
+            # Anonymize the data if requested, waiting for a free slot as anonymization decodes the whole recording
+            with admission_slot("anonymize_data", request.user.id):
+                anonymized_file = open_anonymized(file_path)
+            # Get the header information from the anonymized file using function from monklib,
+            # keeping the garbage collector from removing the file while it is read
+            with anonymized_file:
+                header_info = get_cached_header(anonymized_file.name)
         else:
             # Get the header information from the original file using function from monklib
-            header_info = get_header(file_path)
+            header_info = get_cached_header(file_path)
 
-        # Prepare a response with the header information as plain text
-        response = HttpResponse(header_info, content_type="text/plain")
-        # Suggest a filename for the header info when downloaded
-        response["Content-Disposition"] = (
-            f'attachment; filename="{file_instance.title}_header.txt"'
+        # Prepare a response with the header information as plain text, compressed if requested or accepted,
+        # and suggest a filename for the header info when downloaded
+        return download_response(
+            request, str(header_info).encode(), f"{file_instance.title}_header.txt", "text/plain", compress
         )
-        return response
+    # Ask the client to retry later if too many anonymizations are running
+    except ServerBusy as busy:
+        return busy_response(busy)
     # Return an error message if something goes wrong
     except Exception as e:
         return HttpResponse(
@@ -153,11 +326,14 @@ def download_mwf(request, file_id):
         file_path = file_instance.file.path
         # Check if anonymization is requested via GET parameters
         if request.GET.get("anonymize") == "true":
-            # Anonymize the data if requested
-            file_path = anonymize_data(file_path)
+            # Anonymize the data if requested, waiting for a free slot as anonymization decodes the whole recording
+            with admission_slot("anonymize_data", request.user.id):
+                file = open_anonymized(file_path)
+        else:
+            file = open(file_path, "rb")
 
-        # Open and read the content of the file
-        with open(file_path, "rb") as file:
+        # Read the content of the file
+        with file:
             content = file.read()
             # Prepare a response with the file content as plain text
             response = HttpResponse(content, content_type="application/octet-stream")
@@ -166,6 +342,9 @@ def download_mwf(request, file_id):
                 f'attachment; filename="{file_instance.title}.mwf"'
             )
             return response
+    # Ask the client to retry later if too many anonymizations are running
+    except ServerBusy as busy:
+        return busy_response(busy)
     # Return an error message if something goes wrong
     except Exception as e:
         return HttpResponse(
@@ -173,65 +352,409 @@ def download_mwf(request, file_id):
         )
 
 
-# Function to anonymize data within an MFER file
+# Function to anonymize data within an MFER file, returning the path of the anonymized file
 def anonymize_data(file_path):
     try:
-        # Load the data using monklib's Data class
-        data = Data(file_path)
-        # Anonymize the data using the provided method from monklib's anonymization script
-        data.anonymize()
-        # Define the path for the anonymized data
-        anonymized_path = file_path.rsplit(".", 1)[0] + "_anonymized.mwf"
-        # Write the anonymized data to binary in a new file, using monklibs functionality
-        data.writeToBinary(anonymized_path)
-        # Return the path to the anonymized file
-        return anonymized_path
+        # Concurrent requests to anonymize the same file share one anonymization
+        return single_flight(*_anonymization(file_path))
     # Raise an exception if anonymization fails
     except Exception as e:
         raise Exception(f"Failed to anonymize and save the file: {str(e)}")
 
 
-# Function to plot graphs based on CSV data
+# Function to anonymize data within an MFER file, returning the anonymized file opened for reading
+def open_anonymized(file_path):
+    try:
+        return open_fresh(*_anonymization(file_path))
+    except Exception as e:
+        raise Exception(f"Failed to anonymize and save the file: {str(e)}")
+
+
+# Function returning the path, source, computation and cache name of the anonymization of an MFER file
+def _anonymization(file_path):
+    # Anonymize the data using monklib and write it to binary in a new file
+    def write_anonymized(output_path):
+        # Load the data using monklib's Data class, from the pool of parsed recordings
+        data = get_data(file_path)
+        # Anonymize the data using the provided method from monklib's anonymization script
+        data.anonymize()
+        data.writeToBinary(output_path)
+
+    return derived_path(file_path, "_anonymized.mwf"), file_path, write_anonymized, "anonymizations"
+
+
+# Function to decode all channels of an MFER file, returning the column names and an array of shape (channels, samples)
+def decode_waveforms(file_path):
+    # Convert the data file to CSV format using monklib's functionality,
+    # reusing the conversion of an earlier or concurrent request for the same file
+    csv_path = derived_path(file_path, ".csv")
+    header = get_cached_header(file_path)
+    with open_fresh(csv_path, file_path, lambda output_path: convert_to_csv(file_path, output_path), "csv_conversions"):
+        # Load the channel columns from the CSV as float32, with missing samples as NaN
+        return read_waveform_csv(csv_path, channels=[channel.attribute for channel in header.channels])
+
+
+# Function returning the SHA-256 checksum of a file, computing and storing it the first time it is needed.
+# Files in the content addressed storage are named after their checksum, so it is not computed again.
+def file_checksum(file):
+    if not file.checksum:
+        file.checksum = content_digest(file.file.name)
+        if file.checksum is None:
+            digest = hashlib.sha256()
+            with open(file.file.path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            file.checksum = digest.hexdigest()
+        File.objects.filter(id=file.id).update(checksum=file.checksum)
+    return file.checksum
+
+
+# Function returning the key of a rendered plot, identifying the file content and all parameters of the plot.
+def plot_cache_key(file, **parameters):
+    key = json.dumps(
+        [PLOT_CACHE_VERSION, file.id, file_checksum(file), parameters], sort_keys=True
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+# Function to render the plot of the waveforms of a file as HTML.
+def render_plot(file_instance, combined, rows, start, end, mode="svg", filters=None):
+    file_path = file_instance.file.path
+    layout = get_waveform_index(file_instance)
+    if layout is not None:
+        # Without a time window, plot as long as the requested number of rows of the fastest channel
+        if start is None and end is None:
+            end = rows * min(
+                channel["interval"] for channel in layout["segments"][0]["channels"]
+            )
+        # Read only the data blocks within the time window from the memory mapped file. Every channel is
+        # plotted at its own sampling rate, against wall clock time when the start of the recording is known.
+        series = read_channel_series(file_path, layout, start=start, end=end, filters=filters)
+        started = recording_start(layout, get_cached_header(file_path))
+        traces = [
+            (
+                channel.name,
+                absolute_times(started, channel.times) if started is not None else channel.times,
+                channel.values,
+            )
+            for channel in series
+        ]
+        x_title = "Time" if started is not None else "Time (s)"
+        window = (start or 0, end)
+    else:
+        # Get the decoded waveforms from the cache shared by the worker processes, decoding the file if needed
+        columns, waveforms = waveform_cache.load(
+            file_instance.id, file_path, lambda: decode_waveforms(file_path)
+        )
+        # Prepare the requested number of rows for plotting, filling in missing samples
+        values, complete = fill_missing(waveforms[:, :rows])
+        index = np.flatnonzero(complete)
+        traces = [(column, index, row[complete]) for column, row in zip(columns, values)]
+        x_title = "Index"
+        window = None
+    # WebGL traces are drawn by the graphics card, which keeps many or long channels responsive
+    scatter = go.Scattergl if mode == "webgl" else go.Scatter
+    # Generate the plot
+    if combined:
+        # Initialize a figure for plotting
+        fig = go.Figure()
+        for name, x, y in traces:
+            fig.add_trace(
+                scatter(x=x, y=y, mode="lines", name=name)
+            )
+        fig.update_layout(
+            title="Combined Graph", xaxis_title=x_title, yaxis_title="Values"
+        )
+    else:
+        fig = make_subplots(rows=len(traces), cols=1, shared_xaxes=True)
+        # Add one subplot per channel
+        for i, (name, x, y) in enumerate(traces):
+            fig.add_trace(
+                scatter(x=x, y=y, mode="lines", name=name),
+                row=i + 1,
+                col=1,
+            )
+        fig.update_layout(title="Multiple Subplots Graph")
+
+    # Mark the intervals with quality problems found when the file was analysed
+    if window is not None and file_instance.quality:
+        add_quality_marks(
+            fig, file_instance.quality, [name for name, _, _ in traces], window, started, combined
+        )
+
+    # Convert the plot to HTML. plotly.js is loaded from its CDN instead of embedded, so cached plots only hold
+    # the data of the plot, and the browser downloads the library once.
+    return fig.to_html(full_html=False, include_plotlyjs="cdn")
+
+
+# Function marking the intervals with quality problems of the plotted channels within the time window.
+def add_quality_marks(fig, quality, names, window, started, combined):
+    marks = 0
+    for row, name in enumerate(names):
+        for kind, intervals in quality["channels"].get(name, {}).items():
+            for low, high in intervals:
+                if high <= window[0] or (window[1] is not None and low >= window[1]):
+                    continue
+                if marks >= MAX_QUALITY_MARKS:
+                    return
+                if started is not None:
+                    low, high = (str(time) for time in absolute_times(started, [low, high]))
+                fig.add_vrect(
+                    x0=low,
+                    x1=high,
+                    fillcolor=QUALITY_COLORS[kind],
+                    opacity=0.2,
+                    line_width=0,
+                    **({} if combined else {"row": row + 1, "col": 1}),
+                )
+                marks += 1
+
+
+# Function to plot graphs of the waveforms of a file.
+# Rendered plots are cached, and every plot has an ETag so the browser can reuse its copy with a conditional request.
 def plot_graph(request, file_id):
     try:
         # Retrieve parameters from the GET request
         # Determine if a combined graph is requested
         combined = request.GET.get("combined", "false").lower() == "true"
-        # Set the maximum number of rows to read from the CSV
+        # Set the maximum number of rows to plot
         rows = int(request.GET.get("rows", 10000))
+        # Retrieve the optional time window to plot, in seconds from the start of the recording
+        start = float(request.GET["start"]) if request.GET.get("start") else None
+        end = float(request.GET["end"]) if request.GET.get("end") else None
+        # Draw the traces with WebGL instead of SVG when "mode=webgl" is requested
+        mode = "webgl" if request.GET.get("mode") == "webgl" else "svg"
+        # Retrieve the optional filters, such as "highpass:0.5,notch:50"
+        filters = parse_filters(request.GET.get("filters"))
         # Retrieve and handle the file object
         file_instance = get_object_or_404(File, id=file_id)
-        # Define the CSV path for the data file
-        csv_path = file_instance.file.path.rsplit(".", 1)[0] + ".csv"
-        # Convert the data file to CSV format using monklib's functionality
-        convert_to_csv(file_instance.file.path, csv_path)
-        # Load and prepare the data from the CSV
-        df = pd.read_csv(csv_path, nrows=rows)
-        df = df.apply(pd.to_numeric, errors="coerce").interpolate().dropna()
-        # Generate the plot
-        if combined:
-            # Initialize a figure for plotting
-            fig = go.Figure()
-            for column in df.columns:
-                fig.add_trace(
-                    go.Scatter(x=df.index, y=df[column], mode="lines", name=column)
+
+        key = plot_cache_key(
+            file_instance,
+            combined=combined,
+            rows=rows,
+            start=start,
+            end=end,
+            mode=mode,
+            filters=format_filters(filters),
+            # Plots rendered before the quality scan finished do not have its marks
+            quality=file_instance.quality is not None,
+        )
+        etag = f'"{key}"'
+        # Answer with "304 Not Modified" if the browser already has this plot
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            metrics.record_cache("plots", True)
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        content = caches["plots"].get(key)
+        metrics.record_cache("plots", content is not None)
+        if content is None:
+            if (start is not None or end is not None or filters) and get_waveform_index(file_instance) is None:
+                return JsonResponse(
+                    {"error": "Time windows and filters are not supported for this file."}, status=400
                 )
-            fig.update_layout(
-                title="Combined Graph", xaxis_title="Index", yaxis_title="Values"
+            # Only rendering is limited, so cached plots are served even when the server is busy
+            with admission_slot("plot_graph", request.user.id):
+                graph_html = render_plot(file_instance, combined, rows, start, end, mode, filters)
+            content = json.dumps({"graph_html": graph_html})
+            # Large plots are not kept, so the cache holds at most MAX_ENTRIES plots of a bounded size
+            if len(content) <= getattr(settings, "MONK_PLOT_CACHE_MAX_ITEM_BYTES", 4 * 1024 * 1024):
+                caches["plots"].set(key, content)
+
+        # Send the plot back, asking the browser to check with the ETag before reusing it
+        response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    except FilterError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ServerBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# Function reducing a channel to about max_points samples for display.
+# The samples are split into buckets, and the minimum and maximum of every bucket are kept so peaks stay visible.
+def decimate_min_max(times, values, max_points):
+    if values.size <= max_points:
+        return times, values
+    buckets = max(max_points // 2, 1)
+    size = values.size // buckets
+    shaped = values[: buckets * size].reshape(buckets, size)
+    missing = np.isnan(shaped)
+    low = np.where(missing, np.inf, shaped).argmin(axis=1)
+    high = np.where(missing, -np.inf, shaped).argmax(axis=1)
+    picks = (np.arange(buckets) * size)[:, None] + np.column_stack([low, high])
+    # Keep the samples in time order, and the last sample so the channel ends where it did
+    picks = np.unique(np.append(picks, values.size - 1))
+    return times[picks], values[picks]
+
+
+# Function returning the samples of one channel as JSON, used by the channel view of the file page to load
+# only the channels that are visible. Long channels are reduced to at most "max_points" samples.
+@login_required
+@require_GET
+def channel_data(request, file_id):
+    try:
+        channel = int(request.GET.get("channel", 0))
+        # Negative indexes would count channels from the end
+        if channel < 0:
+            return JsonResponse({"error": "No such channel."}, status=404)
+        start = float(request.GET["start"]) if request.GET.get("start") else None
+        end = float(request.GET["end"]) if request.GET.get("end") else None
+        max_points = int(request.GET.get("max_points", 4000))
+        filters = parse_filters(request.GET.get("filters"))
+        file_instance = get_object_or_404(File, id=file_id)
+        file_path = file_instance.file.path
+
+        key = plot_cache_key(
+            file_instance,
+            kind="channel_data",
+            channel=channel,
+            start=start,
+            end=end,
+            max_points=max_points,
+            filters=format_filters(filters),
+        )
+        etag = f'"{key}"'
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        layout = get_waveform_index(file_instance)
+        if layout is not None:
+            # Read the time window of the channel from the memory mapped file
+            [(name, _, times, values)] = read_channel_series(
+                file_path, layout, [channel], start, end, filters
+            )
+        elif start is not None or end is not None or filters:
+            return JsonResponse(
+                {"error": "Time windows and filters are not supported for this file."}, status=400
             )
         else:
-            fig = make_subplots(rows=len(df.columns), cols=1, shared_xaxes=True)
-            # Add traces to the figure based on the CSV columns
-            for i, column in enumerate(df.columns):
-                fig.add_trace(
-                    go.Scatter(x=df.index, y=df[column], mode="lines", name=column),
-                    row=i + 1,
-                    col=1,
+            # Decoding a file that is not cached yet is as expensive as plotting it
+            with admission_slot("plot_graph", request.user.id):
+                columns, waveforms = waveform_cache.load(
+                    file_instance.id, file_path, lambda: decode_waveforms(file_path)
+                )
+            name = columns[channel]
+            values = waveforms[channel]
+            times = np.arange(values.size)
+
+        times, values = decimate_min_max(times, values, max_points)
+        # Missing samples are sent as null, which plotly draws as gaps
+        response = JsonResponse(
+            {
+                "name": name,
+                "x": times.tolist(),
+                "y": np.where(np.isnan(values), None, values.astype(object)).tolist(),
+            }
+        )
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    except IndexError:
+        return JsonResponse({"error": "No such channel."}, status=404)
+    except FilterError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except ServerBusy as busy:
+        return busy_response(busy)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# Function computing the power spectral density or the spectrogram of one channel of an indexed file.
+def compute_spectrum(file_path, layout, channel, kind, start, end, segment, overlap, filters):
+    if channel < 0:
+        raise IndexError("No such channel.")
+    view = MferReader(file_path, layout).channel(channel)
+    name = channel_names(file_path, layout)[channel]
+    values = filtered_channel(file_path, view, filters) if filters else view
+    first, last = view.sample_range(start, end)
+    sampling_rate = 1 / view.interval
+    if kind == "psd":
+        frequencies, density = welch(values, sampling_rate, first, last, segment, overlap)
+        return {
+            "name": name,
+            "frequencies": frequencies.tolist(),
+            "power": density.tolist() if density is not None else None,
+        }
+    frequencies, times, power = spectrogram(values, sampling_rate, first, last, segment, overlap)
+    offset = view.times(slice(first, first + 1))
+    return {
+        "name": name,
+        "frequencies": frequencies.tolist(),
+        "times": (times + (offset[0] if offset.size else 0)).tolist(),
+        # Columns without any complete segment are sent as null
+        "power": np.where(np.isnan(power), None, power.astype(object)).tolist(),
+    }
+
+
+# Function returning the power spectral density ("kind=psd", the default) or the spectrogram
+# ("kind=spectrogram") of one channel within an optional time window as JSON.
+# The segment length in seconds, their overlap and filters can be given; results are cached like plots.
+@login_required
+@require_GET
+def spectrum(request, file_id):
+    try:
+        channel = int(request.GET.get("channel", 0))
+        # Negative indexes would count channels from the end
+        if channel < 0:
+            return JsonResponse({"error": "No such channel."}, status=404)
+        start = float(request.GET["start"]) if request.GET.get("start") else None
+        end = float(request.GET["end"]) if request.GET.get("end") else None
+        kind = request.GET.get("kind", "psd")
+        segment = float(request.GET.get("segment", 2.0))
+        overlap = float(request.GET.get("overlap", 0.5))
+        if kind not in ("psd", "spectrogram") or not segment > 0 or not 0 <= overlap < 1:
+            return JsonResponse({"error": "Invalid spectrum parameters."}, status=400)
+        filters = parse_filters(request.GET.get("filters"))
+        file_instance = get_object_or_404(File, id=file_id)
+
+        key = plot_cache_key(
+            file_instance,
+            kind=kind,
+            channel=channel,
+            start=start,
+            end=end,
+            segment=segment,
+            overlap=overlap,
+            filters=format_filters(filters),
+        )
+        etag = f'"{key}"'
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        content = caches["spectra"].get(key)
+        metrics.record_cache("spectra", content is not None)
+        if content is None:
+            layout = get_waveform_index(file_instance)
+            if layout is None:
+                return JsonResponse(
+                    {"error": "Spectra are not supported for this file."}, status=400
+                )
+            with admission_slot("plot_graph", request.user.id):
+                result = compute_spectrum(
+                    file_instance.file.path, layout, channel, kind, start, end, segment, overlap, filters
                 )
-            fig.update_layout(title="Multiple Subplots Graph")
+            content = json.dumps(result)
+            caches["spectra"].set(key, content)
 
-        # Convert the plot to HTML and send it back
-        graph_html = fig.to_html(full_html=False, include_plotlyjs=True)
-        return JsonResponse({"graph_html": graph_html})
+        response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    except FilterError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except (IndexError, ValueError):
+        return JsonResponse({"error": "Invalid channel or parameters."}, status=400)
+    except ServerBusy as busy:
+        return busy_response(busy)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -1,35 +1,59 @@
 # Standard library imports for various functionalities
 import os
+from itertools import chain
+from contextlib import ExitStack
 import pandas as pd
 from datetime import datetime
 import plotly.graph_objects as go
 
 # Django-specific imports for handling web requests and database operations
+from django.conf import settings
 from django.db import IntegrityError
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden
+from django.urls import reverse
+from django.http import HttpResponseForbidden, HttpResponse, Http404, FileResponse, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.db.models import Q, F, Sum, Min, Max, FloatField
+from django.db.models.functions import Floor
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_GET
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth import authenticate, login, logout
 
 # Importing functionalities from monklib for handling medical data
 from monklib import get_header, convert_to_csv, Data
 
 # Importing models for the database schema related to the application
-from .models import Subject, UserProfile, Project, File, FileImport
+from .models import Subject, UserProfile, Project, File, FileImport, ChannelStatistics, Event, TrendAggregate, ExportJob
 
 # Forms for handling file import and user registration
 from .forms import FileForm, UserRegistrationForm, FileFieldForm
 
+# Request metrics shared between the worker processes, and profiles of slow requests
+from . import metrics, profiling, analysis, jobs
+from .admission import admission_slot, busy_response, ServerBusy
+from .export import stream_zip, convert_ahead
+from .filters import parse_filters, FilterError
+from .formats import FORMATS, check_format, FormatError
+
+from .datapool import get_cached_header
+from .quality import summarize as summarize_quality, KINDS as QUALITY_KINDS
+
 from .utils import (
     process_and_create_subject,
+    index_recording,
     anonymize_data,
     download_format_csv,
+    export_waveforms,
+    export_filename,
+    parse_export_parameters,
+    get_waveform_index,
     download_mfer_header,
     download_mwf,
     plot_graph,
+    channel_data,
+    spectrum,
 )
 
 # Function for rendering the home.html template, which displays the home screen of the website.
@@ -66,6 +90,80 @@ def project(request, pk):
     return render(request, "base/project.html", context)
 
 
+# Function exporting the recordings of all subjects of a project as one ZIP archive, streamed to the client.
+# The GET parameter "include" lists what is exported of every recording: "csv" (the default), the waveforms,
+# and/or "mwf", an anonymized copy of the recording. The waveforms are written in "format" (CSV by default, see
+# formats.FORMATS), limited to the channels in "channels" (all channels by default) and to the interval from
+# "start" to "end" in seconds, and with a time column when "timestamps" is "true", resampled to
+# "sampling_rate" Hz and filtered with "filters" as for single files.
+# The members are named after the anonymous identifier of the subject and the id of the file.
+@login_required
+@require_GET
+def export_project(request, pk):
+    try:
+        user_profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        raise Http404
+    project = get_object_or_404(Project, id=pk, users=user_profile)
+
+    include = {item.strip() for item in request.GET.get("include", "csv").split(",") if item.strip()}
+    if not include or not include <= {"csv", "mwf"}:
+        return HttpResponseBadRequest("Include csv and/or mwf.")
+    channels = [name.strip() for name in request.GET.get("channels", "").split(",") if name.strip()]
+    try:
+        start = float(request.GET["start"]) if request.GET.get("start") else None
+        end = float(request.GET["end"]) if request.GET.get("end") else None
+        sampling_rate = float(request.GET["sampling_rate"]) if request.GET.get("sampling_rate") else None
+        if sampling_rate is not None and sampling_rate <= 0:
+            raise ValueError("The sampling rate must be positive.")
+        filters = parse_filters(request.GET.get("filters"))
+        export_format = check_format(request.GET.get("format"))
+    except (FilterError, FormatError) as e:
+        return HttpResponseBadRequest(str(e))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid export parameters.")
+    timestamps = request.GET.get("timestamps") == "true" or bool(filters) or export_format != "csv"
+    suffix = FORMATS[export_format][0]
+
+    # The tasks are listed up front, so no database queries are made while the archive is streamed.
+    tasks = []
+    errors = []
+    for subject in project.subjects.select_related("file", "file__waveform_index").order_by("id"):
+        file = subject.file
+        if file is None:
+            continue
+        name = f"{subject.unique_identifier}/{file.id}"
+        if "csv" in include:
+            try:
+                layout = get_waveform_index(file) if timestamps else None
+                if timestamps and layout is None:
+                    raise ValueError("Timestamps, filters and binary formats are not supported for this file.")
+                selected = channels or [channel.attribute for channel in get_cached_header(file.file.path).channels]
+            except Exception as e:
+                # A file that can not be read is reported in the archive, like a failed conversion.
+                errors.append((f"{name}{suffix}", None, str(e)))
+            else:
+                arguments = (file.file.path, layout, selected, start, end, timestamps, sampling_rate, filters, export_format)
+                tasks.append((f"{name}{suffix}", export_waveforms, arguments))
+        if "mwf" in include and file.file.name.lower().endswith(".mwf"):
+            tasks.append((f"{name}.mwf", anonymize_data, (file.file.path,)))
+
+    # The admission slot is held until the archive has been sent, or the client went away.
+    slot = ExitStack()
+    try:
+        slot.enter_context(admission_slot("export_project", request.user.id))
+    except ServerBusy as busy:
+        return busy_response(busy)
+
+    def content():
+        with slot:
+            yield from stream_zip(chain(errors, convert_ahead(tasks)))
+
+    response = StreamingHttpResponse(content(), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="project_{project.id}.zip"'
+    return response
+
+
 # Function for handling the rendering of the file.html template, which displays all the details about a file.
 @login_required
 def file(request, file_id):
@@ -93,7 +191,7 @@ def file(request, file_id):
     # Process file content if it is a medical waveform (MFER) file.
     if is_MFER_file:
         try:
-            content = get_header(file.file.path)
+            content = get_cached_header(file.file.path)
         except Exception as e:
             content = f"Error reading file: {e}"
     # Read the content directly if it's a text file.
@@ -110,6 +208,21 @@ def file(request, file_id):
         "content": content,
         "is_text_file": is_text_file,
         "is_MFER_file": is_MFER_file,
+        # Heart rate trends derived in the background from the ECG channels, empty until the analysis is done.
+        "heart_rates": [
+            {
+                "channel": series.channel,
+                "interval": series.trend_interval,
+                "trend": series.trend,
+                "mean_rate": series.mean_rate,
+            }
+            for series in file.heart_rates.all()
+        ],
+        # Summary statistics of every channel, empty until the analysis is done.
+        "channel_statistics": file.channel_statistics.all(),
+        # Intervals with signal quality problems, summarized per channel, empty until the analysis is done.
+        "quality": summarize_quality(file.quality),
+        "quality_kinds": QUALITY_KINDS,
     }
 
     # Render the file view template with the context.
@@ -388,6 +501,10 @@ def import_file(request):
             FileImport.objects.create(user=user_profile, file=new_file)
             # Process the file to possibly create additional related records.
             process_and_create_subject(new_file, request)
+            # Index the waveform data blocks, so time windows can be read without decoding the whole file.
+            index_recording(new_file)
+            # Analyse the recording in the background, once the import is saved.
+            analysis.schedule(new_file)
 
             messages.success(request, "File imported and processed successfully.")
             return redirect("view_files")
@@ -436,6 +553,8 @@ def import_multiple_files(request):
                     new_file = File.objects.create(file=f, title=base_title)
                     FileImport.objects.create(user=user_profile, file=new_file)
                     process_and_create_subject(new_file, request)
+                    index_recording(new_file)
+                    analysis.schedule(new_file)
 
                 messages.success(
                     request, "All valid .MWF files imported and processed successfully."
@@ -447,3 +566,242 @@ def import_multiple_files(request):
             messages.error(request, "Only .MWF files allowed.")
     # Render the import multiple files page with the form.
     return render(request, "base/import_file.html", {"form": form})
+
+
+
+# Function for exposing the request metrics in the Prometheus text format.
+# The endpoint only exists when MONK_METRICS_ENABLED is set, and only answers the addresses in MONK_METRICS_ALLOWED_IPS.
+@require_GET
+def metrics_endpoint(request):
+    if not metrics.enabled():
+        raise Http404()
+    if request.META.get("REMOTE_ADDR") not in settings.MONK_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden("Metrics are only available locally.")
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# Function for rendering the profiles.html template, which lists the saved request profiles for staff users.
+@staff_member_required
+@require_GET
+def view_profiles(request):
+    context = {"profiles": profiling.list_profiles(), "enabled": profiling.enabled()}
+    return render(request, "base/profiles.html", context)
+
+
+# Function for downloading a saved request profile, or showing a text summary of it with ?summary=true.
+@staff_member_required
+@require_GET
+def download_profile(request, name):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise Http404("Profile not found.")
+    if request.GET.get("summary") == "true":
+        return HttpResponse(profiling.profile_summary(path), content_type="text/plain")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
+
+
+# Function returning the files a user has imported, or that belong to subjects of the user's projects.
+def accessible_files(user_profile):
+    return File.objects.filter(
+        Q(fileimport__user=user_profile) | Q(subjects__projects__users=user_profile)
+    )
+
+
+# Function returning the channel statistics of all files the user has access to as JSON.
+# The results can be narrowed down with the GET parameters "channel" (part of the channel name),
+# "min_std" (smallest standard deviation) and "max_missing" (largest fraction of missing samples),
+# for example to find the recordings in which a channel holds any signal.
+@login_required
+@require_GET
+def channel_statistics(request):
+    try:
+        user_profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"statistics": []})
+    statistics = ChannelStatistics.objects.filter(
+        file__in=accessible_files(user_profile)
+    ).select_related("file")
+    try:
+        if request.GET.get("channel"):
+            statistics = statistics.filter(channel__icontains=request.GET["channel"])
+        if request.GET.get("min_std"):
+            statistics = statistics.filter(std__gte=float(request.GET["min_std"]))
+        if request.GET.get("max_missing"):
+            statistics = statistics.filter(missing_fraction__lte=float(request.GET["max_missing"]))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid filter value.")
+    fields = [
+        "channel", "samples", "duration", "missing_fraction", "minimum", "maximum",
+        "mean", "std", "p5", "p25", "median", "p75", "p95",
+    ]
+    return JsonResponse(
+        {
+            "statistics": [
+                {
+                    "file_id": item.file_id,
+                    "file": item.file.title,
+                    **{field: getattr(item, field) for field in fields},
+                }
+                for item in statistics
+            ]
+        }
+    )
+
+
+# Function returning the events found in the files the user has access to as JSON, ordered by file and time.
+# The events can be narrowed down with the GET parameters "project" (only the subjects of one project),
+# "kind", "channel" (part of the channel name) and "limit". Every event has links to the file page and to
+# the plot of the event, with MONK_EVENT_PADDING seconds before and after it.
+@login_required
+@require_GET
+def events(request):
+    try:
+        user_profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"events": []})
+    found = Event.objects.filter(file__in=accessible_files(user_profile))
+    try:
+        if request.GET.get("project"):
+            project = get_object_or_404(Project, id=int(request.GET["project"]), users=user_profile)
+            found = found.filter(file__subjects__projects=project)
+        limit = int(request.GET.get("limit", 1000))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid filter value.")
+    if request.GET.get("kind"):
+        found = found.filter(kind=request.GET["kind"])
+    if request.GET.get("channel"):
+        found = found.filter(channel__icontains=request.GET["channel"])
+
+    padding = getattr(settings, "MONK_EVENT_PADDING", 30)
+    results = []
+    for event in found.distinct().select_related("file")[:limit]:
+        window = f"start={max(event.start - padding, 0):g}&end={event.end + padding:g}"
+        results.append(
+            {
+                "file_id": event.file_id,
+                "file": event.file.title,
+                "channel": event.channel,
+                "kind": event.kind,
+                "start": event.start,
+                "end": event.end,
+                "start_time": event.start_time.isoformat() if event.start_time else None,
+                "value": event.value,
+                "file_url": f"{reverse('file', args=[event.file_id])}?{window}",
+                "plot_url": f"{reverse('plot_graph', args=[event.file_id])}?{window}",
+            }
+        )
+    return JsonResponse({"events": results})
+
+
+# Function returning the trends of a channel per subject as JSON, aggregated in the database from the trend
+# aggregates stored at import. The GET parameter "channel" is the channel name, "project" limits the trends
+# to the subjects of one project, and "bucket" is the length in seconds of the periods the aggregates are
+# combined over (3600 by default), counted from the start of every recording. For example, the mean SpO2
+# per hour of all subjects of a project is ?project=<id>&channel=SpO2.
+@login_required
+@require_GET
+def trends(request):
+    try:
+        user_profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        return JsonResponse({"trends": []})
+    aggregates = TrendAggregate.objects.filter(file__in=accessible_files(user_profile))
+    try:
+        if request.GET.get("project"):
+            project = get_object_or_404(Project, id=int(request.GET["project"]), users=user_profile)
+            aggregates = aggregates.filter(subject__projects=project)
+        bucket = float(request.GET.get("bucket", 3600))
+        if not bucket > 0:
+            raise ValueError("The bucket must be positive.")
+    except ValueError:
+        return HttpResponseBadRequest("Invalid filter value.")
+    if request.GET.get("channel"):
+        aggregates = aggregates.filter(channel__iexact=request.GET["channel"])
+
+    rows = (
+        aggregates.annotate(bucket=Floor(F("start") / bucket))
+        .values("subject__subject_id", "channel", "bucket")
+        .annotate(
+            total=Sum(F("mean") * F("count"), output_field=FloatField()),
+            samples=Sum("count"),
+            minimum=Min("minimum"),
+            maximum=Max("maximum"),
+        )
+        .order_by("subject__subject_id", "channel", "bucket")
+    )
+    return JsonResponse(
+        {
+            "trends": [
+                {
+                    "subject": row["subject__subject_id"],
+                    "channel": row["channel"],
+                    "start": row["bucket"] * bucket,
+                    "mean": row["total"] / row["samples"] if row["samples"] else None,
+                    "minimum": row["minimum"],
+                    "maximum": row["maximum"],
+                    "count": row["samples"],
+                }
+                for row in rows
+            ]
+        }
+    )
+
+
+# Function submitting an export of a file as a background job, from the same form as download_format_csv,
+# and redirecting to the page of the job.
+@login_required
+@require_POST
+def submit_export(request, file_id):
+    file = get_object_or_404(File, id=file_id)
+    user_profile = UserProfile.objects.filter(user=request.user).first()
+    if user_profile is None:
+        return HttpResponseForbidden("Exports in the background need a user profile.")
+    try:
+        parameters = parse_export_parameters(request.POST)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if parameters["timestamps"] and get_waveform_index(file) is None:
+        return HttpResponseBadRequest("Timestamps, filters and binary formats are not supported for this file.")
+    job = ExportJob.objects.create(
+        user=user_profile,
+        file=file,
+        parameters=parameters,
+        filename=export_filename(file, parameters["format"]),
+    )
+    jobs.submit(job)
+    return redirect("export_job", job_id=job.id)
+
+
+# Function for rendering the export_job.html template, which shows the progress of an export job of the user.
+# With ?status=true, the status of the job is returned as JSON instead, for the page to poll.
+@login_required
+@require_GET
+def export_job(request, job_id):
+    job = get_object_or_404(ExportJob.objects.select_related("file"), id=job_id, user__user=request.user)
+    if request.GET.get("status") == "true":
+        return JsonResponse(
+            {
+                "status": job.status,
+                "progress": job.progress,
+                "error": job.error,
+                "expires_at": job.expires_at,
+                "download_url": reverse("download_export", args=[job.id]) if job.status == ExportJob.DONE else None,
+            }
+        )
+    return render(request, "base/export_job.html", {"job": job})
+
+
+# Function downloading the result of an export job of the user, with support for Range requests so an
+# interrupted download can be resumed. Jobs that have expired answer "410 Gone".
+@login_required
+@require_GET
+def download_export(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, user__user=request.user)
+    if job.status != ExportJob.DONE:
+        return HttpResponse("The export is not done yet.", status=409)
+    if job.is_expired() or not os.path.exists(job.result):
+        return HttpResponse("The export has expired. Please export the file again.", status=410)
+    return jobs.ranged_response(request, job.result, job.filename, FORMATS[job.parameters["format"]][1])
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import fcntl
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from . import metrics
+from .artifacts import single_flight, open_artifact, remove_unused
+
+# Cache of decoded waveforms shared by all worker processes.
+#
+# The decoded channels of a recording are stored as one float32 ".npy" segment of shape
+# (channels, samples) in MONK_WAVEFORM_CACHE_DIR, and opened with numpy's memory mapping. All workers
+# map the same pages of the operating system's page cache, so memory use does not grow with the number
+# of workers. A small JSON index (file id -> segment, columns, shape, dtype, size, last access) is used
+# to find segments and to evict the least recently used ones once MONK_WAVEFORM_CACHE_MAX_BYTES is exceeded.
+
+
+def cache_dir():
+    path = Path(getattr(settings, "MONK_WAVEFORM_CACHE_DIR"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+# Function running update(index) with the index locked, and saving the index afterwards if update returns True.
+def _with_index(update):
+    directory = cache_dir()
+    index_path = directory / "index.json"
+    with open(directory / "index.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        changed, result = update(index)
+        if changed:
+            temporary = index_path.with_suffix(".tmp")
+            with open(temporary, "w") as f:
+                json.dump(index, f)
+            os.replace(temporary, index_path)
+    return result
+
+
+# Function returning the index entry of a file if it points to the given segment, and updating its last access time.
+def _lookup(file_id, segment):
+    def update(index):
+        entry = index.get(str(file_id))
+        if entry is None or entry["segment"] != segment:
+            return False, None
+        # Only write the index when the access time is noticeably out of date, to keep lookups cheap.
+        if time.time() - entry["last_access"] > 10:
+            entry["last_access"] = time.time()
+            return True, entry
+        return False, entry
+
+    return _with_index(update)
+
+
+# Function adding a segment to the index, and evicting the least recently used segments over the byte budget.
+def _register(file_id, segment, columns, array):
+    directory = cache_dir()
+    max_bytes = getattr(settings, "MONK_WAVEFORM_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+
+    def update(index):
+        previous = index.get(str(file_id))
+        if previous is not None and previous["segment"] != segment:
+            remove_unused(directory / previous["segment"])
+        index[str(file_id)] = {
+            "segment": segment,
+            "columns": list(columns),
+            "shape": list(array.shape),
+            "dtype": str(array.dtype),
+            "bytes": int(array.nbytes),
+            "last_access": time.time(),
+        }
+        total = sum(entry["bytes"] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= max_bytes or key == str(file_id):
+                continue
+            # Segments are removed with their lock files. A segment that is being written is left in the index,
+            # to be evicted later. Workers that still map an evicted segment keep their mapping until they close it.
+            if not remove_unused(directory / entry["segment"]):
+                continue
+            total -= entry["bytes"]
+            del index[key]
+        return True, None
+
+    _with_index(update)
+
+
+# Function returning the column names and the decoded waveforms of a recording as a read-only memory mapped
+# array of shape (channels, samples). decode is only called if the recording is not cached yet, and must
+# return the column names and a 2D array of shape (channels, samples).
+def load(file_id, source_path, decode):
+    stat = os.stat(source_path)
+    segment = f"{file_id}-{stat.st_mtime_ns}-{stat.st_size}.npy"
+    path = cache_dir() / segment
+
+    def compute(output_path):
+        columns, array = decode()
+        array = np.ascontiguousarray(array, dtype=np.float32)
+        np.save(output_path, array)
+        # Registered before the segment is moved into place, so waiting workers find it in the index.
+        _register(file_id, segment, columns, array)
+
+    computed = False
+    while True:
+        entry = _lookup(file_id, segment)
+        if entry is not None:
+            try:
+                # The segment is locked while it is mapped, so it is not evicted in between.
+                with open_artifact(str(path)):
+                    array = np.load(path, mmap_mode="r")
+            except FileNotFoundError:
+                # The segment was evicted after the lookup, decode it again.
+                pass
+            else:
+                if not computed:
+                    metrics.record_cache("waveforms", True)
+                return entry["columns"], array
+        else:
+            # A segment without index entry (for example after the index was deleted) is decoded again.
+            path.unlink(missing_ok=True)
+        single_flight(str(path), source_path, compute, "waveforms")
+        computed = True
@@ -51,6 +51,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'base.middleware.MetricsMiddleware',
+    'base.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'monksystem.urls'
@@ -105,6 +107,9 @@ def get_data_dir(app_name: str = "myapp") -> Path:
     data_dir.mkdir(parents=True, exist_ok=True)
     return data_dir
 
+# Directory for data shared between the worker processes, such as metrics and caches.
+MONK_DATA_DIR = get_data_dir("monk-backend")
+
 sqlite_path = get_data_dir("monk-backend") / "db.sqlite3"  # Replace "myapp" with your app name
 
 DATABASES = {
@@ -155,3 +160,157 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Request metrics
+# Set MONK_METRICS_ENABLED to True to collect per-view request metrics and expose them at /metrics
+# in the Prometheus text format. Worker processes share their counters through files in MONK_METRICS_DIR.
+
+MONK_METRICS_ENABLED = False
+MONK_METRICS_DIR = MONK_DATA_DIR / "metrics"
+MONK_METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+# Minimum number of seconds between two writes of a worker's metrics file.
+MONK_METRICS_FLUSH_INTERVAL = 1.0
+
+
+# Request profiling
+# Set MONK_PROFILING_ENABLED to True to run requests to MONK_PROFILING_VIEWS under cProfile (None profiles every view).
+# Profiles of requests slower than MONK_PROFILING_THRESHOLD seconds are saved to MONK_PROFILING_DIR,
+# as well as 1 in N requests to the views in MONK_PROFILING_SAMPLE_RATES. Staff users can list and download them at /profiles/.
+
+MONK_PROFILING_ENABLED = False
+MONK_PROFILING_DIR = MONK_DATA_DIR / "profiles"
+MONK_PROFILING_VIEWS = ["plot_graph", "download_format_csv", "download_mfer_header", "download_mwf", "import_file", "import_multiple_files"]
+MONK_PROFILING_THRESHOLD = 2.0
+MONK_PROFILING_SAMPLE_RATES = {"plot_graph": 50, "download_format_csv": 50}
+MONK_PROFILING_MAX_FILES = 50
+
+
+# Admission control
+# Limits for endpoints that decode a whole recording. "concurrency" requests run at the same time,
+# up to "queue" more wait for at most "timeout" seconds, and each user can have at most "per_user" requests
+# running or waiting. Other requests get "503 Service Unavailable" with a Retry-After of "retry_after" seconds.
+# The limits are shared between worker processes through lock files in MONK_ADMISSION_DIR.
+#
+# A queued request keeps its web worker thread while it waits, so the running and queued requests of all
+# endpoints together ("concurrency" + "queue" summed over the entries below, 15 here) must stay well below the
+# number of worker threads of the server (processes * threads), or the other pages stop responding while the
+# heavy endpoints are saturated. The queues are kept short and the timeouts a few seconds, so a saturated
+# endpoint answers 503 quickly; set "queue" to 0 to answer 503 as soon as all run slots are taken.
+
+MONK_ADMISSION_DIR = MONK_DATA_DIR / "admission"
+MONK_ADMISSION_LIMITS = {
+    "plot_graph": {"concurrency": 2, "queue": 2, "per_user": 2, "timeout": 5, "retry_after": 10},
+    "download_format_csv": {"concurrency": 2, "queue": 2, "per_user": 2, "timeout": 5, "retry_after": 10},
+    "anonymize_data": {"concurrency": 1, "queue": 1, "per_user": 1, "timeout": 5, "retry_after": 10},
+    "export_project": {"concurrency": 1, "queue": 1, "per_user": 1, "timeout": 5, "retry_after": 30},
+}
+
+# Pool of parsed recordings
+# Each worker process keeps the raw content of up to MONK_DATA_POOL_MAX_ENTRIES recordings, using at most
+# MONK_DATA_POOL_MAX_BYTES of memory, to parse monklib Data objects from, and up to MONK_HEADER_POOL_MAX_ENTRIES
+# parsed headers, using at most about MONK_HEADER_POOL_MAX_BYTES.
+
+MONK_DATA_POOL_MAX_ENTRIES = 8
+MONK_DATA_POOL_MAX_BYTES = 512 * 1024 * 1024
+MONK_HEADER_POOL_MAX_ENTRIES = 64
+MONK_HEADER_POOL_MAX_BYTES = 16 * 1024 * 1024
+
+
+# Derived artifacts
+# Conversions, anonymized copies and filtered channels of the recordings are kept in MONK_ARTIFACT_DIR,
+# in one directory per recording. "python manage.py gc_artifacts" removes the artifacts of deleted recordings,
+# and the least recently used artifacts until they take at most MONK_ARTIFACT_MAX_BYTES; run it periodically,
+# or keep it running with --interval <seconds>.
+
+MONK_ARTIFACT_DIR = MONK_DATA_DIR / "artifacts"
+MONK_ARTIFACT_MAX_BYTES = 20 * 1024 * 1024 * 1024
+
+
+# Decoded waveform cache
+# Decoded channels are stored as memory mapped files in MONK_WAVEFORM_CACHE_DIR and shared by all worker processes.
+# The least recently used recordings are removed when the cache grows above MONK_WAVEFORM_CACHE_MAX_BYTES.
+
+MONK_WAVEFORM_CACHE_DIR = MONK_DATA_DIR / "waveforms"
+MONK_WAVEFORM_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+# Analysis
+# Imported recordings are analysed in MONK_ANALYSIS_WORKERS background threads once their import is saved.
+# "python manage.py analyze_files --missing" analyses the recordings imported before, and runs the stages
+# again that failed or were interrupted.
+# The heart rate is derived from the channels whose name matches MONK_ECG_CHANNEL_PATTERN, and its trend has
+# one value per MONK_HEART_RATE_TREND_INTERVAL seconds.
+
+MONK_ANALYSIS_ENABLED = True
+MONK_ANALYSIS_WORKERS = 1
+MONK_ECG_CHANNEL_PATTERN = r"ECG|^(I|II|III|aVR|aVL|aVF|V[1-6])$"
+MONK_HEART_RATE_TREND_INTERVAL = 10
+
+# Values outside these ranges are marked as implausible by the quality scan, for the channels whose name
+# matches the pattern. Channels that match no pattern are not checked for implausible values.
+MONK_QUALITY_PLAUSIBLE_RANGES = {
+    r"SpO2|SPO2": (0, 100),
+    r"^(HR|PR|Pulse)": (0, 350),
+    r"Temp": (20, 45),
+}
+
+# Values at or beyond these limits are marked as clipping by the quality scan, for the channels whose name matches
+# the pattern, such as the input range of an amplifier. Other channels clip at the range of their data type.
+MONK_QUALITY_CLIPPING_LIMITS = {}
+
+# Events found in the channels whose name matches "channel": runs of values "below" or "above" the threshold
+# that last at least "min_seconds". Dropouts found by the quality scan are stored as events as well.
+MONK_EVENT_RULES = [
+    {"kind": "desaturation", "channel": r"SpO2|SPO2", "below": 90, "min_seconds": 10},
+    {"kind": "tachycardia", "channel": r"^(HR|PR|Pulse)", "above": 120, "min_seconds": 10},
+    {"kind": "bradycardia", "channel": r"^(HR|PR|Pulse)", "below": 50, "min_seconds": 10},
+    {"kind": "hypotension", "channel": r"ABP|ART|NIBP", "below": 60, "min_seconds": 10},
+]
+# Seconds shown before and after an event when jumping to it in a plot.
+MONK_EVENT_PADDING = 30
+
+# Length in seconds of the intervals the channels are aggregated over for trend queries.
+MONK_TREND_INTERVAL = 60
+
+
+# Exports
+# The recordings of a project are converted for its ZIP export in MONK_EXPORT_WORKERS processes. Every web
+# worker process starts its own export processes, each a full Django process, so a server with N web workers
+# runs up to N * MONK_EXPORT_WORKERS of them. Set it to 0 to convert the recordings in the request instead.
+
+MONK_EXPORT_WORKERS = 2
+
+# Exports submitted as background jobs are produced in MONK_EXPORT_JOB_WORKERS background threads, and can be
+# downloaded for MONK_EXPORT_JOB_TTL seconds after they are done, after which they are removed. Jobs that are not
+# done MONK_EXPORT_JOB_TIMEOUT seconds after they were submitted, such as jobs lost in a restart, are failed.
+MONK_EXPORT_JOB_WORKERS = 1
+MONK_EXPORT_JOB_TTL = 24 * 3600
+MONK_EXPORT_JOB_TIMEOUT = 6 * 3600
+
+
+# Caches
+# Rendered plots are kept in the "plots" cache. A plot holds the samples it shows, so its size grows with the
+# number of rows and channels plotted; plots larger than MONK_PLOT_CACHE_MAX_ITEM_BYTES are not cached, so the
+# cache uses at most MAX_ENTRIES * MONK_PLOT_CACHE_MAX_ITEM_BYTES (80 MiB here) per worker process. Use a
+# FileBasedCache to share the plots between worker processes. Computed spectra are kept in "spectra".
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "plots": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "plots",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 20},
+    },
+    "spectra": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "spectra",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 100},
+    },
+}
+MONK_PLOT_CACHE_MAX_ITEM_BYTES = 4 * 1024 * 1024